@@ -0,0 +1,19 @@
+from datetime import datetime
+
+import bot
+
+from .library import historywriter, retention, searchindex
+
+
+async def loadSearchIndex(timestamp: datetime) -> None:
+    if searchindex.enabled and searchindex.stale():
+        await searchindex.load()
+
+
+async def startHistoryWriter(timestamp: datetime) -> None:
+    if historywriter.writeBehind and bot.globals.running:
+        historywriter.start()
+
+
+async def ensureHistoryPartitions(timestamp: datetime) -> None:
+    await retention.ensurePartitions()
@@ -0,0 +1,310 @@
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List  # noqa: F401
+from typing import Optional, Sequence, Set, Tuple  # noqa: F401
+
+from lib.data import ChatCommandArgs
+from lib.data.message import Message
+
+from .. import channel
+from .database import clearCaches, loadDataset, percentile
+from .dataset import Dataset, DatasetOptions, ZipfSampler
+from .pool import BenchmarkPool
+
+Handler = Callable[[ChatCommandArgs], Awaitable[bool]]
+
+defaultMix: str = ','.join([
+    'quote=50',
+    'quote-search=20',
+    'quote-id=10',
+    'anyquote=5',
+    'anyquote-search=2',
+    'quotes-list=3',
+    'quotes-add=4',
+    'quotes-edit=2',
+    'quotes-tag=2',
+    'quotes-id=2',
+])
+
+
+class SimulatedData:
+    async def hasFeature(self, channel: str, feature: str) -> bool:
+        return True
+
+
+class SimulatedPermissions:
+    def __init__(self, broadcaster: bool) -> None:
+        self.broadcaster: bool = broadcaster
+        self.moderator: bool = True
+
+    def __getitem__(self, key: str) -> bool:
+        return True
+
+
+class SimulatedChannel:
+    def __init__(self, channel: str) -> None:
+        self.channel: str = channel
+        self.sessionData: Dict[str, Any] = {}
+        self.sent: int = 0
+
+    def send(self, messages: Any, priority: int = 1) -> None:
+        self.sent += 1
+
+
+class ChatSimulator:
+    def __init__(self,
+                 dataset: Dataset,
+                 mix: Dict[str, int],
+                 cooldowns: bool) -> None:
+        self.dataset: Dataset = dataset
+        self.rng: random.Random = dataset.rng
+        self.kinds: List[str] = list(mix)
+        self.weights: List[int] = list(mix.values())
+        self.cooldowns: bool = cooldowns
+        self.data: SimulatedData = SimulatedData()
+        self.channels: Dict[str, SimulatedChannel] = {}
+        self.latencies: Dict[str, List[float]] = {k: [] for k in mix}
+        self.errors: Dict[str, int] = {k: 0 for k in mix}
+
+    def chat(self, name: str) -> SimulatedChannel:
+        if name not in self.channels:
+            self.channels[name] = SimulatedChannel(name)
+        return self.channels[name]
+
+    def words(self) -> str:
+        return ' '.join(self.dataset.randomWords(self.rng.randint(1, 2)))
+
+    def command(self, kind: str, name: str) -> Tuple[Handler, str]:
+        quoteId: int = self.dataset.randomQuoteId(name)
+        anyId: int = self.rng.randint(1, self.dataset.options.quotes)
+        commands: Dict[str, Tuple[Handler, str]] = {
+            'quote': (channel.commandQuote, '!quote'),
+            'quote-id': (channel.commandQuote, f'!quote {quoteId}'),
+            'quote-search': (channel.commandQuote,
+                             f'!quote {self.words()}'),
+            'anyquote': (channel.commandAnyQuote, '!anyquote'),
+            'anyquote-id': (channel.commandAnyQuote, f'!anyquote {anyId}'),
+            'anyquote-search': (channel.commandAnyQuote,
+                                f'!anyquote {self.words()}'),
+            'quotes-list': (channel.commandQuotes, '!quotes'),
+            'quotes-add': (channel.commandQuotes,
+                           f'!quotes add {self.words()} {self.words()}'),
+            'quotes-edit': (channel.commandQuotes,
+                            f'!quotes edit {quoteId} {self.words()}'),
+            'quotes-tag': (channel.commandQuotes,
+                           f'!quotes tag {quoteId} '
+                           + ' '.join(self.dataset.randomTags(2))),
+            'quotes-id': (channel.commandQuotes,
+                          f'!quotes id {self.words()}'),
+        }
+        return commands[kind]
+
+    async def run(self, name: str, arrived: float) -> None:
+        kind: str = self.rng.choices(self.kinds, self.weights)[0]
+        handler: Handler
+        text: str
+        handler, text = self.command(kind, name)
+        args: ChatCommandArgs = ChatCommandArgs(
+            data=self.data,
+            chat=self.chat(name),
+            tags=None,
+            nick='botgotsthis',
+            message=Message(text),
+            permissions=SimulatedPermissions(not self.cooldowns),
+            timestamp=datetime.utcnow())
+        try:
+            await handler(args)
+        except Exception:
+            self.errors[kind] += 1
+        self.latencies[kind].append(time.perf_counter() - arrived)
+
+
+def parseMix(mix: str) -> Dict[str, int]:
+    weights: Dict[str, int] = {}
+    item: str
+    for item in mix.split(','):
+        kind: str
+        weight: str
+        kind, _, weight = item.partition('=')
+        weights[kind.strip()] = int(weight or 1)
+    return weights
+
+
+async def monitorLag(lags: List[float], interval: float) -> None:
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    while True:
+        start: float = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - start - interval))
+
+
+async def runStep(simulator: ChatSimulator,
+                  pool: BenchmarkPool,
+                  active: int,
+                  args: argparse.Namespace) -> Dict[str, Any]:
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    dataset: Dataset = simulator.dataset
+    sampler: ZipfSampler = ZipfSampler(
+        dataset.channelNames[:active], dataset.options.channelSkew,
+        dataset.rng)
+    rate: float = active * args.rate_per_channel
+    simulator.latencies = {k: [] for k in simulator.kinds}
+    simulator.errors = {k: 0 for k in simulator.kinds}
+    waitStart: int = len(pool.waits)
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(args.concurrency)
+    tasks: Set[asyncio.Task] = set()
+
+    async def dispatch(name: str, arrived: float) -> None:
+        async with semaphore:
+            await simulator.run(name, arrived)
+
+    lags: List[float] = []
+    monitor: asyncio.Task = loop.create_task(
+        monitorLag(lags, args.lag_interval))
+    started: float = time.perf_counter()
+    deadline: float = started + args.duration
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(dataset.rng.expovariate(rate))
+        name: str = sampler.sample()
+        arrived: float = time.perf_counter()
+        for _ in range(dataset.rng.randint(1, args.burst)):
+            task: asyncio.Task = loop.create_task(dispatch(name, arrived))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.wait(list(tasks))
+    elapsed: float = time.perf_counter() - started
+    monitor.cancel()
+
+    samples: List[float] = [s for k in simulator.kinds
+                            for s in simulator.latencies[k]]
+    waits: List[float] = pool.waits[waitStart:]
+    return {
+        'active_channels': active,
+        'offered_per_sec': rate * (1 + args.burst) / 2,
+        'commands': len(samples),
+        'commands_per_sec': len(samples) / elapsed if elapsed else 0.0,
+        'latency_p50_ms': percentile(samples, 0.5) * 1000,
+        'latency_p99_ms': percentile(samples, 0.99) * 1000,
+        'loop_lag_p50_ms': percentile(lags, 0.5) * 1000,
+        'loop_lag_p99_ms': percentile(lags, 0.99) * 1000,
+        'loop_lag_max_ms': max(lags, default=0.0) * 1000,
+        'pool_wait_p50_ms': percentile(waits, 0.5) * 1000,
+        'pool_wait_p99_ms': percentile(waits, 0.99) * 1000,
+        'by_command': {
+            k: {
+                'calls': len(simulator.latencies[k]),
+                'errors': simulator.errors[k],
+                'p50_ms': percentile(simulator.latencies[k], 0.5) * 1000,
+                'p99_ms': percentile(simulator.latencies[k], 0.99) * 1000,
+            } for k in simulator.kinds},
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    options: DatasetOptions = DatasetOptions(
+        quotes=args.quotes, channels=args.channels, seed=args.seed)
+    mix: Dict[str, int] = parseMix(args.mix)
+    isPostgres: bool = args.postgres is not None
+    pool: BenchmarkPool = BenchmarkPool(
+        args.postgres if isPostgres else args.sqlite, isPostgres,
+        args.pool_size)
+    steps: List[Dict[str, Any]] = []
+    await pool.open()
+    try:
+        dataset: Dataset = Dataset(options)
+        if args.load:
+            await loadDataset(pool, dataset, args.batch_size)
+        else:
+            for _ in dataset.rows():
+                pass
+        simulator: ChatSimulator = ChatSimulator(dataset, mix, args.cooldowns)
+        with pool.install():
+            active: int
+            for active in args.active or [args.channels]:
+                clearCaches()
+                step: Dict[str, Any] = await runStep(
+                    simulator, pool, min(active, args.channels), args)
+                print(f'active={step["active_channels"]:<6} '
+                      f'cmd/s={step["commands_per_sec"]:9.1f} '
+                      f'p99={step["latency_p99_ms"]:9.3f}ms '
+                      f'lag p99={step["loop_lag_p99_ms"]:8.3f}ms '
+                      f'pool p99={step["pool_wait_p99_ms"]:8.3f}ms',
+                      file=sys.stderr)
+                steps.append(step)
+    finally:
+        await pool.close()
+    return {
+        'meta': {
+            'created': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'backend': 'postgres' if isPostgres else 'sqlite',
+            'dataset': options._asdict(),
+            'mix': mix,
+            'duration': args.duration,
+            'rate_per_channel': args.rate_per_channel,
+            'burst': args.burst,
+            'concurrency': args.concurrency,
+            'pool_size': args.pool_size,
+            'cooldowns': args.cooldowns,
+        },
+        'steps': steps,
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='''\
+Replay bursts of !quote, !anyquote and !quotes chat commands against a
+generated dataset. The target database is dropped and reloaded.''')
+    backend: argparse._MutuallyExclusiveGroup
+    backend = parser.add_mutually_exclusive_group(required=True)
+    backend.add_argument('--sqlite', metavar='DSN',
+                         help='ODBC connection string of a SQLite database')
+    backend.add_argument('--postgres', metavar='DSN',
+                         help='ODBC connection string of a Postgres database')
+    parser.add_argument('--quotes', type=int, default=100000)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--active', type=int, nargs='+', metavar='CHANNELS',
+                        help='channels sending commands, one step each')
+    parser.add_argument('--rate-per-channel', type=float, default=0.05,
+                        help='bursts per second from each active channel')
+    parser.add_argument('--burst', type=int, default=5,
+                        help='most commands in one burst')
+    parser.add_argument('--mix', default=defaultMix,
+                        help='comma separated command=weight list')
+    parser.add_argument('--duration', type=float, default=30.0,
+                        help='seconds per step')
+    parser.add_argument('--concurrency', type=int, default=64,
+                        help='most commands handled at once')
+    parser.add_argument('--lag-interval', type=float, default=0.01)
+    parser.add_argument('--cooldowns', action='store_true',
+                        help='send as viewers so !quote cooldowns apply')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--no-load', dest='load', action='store_false',
+                        help='reuse a database loaded with the same options')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results as JSON, default is stdout')
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    output: Dict[str, Any] = loop.run_until_complete(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,402 @@
+import argparse
+import asyncio
+import inspect
+import json
+import math
+import os
+import platform
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List  # noqa: F401
+from typing import NamedTuple, Optional, Sequence, Tuple  # noqa: F401
+
+from ..library import cache, database, membership, quoteids, searchcache
+from ..library import searchindex, searchquery, similar, statements
+from .dataset import Dataset, DatasetOptions, QuoteRow, batches
+from .pool import BenchmarkPool
+
+packageDir: str = os.path.dirname(os.path.dirname(__file__))
+
+dropStatements: List[str] = [
+    'DROP TABLE IF EXISTS quotes_search',
+    'DROP TABLE IF EXISTS quotes_tags',
+    'DROP TABLE IF EXISTS quotes_history',
+    'DROP TABLE IF EXISTS quotes_revisions',
+    'DROP TABLE IF EXISTS quotes',
+    'DROP TABLE IF EXISTS quotes_migrations',
+]
+
+
+class BenchmarkState:
+    def __init__(self, dataset: Dataset) -> None:
+        self.dataset: Dataset = dataset
+        self.added: List[Tuple[str, int]] = []
+        self.tagged: List[Tuple[int, str]] = []
+        self.counter: int = 0
+
+    def next(self) -> int:
+        self.counter += 1
+        return self.counter
+
+    def addedQuote(self) -> Tuple[str, int]:
+        return self.added[self.counter % len(self.added)]
+
+
+Case = Callable[[BenchmarkState], Awaitable[Any]]
+
+
+async def _addQuote(state: BenchmarkState) -> None:
+    channel: str = state.dataset.randomChannel()
+    quote: str = ' '.join(state.dataset.randomWords(10))
+    quoteId: int = await database.addQuote(channel, 'benchmark', quote)
+    state.added.append((channel, quoteId))
+
+
+async def _updateQuote(state: BenchmarkState) -> None:
+    channel: str
+    quoteId: int
+    channel, quoteId = state.addedQuote()
+    state.next()
+    await database.updateQuote(channel, 'benchmark', quoteId,
+                               ' '.join(state.dataset.randomWords(10)))
+
+
+async def _copyQuote(state: BenchmarkState) -> None:
+    channel: str
+    quoteId: int
+    channel, quoteId = state.addedQuote()
+    to: str = state.dataset.randomChannel()
+    state.next()
+    newQuoteId: Optional[int]
+    newQuoteId = await database.copyQuote(channel, to, 'benchmark', quoteId)
+    if newQuoteId is not None:
+        state.added.append((to, newQuoteId))
+
+
+async def _deleteQuote(state: BenchmarkState) -> None:
+    if state.added:
+        channel: str
+        quoteId: int
+        channel, quoteId = state.added.pop()
+        await database.deleteQuote(channel, quoteId)
+
+
+async def _addTagsToQuote(state: BenchmarkState) -> None:
+    quoteId: int = state.addedQuote()[1]
+    tag: str = f'bench{state.next()}'
+    await database.addTagsToQuote(quoteId, [tag])
+    state.tagged.append((quoteId, tag))
+
+
+async def _deleteTagsToQuote(state: BenchmarkState) -> None:
+    if state.tagged:
+        quoteId: int
+        tag: str
+        quoteId, tag = state.tagged.pop()
+        await database.deleteTagsToQuote(quoteId, [tag])
+
+
+async def _toggleQuoteTags(state: BenchmarkState) -> None:
+    channel: str
+    quoteId: int
+    channel, quoteId = state.addedQuote()
+    state.next()
+    await database.toggleQuoteTags(channel, quoteId,
+                                   state.dataset.randomTags(2))
+
+
+def _randomChannel(state: BenchmarkState) -> str:
+    return state.dataset.randomChannel()
+
+
+def _randomQuoteId(state: BenchmarkState) -> int:
+    return state.dataset.rng.randint(1, state.dataset.options.quotes)
+
+
+async def _iterateQuoteIds(state: BenchmarkState) -> List[Tuple[int, int]]:
+    return [row async for row in database.iterateQuoteIdsByWords(
+        _randomChannel(state), _randomWords(state), 20)]
+
+
+def _randomWords(state: BenchmarkState) -> List[str]:
+    return state.dataset.randomWords(state.dataset.rng.randint(1, 2))
+
+
+cases: List[Tuple[str, Case]] = [
+    ('getRandomQuote',
+     lambda s: database.getRandomQuote(_randomChannel(s))),
+    ('getQuoteById',
+     lambda s: database.getQuoteById(
+         *(lambda c: (c, s.dataset.randomQuoteId(c)))(_randomChannel(s)))),
+    ('getRandomQuoteBySearch',
+     lambda s: database.getRandomQuoteBySearch(_randomChannel(s),
+                                               _randomWords(s))),
+    ('getBestQuotesBySearch',
+     lambda s: database.getBestQuotesBySearch(_randomChannel(s),
+                                              _randomWords(s), 5)),
+    ('getAnyRandomQuote',
+     lambda s: database.getAnyRandomQuote()),
+    ('getAnyQuoteById',
+     lambda s: database.getAnyQuoteById(_randomQuoteId(s))),
+    ('getAnyRandomQuoteBySearch',
+     lambda s: database.getAnyRandomQuoteBySearch(_randomWords(s))),
+    ('getTagsOfQuote',
+     lambda s: database.getTagsOfQuote(_randomQuoteId(s))),
+    ('getQuoteIdsByWords',
+     lambda s: database.getQuoteIdsByWords(_randomChannel(s),
+                                           _randomWords(s))),
+    ('iterateQuoteIdsByWords', _iterateQuoteIds),
+    ('getSimilarQuotes',
+     lambda s: database.getSimilarQuotes(
+         *(lambda c: (c, s.dataset.randomQuoteId(c), 5))(_randomChannel(s)))),
+    ('addQuote', _addQuote),
+    ('updateQuote', _updateQuote),
+    ('toggleQuoteTags', _toggleQuoteTags),
+    ('addTagsToQuote', _addTagsToQuote),
+    ('deleteTagsToQuote', _deleteTagsToQuote),
+    ('copyQuote', _copyQuote),
+    ('deleteQuote', _deleteQuote),
+]
+
+
+def publicFunctions() -> List[str]:
+    return sorted(name for name, value in inspect.getmembers(database)
+                  if (inspect.iscoroutinefunction(value)
+                      or inspect.isasyncgenfunction(value))
+                  and not name.startswith('_')
+                  and value.__module__ == database.__name__)
+
+
+def clearCaches() -> None:
+    cache.clear()
+    searchcache.clear()
+    quoteids.clear()
+    membership.clear()
+    searchquery.clear()
+    similar.clear()
+    statements.clear()
+
+
+def percentile(samples: Sequence[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered: List[float] = sorted(samples)
+    index: int = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(samples: Sequence[float],
+              waits: Sequence[float],
+              elapsed: float) -> Dict[str, float]:
+    return {
+        'calls': len(samples),
+        'p50_ms': percentile(samples, 0.5) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'mean_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+        'max_ms': max(samples, default=0.0) * 1000,
+        'ops_per_sec': len(samples) / elapsed if elapsed else 0.0,
+        'pool_wait_p99_ms': percentile(waits, 0.99) * 1000,
+    }
+
+
+def schemaStatements(path: str, postgres: bool) -> List[str]:
+    statements: List[str] = []
+    buffer: str = ''
+    with open(path) as f:
+        line: str
+        for line in f:
+            buffer += line
+            complete: bool
+            if postgres:
+                complete = (buffer.count('$$') % 2 == 0
+                            and line.rstrip().endswith(';'))
+            else:
+                complete = sqlite3.complete_statement(buffer)
+            if complete:
+                statements.append(buffer.strip().rstrip(';'))
+                buffer = ''
+    return statements
+
+
+async def loadDataset(pool: BenchmarkPool,
+                      dataset: Dataset,
+                      batchSize: int) -> None:
+    schema: str = os.path.join(
+        packageDir,
+        'database-postgres.sql' if pool.isPostgres else 'database-sqlite.sql')
+    async with pool.acquire() as db, await db.cursor() as cursor:
+        query: str
+        for query in dropStatements:
+            await cursor.execute(query)
+        for query in schemaStatements(schema, pool.isPostgres):
+            await cursor.execute(query)
+        await db.commit()
+
+        quoteQuery: str = '''
+INSERT INTO quotes (quoteId, broadcaster, quote) VALUES (?, ?, ?)
+'''
+        tagQuery: str = '''
+INSERT INTO quotes_tags (quoteId, tag) VALUES (?, ?)
+'''
+        batch: List[QuoteRow]
+        for batch in batches(dataset.rows(), batchSize):
+            await cursor.executemany(
+                quoteQuery,
+                [(r.quoteId, r.broadcaster, r.quote) for r in batch])
+            tags: List[Tuple[int, str]] = [(r.quoteId, t) for r in batch
+                                           for t in r.tags]
+            if tags:
+                await cursor.executemany(tagQuery, tags)
+            await db.commit()
+        if pool.isPostgres:
+            await cursor.execute('''
+SELECT setval('quotes_quoteid_seq', (SELECT MAX(quoteId) FROM quotes))
+''')
+        await cursor.execute('ANALYZE')
+        await db.commit()
+
+
+async def runBackend(pool: BenchmarkPool,
+                     dataset: Dataset,
+                     iterations: int,
+                     cold: bool) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    state: BenchmarkState = BenchmarkState(dataset)
+    clearCaches()
+    name: str
+    case: Case
+    for name, case in cases:
+        samples: List[float] = []
+        waitStart: int = len(pool.waits)
+        started: float = time.perf_counter()
+        for _ in range(iterations):
+            if cold:
+                clearCaches()
+            start: float = time.perf_counter()
+            await case(state)
+            samples.append(time.perf_counter() - start)
+        elapsed: float = time.perf_counter() - started
+        results[name] = summarize(samples, pool.waits[waitStart:], elapsed)
+        print(f'{"postgres" if pool.isPostgres else "sqlite":<8} '
+              f'{name:<26} p50={results[name]["p50_ms"]:8.3f}ms '
+              f'p99={results[name]["p99_ms"]:8.3f}ms '
+              f'ops/s={results[name]["ops_per_sec"]:10.1f}',
+              file=sys.stderr)
+    return results
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> int:
+    backend: str
+    for backend in sorted(set(before['results']) & set(after['results'])):
+        old: Dict[str, Dict[str, float]] = before['results'][backend]
+        new: Dict[str, Dict[str, float]] = after['results'][backend]
+        name: str
+        for name in sorted(set(old) & set(new)):
+            ratios: List[str] = []
+            metric: str
+            for metric in ['p50_ms', 'p99_ms']:
+                ratio: float = (new[name][metric] / old[name][metric]
+                                if old[name][metric] else math.inf)
+                ratios.append(f'{metric}={old[name][metric]:.3f}->'
+                              f'{new[name][metric]:.3f} ({ratio:.2f}x)')
+            print(f'{backend:<8} {name:<26} {" ".join(ratios)}')
+    return 0
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    options: DatasetOptions = DatasetOptions(
+        quotes=args.quotes, channels=args.channels, seed=args.seed)
+    skipped: List[str] = sorted(set(publicFunctions())
+                                - {name for name, _ in cases})
+    if skipped:
+        print(f'No benchmark case for: {", ".join(skipped)}',
+              file=sys.stderr)
+    output: Dict[str, Any] = {
+        'meta': {
+            'created': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'dataset': options._asdict(),
+            'iterations': args.iterations,
+            'cold': args.cold,
+            'search_index': args.search_index,
+            'skipped': skipped,
+        },
+        'results': {},
+    }
+    backends: List[Tuple[str, str, bool]] = []
+    if args.sqlite:
+        backends.append(('sqlite', args.sqlite, False))
+    if args.postgres:
+        backends.append(('postgres', args.postgres, True))
+    backend: str
+    dsn: str
+    isPostgres: bool
+    for backend, dsn, isPostgres in backends:
+        pool: BenchmarkPool = BenchmarkPool(dsn, isPostgres, args.pool_size)
+        await pool.open()
+        try:
+            dataset: Dataset = Dataset(options)
+            if args.load:
+                await loadDataset(pool, dataset, args.batch_size)
+            else:
+                for _ in dataset.rows():
+                    pass
+            with pool.install():
+                if args.search_index:
+                    await searchindex.load()
+                output['results'][backend] = await runBackend(
+                    pool, dataset, args.iterations, args.cold)
+        finally:
+            searchindex.unload()
+            await pool.close()
+    return output
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='''\
+Time every public function in library/database.py against a generated
+dataset. The target databases are dropped and reloaded.''')
+    parser.add_argument('--sqlite', metavar='DSN',
+                        help='ODBC connection string of a SQLite database')
+    parser.add_argument('--postgres', metavar='DSN',
+                        help='ODBC connection string of a Postgres database')
+    parser.add_argument('--quotes', type=int, default=100000)
+    parser.add_argument('--channels', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--cold', action='store_true',
+                        help='clear the in-process caches before every call')
+    parser.add_argument('--search-index', action='store_true',
+                        help='answer searches from the in-process index')
+    parser.add_argument('--no-load', dest='load', action='store_false',
+                        help='reuse a database loaded with the same options')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the results as JSON, default is stdout')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+                        help='compare two JSON results instead of running')
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            return compare(json.load(before), json.load(after))
+    if not args.sqlite and not args.postgres:
+        parser.error('at least one of --sqlite or --postgres is required')
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    output: Dict[str, Any] = loop.run_until_complete(run(args))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2, sort_keys=True)
+    else:
+        json.dump(output, sys.stdout, indent=2, sort_keys=True)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import bisect
+import itertools
+import random
+from typing import Dict, Iterator, List, NamedTuple, Sequence  # noqa: F401
+from typing import Tuple  # noqa: F401
+
+
+class QuoteRow(NamedTuple):
+    quoteId: int
+    broadcaster: str
+    quote: str
+    tags: Tuple[str, ...]
+
+
+class DatasetOptions(NamedTuple):
+    quotes: int = 100000
+    channels: int = 1000
+    channelSkew: float = 1.1
+    vocabulary: int = 20000
+    wordSkew: float = 1.0
+    wordsPerQuote: Tuple[int, int] = (3, 25)
+    tags: int = 2000
+    tagsPerQuote: Tuple[int, int] = (0, 4)
+    seed: int = 0
+
+
+class ZipfSampler:
+    def __init__(self,
+                 items: Sequence[str],
+                 skew: float,
+                 rng: random.Random) -> None:
+        self.items: Sequence[str] = items
+        self.rng: random.Random = rng
+        weights: List[float] = [1 / (rank ** skew)
+                                for rank in range(1, len(items) + 1)]
+        self.cumulative: List[float] = list(itertools.accumulate(weights))
+
+    def sample(self) -> str:
+        target: float = self.rng.random() * self.cumulative[-1]
+        return self.items[bisect.bisect(self.cumulative, target)]
+
+    def sampleMany(self, count: int) -> List[str]:
+        return [self.sample() for _ in range(count)]
+
+
+class Dataset:
+    def __init__(self, options: DatasetOptions) -> None:
+        self.options: DatasetOptions = options
+        self.rng: random.Random = random.Random(options.seed)
+        self.channelNames: List[str] = [
+            f'channel{i:05d}' for i in range(options.channels)]
+        self.words: List[str] = [
+            self.word(i) for i in range(options.vocabulary)]
+        self.tagNames: List[str] = [
+            f'tag{i:04d}' for i in range(options.tags)]
+        self.channelSampler: ZipfSampler = ZipfSampler(
+            self.channelNames, options.channelSkew, self.rng)
+        self.wordSampler: ZipfSampler = ZipfSampler(
+            self.words, options.wordSkew, self.rng)
+        self.tagSampler: ZipfSampler = ZipfSampler(
+            self.tagNames, options.wordSkew, self.rng)
+        self.channelQuotes: Dict[str, List[int]] = {}
+
+    def word(self, index: int) -> str:
+        letters: str = 'abcdefghijklmnopqrstuvwxyz'
+        name: str = ''
+        remaining: int = index + 26 * 26
+        letter: int
+        while remaining:
+            remaining, letter = divmod(remaining, 26)
+            name = letters[letter] + name
+        return name.capitalize() if index % 7 == 0 else name
+
+    def rows(self) -> Iterator[QuoteRow]:
+        options: DatasetOptions = self.options
+        self.channelQuotes.clear()
+        quoteId: int
+        for quoteId in range(1, options.quotes + 1):
+            channel: str = self.channelSampler.sample()
+            self.channelQuotes.setdefault(channel, []).append(quoteId)
+            quote: str = ' '.join(self.wordSampler.sampleMany(
+                self.rng.randint(*options.wordsPerQuote)))
+            tags: Tuple[str, ...] = tuple(sorted(set(
+                self.tagSampler.sampleMany(
+                    self.rng.randint(*options.tagsPerQuote)))))
+            yield QuoteRow(quoteId, channel, quote, tags)
+
+    def randomChannel(self) -> str:
+        return self.channelSampler.sample()
+
+    def randomQuoteId(self, channel: str) -> int:
+        quoteIds: List[int] = self.channelQuotes.get(channel, [0])
+        return self.rng.choice(quoteIds)
+
+    def randomWords(self, count: int) -> List[str]:
+        return self.wordSampler.sampleMany(count)
+
+    def randomTags(self, count: int) -> List[str]:
+        return self.tagSampler.sampleMany(count)
+
+
+def batches(rows: Iterator[QuoteRow],
+            size: int) -> Iterator[List[QuoteRow]]:
+    while True:
+        batch: List[QuoteRow] = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
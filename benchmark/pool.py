@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional  # noqa: F401
+from unittest.mock import patch
+
+import aioodbc
+import aioodbc.cursor  # noqa: F401
+
+from lib.database import DatabaseMain
+
+
+class BenchmarkDatabase:
+    def __init__(self,
+                 connection: 'aioodbc.Connection',
+                 isPostgres: bool) -> None:
+        self.connection: aioodbc.Connection = connection
+        self.isPostgres: bool = isPostgres
+        self.isSqlite: bool = not isPostgres
+
+    async def cursor(self) -> 'aioodbc.cursor.Cursor':
+        return await self.connection.cursor()
+
+    async def commit(self) -> None:
+        await self.connection.commit()
+
+    async def rollback(self) -> None:
+        await self.connection.rollback()
+
+
+class BenchmarkPool:
+    def __init__(self, dsn: str, isPostgres: bool, size: int) -> None:
+        self.dsn: str = dsn
+        self.isPostgres: bool = isPostgres
+        self.size: int = size
+        self.pool: Optional[aioodbc.Pool] = None
+        self.waits: List[float] = []
+
+    async def open(self) -> None:
+        self.pool = await aioodbc.create_pool(
+            dsn=self.dsn, minsize=1, maxsize=self.size, autocommit=False)
+
+    async def close(self) -> None:
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    def acquire(self) -> 'PoolAcquire':
+        return PoolAcquire(self)
+
+    @contextmanager
+    def install(self) -> Iterator[None]:
+        with patch.object(DatabaseMain, 'acquire', staticmethod(self.acquire)):
+            yield
+
+
+class PoolAcquire:
+    def __init__(self, owner: BenchmarkPool) -> None:
+        self.owner: BenchmarkPool = owner
+        self.connection: Optional[aioodbc.Connection] = None
+
+    async def __aenter__(self) -> BenchmarkDatabase:
+        assert self.owner.pool is not None
+        start: float = time.perf_counter()
+        self.connection = await self.owner.pool.acquire()
+        self.owner.waits.append(time.perf_counter() - start)
+        return BenchmarkDatabase(self.connection, self.owner.isPostgres)
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        assert self.owner.pool is not None
+        assert self.connection is not None
+        try:
+            await self.connection.rollback()
+        finally:
+            await self.owner.pool.release(self.connection)
+            self.connection = None
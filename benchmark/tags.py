@@ -0,0 +1,99 @@
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from typing import Any, List, Optional, Sequence, Set, Tuple  # noqa: F401
+
+from ..library import search
+
+schemaFile: str = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'database-sqlite.sql')
+
+
+def legacyTagMatch(words: Sequence[str],
+                   channel: str) -> Tuple[str, Tuple[Any, ...]]:
+    query: str = '''
+SELECT quoteId FROM quotes q WHERE broadcaster=? AND
+''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
+                    'WHERE t.quoteId=q.quoteId)'] * len(words))
+    return query, (channel,) + tuple(w.lower() for w in words)
+
+
+def createDatabase(quotes: int,
+                   tagsPerQuote: int,
+                   vocabulary: int,
+                   seed: int) -> sqlite3.Connection:
+    rng: random.Random = random.Random(seed)
+    connection: sqlite3.Connection = sqlite3.connect(':memory:')
+    with open(schemaFile) as f:
+        connection.executescript(f.read())
+    tags: List[str] = [f'Tag{i}' for i in range(vocabulary)]
+    weights: List[float] = [1 / (i + 1) for i in range(vocabulary)]
+    quoteRows: List[Tuple[int, str, str]] = []
+    tagRows: List[Tuple[int, str]] = []
+    quoteId: int
+    for quoteId in range(1, quotes + 1):
+        channel: str = 'megotsthis' if quoteId % 2 else 'botgotsthis'
+        quoteRows.append((quoteId, channel, f'Kappa {quoteId}'))
+        chosen: Set[str] = set(
+            rng.choices(tags, weights=weights, k=tagsPerQuote))
+        tagRows.extend((quoteId, tag) for tag in chosen)
+    connection.executemany('INSERT INTO quotes VALUES (?, ?, ?)', quoteRows)
+    connection.executemany('INSERT INTO quotes_tags VALUES (?, ?)', tagRows)
+    connection.commit()
+    connection.execute('ANALYZE')
+    return connection
+
+
+def timeQuery(connection: sqlite3.Connection,
+              query: str,
+              params: Tuple[Any, ...],
+              repeat: int) -> Tuple[float, List[int]]:
+    ids: List[int] = []
+    start: float = time.perf_counter()
+    for _ in range(repeat):
+        ids = sorted(i for i, in connection.execute(query, params))
+    return (time.perf_counter() - start) / repeat, ids
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        description='Compare the tag search query shapes on SQLite')
+    parser.add_argument('--quotes', type=int, default=20000)
+    parser.add_argument('--tags', type=int, default=8)
+    parser.add_argument('--vocabulary', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args: argparse.Namespace = parser.parse_args(argv)
+
+    connection: sqlite3.Connection = createDatabase(
+        args.quotes, args.tags, args.vocabulary, args.seed)
+    wordSets: List[List[str]] = [['tag0'], ['tag0', 'TAG1'],
+                                 ['tag1', 'tag5', 'tag20']]
+    words: List[str]
+    for words in wordSets:
+        legacy: Tuple[str, Tuple[Any, ...]]
+        legacy = legacyTagMatch(words, 'megotsthis')
+        current: Tuple[str, Tuple[Any, ...]]
+        current = search.tagMatch(words, 'megotsthis')
+        legacyTime: float
+        legacyIds: List[int]
+        legacyTime, legacyIds = timeQuery(connection, *legacy, args.repeat)
+        currentTime: float
+        currentIds: List[int]
+        currentTime, currentIds = timeQuery(connection, *current,
+                                            args.repeat)
+        if legacyIds != currentIds:
+            print(f'Mismatched results for {words}', file=sys.stderr)
+            return 1
+        print(f'{" ".join(words):<20} matches={len(currentIds):<6} '
+              f'correlated={legacyTime * 1000:8.2f}ms '
+              f'grouped={currentTime * 1000:8.2f}ms '
+              f'speedup={legacyTime / currentTime:5.1f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
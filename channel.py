@@ -14,6 +14,13 @@ async def commandQuote(args: ChatCommandArgs) -> bool:
     quoteSent: bool = False
     if len(args.message) < 2:
         quoteSent = await library.processRandomQuote(args)
+    elif (len(args.message) == 3 and args.message.lower[1] == 'like'
+            and args.message[2].isdigit()):
+        quoteSent = await library.processSimilarQuote(args,
+                                                      int(args.message[2]))
+    elif len(args.message) >= 3 and args.message.lower[1] == 'best':
+        quoteSent = await library.processBestQuoteSearch(
+            args, list(args.message)[2:])
     else:
         try:
             quoteId: int = int(args.message[1])
@@ -65,6 +72,8 @@ async def commandQuotes(args: ChatCommandArgs) -> bool:
         'insert': library.handleAddQuote,
         'edit': library.handleEditQuote,
         'update': library.handleEditQuote,
+        'history': library.handleQuoteHistory,
+        'revert': library.handleRevertQuote,
         'del': library.handleDeleteQuote,
         'delete': library.handleDeleteQuote,
         'rem': library.handleDeleteQuote,
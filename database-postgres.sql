@@ -4,9 +4,18 @@ CREATE TABLE quotes (
     quote VARCHAR NOT NULL,
     document tsvector
 );
-CREATE INDEX quotes_broadcaster ON quotes (broadcaster);
+CREATE INDEX quotes_broadcaster_id ON quotes (broadcaster, quoteId);
 CREATE INDEX idx_quotes_search ON quotes USING gin(document);
 
+CREATE OR REPLACE FUNCTION quotes_document() RETURNS trigger AS $$
+BEGIN
+    NEW.document := to_tsvector(NEW.quote);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+CREATE TRIGGER quotes_document BEFORE INSERT OR UPDATE OF quote ON quotes
+    FOR EACH ROW EXECUTE PROCEDURE quotes_document();
+
 CREATE TABLE quotes_tags (
     quoteId INTEGER NOT NULL,
     tag VARCHAR NOT NULL,
@@ -14,14 +23,32 @@ CREATE TABLE quotes_tags (
     FOREIGN KEY (quoteId) REFERENCES quotes(quoteId)
         ON DELETE CASCADE ON UPDATE CASCADE
 );
-CREATE INDEX quotes_tags_id ON quotes_tags (quoteId);
+CREATE INDEX quotes_tags_lower ON quotes_tags (LOWER(tag), quoteId);
 
-CREATE TABLE quotes_history (
-    id SERIAL NOT NULL PRIMARY KEY,
+CREATE TABLE quotes_revisions (
     quoteId INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
     createdTime TIMESTAMP NOT NULL,
     broadcaster VARCHAR NOT NULL,
-    quote VARCHAR NOT NULL,
-    editor VARCHAR NOT NULL
+    editor VARCHAR NOT NULL,
+    keyframe BOOLEAN NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (quoteId, revision, createdTime)
+) PARTITION BY RANGE (createdTime);
+CREATE TABLE quotes_revisions_default PARTITION OF quotes_revisions DEFAULT;
+CREATE INDEX quotes_revisions_broadcaster ON quotes_revisions (broadcaster);
+
+CREATE TABLE quotes_migrations (
+    version INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    appliedTime TIMESTAMP NOT NULL
 );
-CREATE INDEX quotes_history_broadcaster ON quotes_history (broadcaster);
+INSERT INTO quotes_migrations (version, name, appliedTime) VALUES
+    (1, 'sqlite trigram search', CURRENT_TIMESTAMP),
+    (2, 'lowercase tag index', CURRENT_TIMESTAMP),
+    (3, 'broadcaster quote id index', CURRENT_TIMESTAMP),
+    (4, 'history quote id index', CURRENT_TIMESTAMP),
+    (5, 'postgres document trigger', CURRENT_TIMESTAMP),
+    (6, 'delta encoded history', CURRENT_TIMESTAMP),
+    (7, 'partitioned history', CURRENT_TIMESTAMP),
+    (8, 'sqlite incremental vacuum', CURRENT_TIMESTAMP);
@@ -1,9 +1,10 @@
+PRAGMA auto_vacuum = INCREMENTAL;
 CREATE TABLE quotes (
     quoteId INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
     broadcaster VARCHAR NOT NULL,
     quote VARCHAR NOT NULL
 );
-CREATE INDEX quotes_broadcaster ON quotes (broadcaster);
+CREATE INDEX quotes_broadcaster_id ON quotes (broadcaster, quoteId);
 
 CREATE TABLE quotes_tags (
     quoteId INTEGER NOT NULL,
@@ -12,14 +13,50 @@ CREATE TABLE quotes_tags (
     FOREIGN KEY (quoteId) REFERENCES quotes(quoteId)
         ON DELETE CASCADE ON UPDATE CASCADE
 );
-CREATE INDEX quotes_tags_id ON quotes_tags (quoteId);
+CREATE INDEX quotes_tags_lower ON quotes_tags (LOWER(tag), quoteId);
 
-CREATE TABLE quotes_history (
-    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+CREATE TABLE quotes_revisions (
     quoteId INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
     createdTime TIMESTAMP NOT NULL,
     broadcaster VARCHAR NOT NULL,
-    quote VARCHAR NOT NULL,
-    editor VARCHAR NOT NULL
+    editor VARCHAR NOT NULL,
+    keyframe BOOLEAN NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (quoteId, revision)
 );
-CREATE INDEX quotes_history_broadcaster ON quotes_history (broadcaster);
+CREATE INDEX quotes_revisions_broadcaster ON quotes_revisions (broadcaster);
+
+CREATE VIRTUAL TABLE quotes_search USING fts5(
+    quote,
+    content='quotes',
+    content_rowid='quoteId',
+    tokenize='trigram'
+);
+CREATE TRIGGER quotes_search_insert AFTER INSERT ON quotes BEGIN
+    INSERT INTO quotes_search (rowid, quote) VALUES (new.quoteId, new.quote);
+END;
+CREATE TRIGGER quotes_search_delete AFTER DELETE ON quotes BEGIN
+    INSERT INTO quotes_search (quotes_search, rowid, quote)
+        VALUES ('delete', old.quoteId, old.quote);
+END;
+CREATE TRIGGER quotes_search_update AFTER UPDATE OF quote ON quotes BEGIN
+    INSERT INTO quotes_search (quotes_search, rowid, quote)
+        VALUES ('delete', old.quoteId, old.quote);
+    INSERT INTO quotes_search (rowid, quote) VALUES (new.quoteId, new.quote);
+END;
+
+CREATE TABLE quotes_migrations (
+    version INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    appliedTime TIMESTAMP NOT NULL
+);
+INSERT INTO quotes_migrations (version, name, appliedTime) VALUES
+    (1, 'sqlite trigram search', CURRENT_TIMESTAMP),
+    (2, 'lowercase tag index', CURRENT_TIMESTAMP),
+    (3, 'broadcaster quote id index', CURRENT_TIMESTAMP),
+    (4, 'history quote id index', CURRENT_TIMESTAMP),
+    (5, 'postgres document trigger', CURRENT_TIMESTAMP),
+    (6, 'delta encoded history', CURRENT_TIMESTAMP),
+    (7, 'partitioned history', CURRENT_TIMESTAMP),
+    (8, 'sqlite incremental vacuum', CURRENT_TIMESTAMP);
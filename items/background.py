@@ -0,0 +1,13 @@
+﻿from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Iterable, Tuple
+
+from .. import background
+
+
+def tasks() -> Iterable[Tuple[Callable[[datetime], Awaitable[None]],
+                              timedelta]]:
+    return [
+        (background.loadSearchIndex, timedelta(minutes=5)),
+        (background.startHistoryWriter, timedelta(minutes=1)),
+        (background.ensureHistoryPartitions, timedelta(hours=6)),
+        ]
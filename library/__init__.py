@@ -1,5 +1,5 @@
 from datetime import timedelta
-from typing import List, Optional, Set  # noqa: F401
+from typing import List, Optional, Tuple  # noqa: F401
 
 import pyodbc
 
@@ -7,6 +7,10 @@ import bot
 from lib.data import ChatCommandArgs
 from lib.helper import message
 from . import database as db_helper
+from . import history, similar
+
+listLimit: int = 20
+historyLimit: int = 5
 
 
 async def quoteInCooldown(args: ChatCommandArgs) -> bool:
@@ -58,6 +62,32 @@ async def processRandomQuoteSearch(args: ChatCommandArgs,
     return True
 
 
+async def processBestQuoteSearch(args: ChatCommandArgs,
+                                 words: List[str]) -> bool:
+    quotes: List[Tuple[int, str]]
+    quotes = await db_helper.getBestQuotesBySearch(args.chat.channel, words, 1)
+    if not quotes:
+        args.chat.send('Cannot find a matching quote')
+    else:
+        args.chat.send(f'Quote: {quotes[0][1]}')
+    return True
+
+
+async def processSimilarQuote(args: ChatCommandArgs, quoteId: int) -> bool:
+    if not similar.available():
+        args.chat.send('Similar quotes are not available')
+        return False
+    quotes: Optional[List[Tuple[int, str]]]
+    quotes = await db_helper.getSimilarQuotes(args.chat.channel, quoteId, 1)
+    if quotes is None:
+        args.chat.send('Cannot find that quote')
+    elif not quotes:
+        args.chat.send('Cannot find a similar quote')
+    else:
+        args.chat.send(f'Quote: {quotes[0][1]}')
+    return True
+
+
 async def processAnyRandomQuote(args: ChatCommandArgs) -> bool:
     quote: Optional[str]
     broadcaster: Optional[str]
@@ -66,7 +96,7 @@ async def processAnyRandomQuote(args: ChatCommandArgs) -> bool:
         args.chat.send('There is no quotes added')
     else:
         assert broadcaster is not None
-        sendQuoteWithBroadcaster(args, broadcaster, quote)
+        await sendQuoteWithBroadcaster(args, broadcaster, quote)
     return True
 
 
@@ -78,7 +108,7 @@ async def processAnyQuoteId(args: ChatCommandArgs, quoteId: int) -> bool:
         args.chat.send('Cannot find that quote')
     else:
         assert broadcaster is not None
-        sendQuoteWithBroadcaster(args, broadcaster, quote)
+        await sendQuoteWithBroadcaster(args, broadcaster, quote)
     return True
 
 
@@ -91,7 +121,7 @@ async def processAnyRandomQuoteSearch(args: ChatCommandArgs,
         args.chat.send('Cannot find a matching quote')
     else:
         assert broadcaster is not None
-        sendQuoteWithBroadcaster(args, broadcaster, quote)
+        await sendQuoteWithBroadcaster(args, broadcaster, quote)
     return True
 
 
@@ -154,6 +184,63 @@ Quote id {id} has been updated for {args.chat.channel}''')
     return True
 
 
+async def handleQuoteHistory(args: ChatCommandArgs) -> bool:
+    if len(args.message) < 3:
+        return False
+
+    id: int
+    try:
+        id = int(args.message[2])
+    except ValueError:
+        args.chat.send('Quote id is not a number.')
+        return True
+    try:
+        revisions: List[history.Revision] = await db_helper.getQuoteHistory(
+            args.chat.channel, id, historyLimit)
+        if not revisions:
+            args.chat.send(f'Quote id {id} has no history.')
+            return True
+        items: List[str] = [
+            f'''\
+#{r.revision} by {r.editor} on {r.createdTime:%Y-%m-%d}: {r.quote}'''
+            for r in revisions]
+        args.chat.send(
+            message.messagesFromItems(items, f'Quote id {id} history: '))
+    except pyodbc.Error:
+        args.chat.send('Unknown error.')
+        raise
+    return True
+
+
+async def handleRevertQuote(args: ChatCommandArgs) -> bool:
+    if len(args.message) < 4:
+        return False
+
+    id: int
+    revision: int
+    try:
+        id = int(args.message[2])
+        revision = int(args.message[3])
+    except ValueError:
+        args.chat.send('Quote id or revision is not a number.')
+        return True
+    try:
+        result: bool = await db_helper.revertQuote(
+            args.chat.channel, args.nick, id, revision)
+        if not result:
+            args.chat.send(f'''\
+Quote id {id} could not been reverted. It or revision {revision} may not \
+exist.''')
+            return True
+        args.chat.send(f'''\
+Quote id {id} has been reverted to revision {revision} for \
+{args.chat.channel}''')
+    except pyodbc.Error:
+        args.chat.send('Quote could not been reverted.')
+        raise
+    return True
+
+
 async def handleDeleteQuote(args: ChatCommandArgs) -> bool:
     if len(args.message) < 3:
         return False
@@ -245,37 +332,20 @@ async def processQuoteTags(args: ChatCommandArgs,
                            quoteId: int,
                            tags: List[str]) -> bool:
     try:
-        quote = await db_helper.getQuoteById(args.chat.channel, quoteId)
-        if quote is None:
+        result: Optional[db_helper.QuoteTags]
+        result = await db_helper.toggleQuoteTags(args.chat.channel, quoteId,
+                                                 tags)
+        if result is None:
             args.chat.send(f'''\
 Quote id {quoteId} could not been found. It may not exist.''')
             return True
 
-        currentTags: Set[str]
-        currentTags = await db_helper.getTagsOfQuote(quoteId)
-        ignoreTags: List[str] = []
-        addTags: List[str] = []
-        deleteTags: List[str] = []
-        tag: str
-        for tag in tags:
-            if tag[0] in '0123456789':
-                ignoreTags.append(tag)
-                continue
-            if tag in currentTags:
-                deleteTags.append(tag)
-            else:
-                addTags.append(tag)
-        if addTags:
-            await db_helper.addTagsToQuote(quoteId, addTags)
-        if deleteTags:
-            await db_helper.deleteTagsToQuote(quoteId, deleteTags)
-
-        if addTags or deleteTags:
+        if result.added or result.deleted:
             args.chat.send(f'Quote id {quoteId} tags have been updated')
-        if ignoreTags:
+        if result.ignored:
             args.chat.send(f'''\
-These tags could not be used: {', '.join(ignoreTags)}''')
-        if not addTags and not deleteTags and not ignoreTags:
+These tags could not be used: {', '.join(result.ignored)}''')
+        if not result.added and not result.deleted and not result.ignored:
             args.chat.send('No valid tags was specified')
     except pyodbc.Error:
         args.chat.send('Quote tags could not been updated.')
@@ -307,13 +377,19 @@ async def handleListQuoteIds(args: ChatCommandArgs) -> bool:
         return False
 
     try:
-        ids: List[int] = await db_helper.getQuoteIdsByWords(
-            args.chat.channel, list(args.message)[2:])
-        quoteIds: List[str] = [str(i) for i in ids]
+        quoteIds: List[str] = []
+        total: int = 0
+        quoteId: int
+        async for quoteId, total in db_helper.iterateQuoteIdsByWords(
+                args.chat.channel, list(args.message)[2:], listLimit):
+            quoteIds.append(str(quoteId))
         if not quoteIds:
             args.chat.send('No quotes found with those parameters')
             return True
-        args.chat.send(message.messagesFromItems(quoteIds, 'Possible IDs: '))
+        prefix: str = 'Possible IDs: '
+        if total > len(quoteIds):
+            prefix = f'Possible IDs (first {len(quoteIds)} of {total}): '
+        args.chat.send(message.messagesFromItems(quoteIds, prefix))
     except pyodbc.Error:
         args.chat.send('Unknown error.')
         raise
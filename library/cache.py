@@ -0,0 +1,167 @@
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Generic, Iterable, Optional  # noqa: F401
+from typing import Tuple, TypeVar  # noqa: F401
+
+K = TypeVar('K')
+V = TypeVar('V')
+
+channelSize: int = 128
+maxChannels: int = 1024
+anySize: int = 1024
+tagsSize: int = 1024
+ttlSeconds: float = 300.0
+
+
+class CacheStats:
+    __slots__ = ('hits', 'misses', 'evictions')
+
+    def __init__(self) -> None:
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def asDict(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class LruCache(Generic[K, V]):
+    def __init__(self,
+                 maxsize: int,
+                 stats: Optional[CacheStats] = None,
+                 ttl: Optional[float] = None) -> None:
+        self.maxsize: int = maxsize
+        self.stats: CacheStats = stats or CacheStats()
+        self.ttl: Optional[float] = ttl
+        self._entries: 'OrderedDict[K, Tuple[float, V]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entries
+
+    def get(self, key: K) -> Optional[V]:
+        entry: Optional[Tuple[float, V]] = self._entries.get(key)
+        ttl: float = self.ttl if self.ttl is not None else ttlSeconds
+        if entry is not None and time.monotonic() - entry[0] >= ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.stats.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats.hits += 1
+        return entry[1]
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = time.monotonic(), value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def pop(self, key: K) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_quoteStats: CacheStats = CacheStats()
+_quotes: 'OrderedDict[str, LruCache[int, str]]' = OrderedDict()
+_anyQuotes: 'LruCache[int, Tuple[str, str]]' = LruCache(anySize)
+_tags: 'LruCache[int, FrozenSet[str]]' = LruCache(tagsSize)
+
+
+def _channelQuotes(channel: str,
+                   create: bool) -> 'Optional[LruCache[int, str]]':
+    quotes: Optional[LruCache[int, str]] = _quotes.get(channel)
+    if quotes is not None:
+        _quotes.move_to_end(channel)
+    elif create:
+        quotes = LruCache(channelSize, _quoteStats)
+        _quotes[channel] = quotes
+        while len(_quotes) > maxChannels:
+            _quotes.popitem(last=False)
+    return quotes
+
+
+def getQuote(channel: str, quoteId: int) -> Optional[str]:
+    quotes: Optional[LruCache[int, str]] = _channelQuotes(channel, False)
+    if quotes is None:
+        _quoteStats.misses += 1
+        return None
+    return quotes.get(quoteId)
+
+
+def putQuote(channel: str, quoteId: int, quote: str) -> None:
+    quotes: Optional[LruCache[int, str]] = _channelQuotes(channel, True)
+    assert quotes is not None
+    quotes.put(quoteId, quote)
+
+
+def getAnyQuote(quoteId: int) -> Tuple[Optional[str], Optional[str]]:
+    entry: Optional[Tuple[str, str]] = _anyQuotes.get(quoteId)
+    return entry if entry is not None else (None, None)
+
+
+def putAnyQuote(quoteId: int, quote: str, broadcaster: str) -> None:
+    _anyQuotes.put(quoteId, (quote, broadcaster))
+
+
+def updateQuote(channel: str, quoteId: int, quote: str) -> None:
+    quotes: Optional[LruCache[int, str]] = _channelQuotes(channel, False)
+    if quotes is not None and quoteId in quotes:
+        quotes.put(quoteId, quote)
+    if quoteId in _anyQuotes:
+        _anyQuotes.put(quoteId, (quote, channel))
+
+
+def discardQuote(channel: str, quoteId: int) -> None:
+    quotes: Optional[LruCache[int, str]] = _channelQuotes(channel, False)
+    if quotes is not None:
+        quotes.pop(quoteId)
+    _anyQuotes.pop(quoteId)
+    _tags.pop(quoteId)
+
+
+def getTags(quoteId: int) -> Optional[FrozenSet[str]]:
+    return _tags.get(quoteId)
+
+
+def putTags(quoteId: int, tags: Iterable[str]) -> None:
+    _tags.put(quoteId, frozenset(tags))
+
+
+def discardTags(quoteId: int) -> None:
+    _tags.pop(quoteId)
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    quotes: Dict[str, int] = _quoteStats.asDict()
+    quotes['channels'] = len(_quotes)
+    quotes['size'] = sum(len(q) for q in _quotes.values())
+    anyQuotes: Dict[str, int] = _anyQuotes.stats.asDict()
+    anyQuotes['size'] = len(_anyQuotes)
+    tags: Dict[str, int] = _tags.stats.asDict()
+    tags['size'] = len(_tags)
+    return {
+        'quotes': quotes,
+        'any': anyQuotes,
+        'tags': tags,
+    }
+
+
+def clear() -> None:
+    _quotes.clear()
+    _anyQuotes.clear()
+    _tags.clear()
+    for stat in [_quoteStats, _anyQuotes.stats, _tags.stats]:
+        stat.hits = 0
+        stat.misses = 0
+        stat.evictions = 0
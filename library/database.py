@@ -1,327 +1,842 @@
-﻿from typing import Any, List, Optional, Set, Sequence, Tuple  # noqa: F401
+﻿import heapq
+import random
+from datetime import datetime
+from typing import Any, FrozenSet, List, Optional, Set, Sequence  # noqa: F401
+from typing import AsyncIterable, AsyncIterator, Callable, Dict  # noqa: F401
+from typing import NamedTuple, Tuple  # noqa: F401
 
 import aioodbc.cursor  # noqa: F401
 
 from lib.database import DatabaseMain
+from . import cache, history, historywriter, membership, metrics, migration
+from . import quoteids
+from . import search, searchcache, searchindex, searchquery, similar
+from . import statements, transfer
+from .transfer import ImportProgress, TransferRow
 
+randomAttempts: int = 3
+importChunk: int = 100
 
+
+class QuoteTags(NamedTuple):
+    added: List[str]
+    deleted: List[str]
+    ignored: List[str]
+
+
+async def _setsDocument(db: DatabaseMain,
+                        cursor: 'aioodbc.cursor.Cursor') -> bool:
+    return db.isPostgres and not await migration.applied(db, cursor, 5)
+
+
+async def _legacyHistory(db: DatabaseMain,
+                         cursor: 'aioodbc.cursor.Cursor',
+                         lock: bool = False) -> bool:
+    return not await migration.applied(db, cursor, 6, lock)
+
+
+def _quoteAdded(channel: str, quoteId: int, quote: str) -> None:
+    quoteids.add(channel, quoteId)
+    membership.addQuote(channel, quote)
+    searchindex.addQuote(channel, quoteId, quote)
+    similar.putQuote(channel, quoteId, quote)
+    cache.putQuote(channel, quoteId, quote)
+    searchcache.invalidate(channel)
+
+
+def _quoteUpdated(channel: str, quoteId: int, quote: str) -> None:
+    membership.addQuote(channel, quote)
+    searchindex.addQuote(channel, quoteId, quote)
+    similar.putQuote(channel, quoteId, quote)
+    cache.updateQuote(channel, quoteId, quote)
+    searchcache.invalidate(channel)
+
+
+def _quoteDeleted(channel: str, quoteId: int) -> None:
+    quoteids.remove(channel, quoteId)
+    searchindex.removeQuote(quoteId)
+    similar.removeQuote(channel, quoteId)
+    cache.discardQuote(channel, quoteId)
+    searchcache.invalidate(channel)
+
+
+def _quoteCopied(channel: str,
+                 fromQuoteId: int,
+                 quoteId: int,
+                 quote: str) -> None:
+    membership.reset(channel)
+    _quoteAdded(channel, quoteId, quote)
+    searchindex.copyTags(fromQuoteId, quoteId)
+
+
+def _tagsChanged(channel: Optional[str],
+                 quoteId: int,
+                 added: Sequence[str],
+                 deleted: Sequence[str]) -> None:
+    membership.addTags(channel, added)
+    searchindex.addTags(quoteId, added)
+    searchindex.removeTags(quoteId, deleted)
+    cache.discardTags(quoteId)
+    if channel is None:
+        searchcache.invalidateAll()
+    else:
+        searchcache.invalidate(channel)
+
+
+@metrics.instrument
 async def getRandomQuote(channel: str) -> Optional[str]:
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
-SELECT quote FROM quotes WHERE broadcaster=? ORDER BY random() LIMIT 1
+SELECT quote FROM quotes WHERE broadcaster=? AND quoteId=?
 '''
-        await cursor.execute(query, (channel,))
-        return (await cursor.fetchone() or [None])[0]
-
-
+        attempt: int
+        for attempt in range(randomAttempts):
+            quoteIds: quoteids.ChannelQuoteIds
+            quoteIds = await quoteids.load(cursor, channel)
+            quoteId: Optional[int] = quoteIds.choice()
+            if quoteId is None:
+                return None
+            quote: Optional[str] = cache.getQuote(channel, quoteId)
+            if quote is not None:
+                return quote
+            await cursor.execute(query, (channel, quoteId))
+            row: Optional[Tuple[str]] = await cursor.fetchone()
+            if row is not None:
+                cache.putQuote(channel, quoteId, row[0])
+                return row[0]
+            quoteids.reset(channel)
+        return None
+
+
+@metrics.instrument
 async def getQuoteById(channel: str,
                        id: int) -> Optional[str]:
+    quote: Optional[str] = cache.getQuote(channel, id)
+    if quote is not None:
+        return quote
+    if quoteids.missing(channel, id):
+        return None
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 SELECT quote FROM quotes WHERE broadcaster=? AND quoteId=?
 '''
         await cursor.execute(query, (channel, id))
-        return (await cursor.fetchone() or [None])[0]
+        quote = (await cursor.fetchone() or [None])[0]
+        if quote is not None:
+            cache.putQuote(channel, id, quote)
+        return quote
 
 
-async def getRandomQuoteBySearch(channel: str,
-                                 words: Sequence[str]) -> Optional[str]:
+def _searchQuery(condition: str, anyChannel: bool, tags: str) -> str:
+    query: str
+    if anyChannel:
+        query = f'''
+SELECT quoteId FROM quotes WHERE {condition}'''
+    else:
+        query = f'''
+SELECT quoteId FROM quotes WHERE broadcaster=? AND {condition}'''
+    if tags:
+        query += f'''
+    UNION ALL
+{tags}'''
+    return query
+
+
+async def _searchStatement(db: DatabaseMain,
+                           cursor: 'aioodbc.cursor.Cursor',
+                           channel: Optional[str],
+                           words: Sequence[str],
+                           plain: Optional[List[str]]
+                           ) -> Optional[Tuple[str, Tuple[Any, ...]]]:
+    fts: bool = not db.isPostgres and await search.hasSqliteSearch(cursor)
+    compiled: searchquery.Compiled
+    compiled = searchquery.compile(words, db.isPostgres, fts)
+    if not compiled.condition:
+        return None
+    if not db.isPostgres and channel is not None and plain is not None:
+        await membership.load(cursor, channel)
+    tags: str = ''
+    tagParams: Tuple[Any, ...] = ()
+    if plain is not None:
+        tags, tagParams = search.tagMatch(plain, channel)
+    query: str = statements.statement(
+        ('_searchQuoteIds', compiled.shape, channel is None, len(tagParams)),
+        lambda: _searchQuery(compiled.condition, channel is None, tags))
+    params: Tuple[Any, ...] = compiled.params + tagParams
+    if channel is not None:
+        params = (channel,) + params
+    return query, params
+
+
+@metrics.instrument
+async def _searchQuoteIds(channel: Optional[str],
+                          words: Sequence[str]) -> List[int]:
+    plain: Optional[List[str]]
+    plain = searchquery.plainWords(searchquery.parsed(words))
+    if plain is not None and searchindex.loaded:
+        return searchindex.matches(channel, plain)
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
-        query: str
-        params: Tuple[str, ...]
-        if db.isPostgres:
-            query = '''
-SELECT quoteId FROM quotes WHERE broadcaster=? AND document @@ to_tsquery(?)
-    UNION SELECT quoteId FROM quotes q WHERE broadcaster=? AND
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
-            query = '''
-SELECT quote FROM quotes
-    WHERE quoteId=(
-        SELECT quoteId FROM (%s) AS q ORDER BY RANDOM() LIMIT 1)''' % query
-            params = ((channel, ' | '.join(words), channel,)
-                      + tuple(w.lower() for w in words))
-            await cursor.execute(query, params)
-            return (await cursor.fetchone() or [None])[0]
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        statement: Optional[Tuple[str, Tuple[Any, ...]]]
+        statement = await _searchStatement(db, cursor, channel, words, plain)
+        if statement is None:
+            return []
+        return list(dict.fromkeys(
+            [i async for i, in await cursor.execute(*statement)]))
 
-        query = '''
-SELECT quoteId FROM quotes WHERE broadcaster=? AND
-''' + ' AND '.join(['quote LIKE ?'] * len(words)) + '''
-    UNION SELECT quoteId FROM quotes q WHERE broadcaster=? AND
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
-        query = '''
-SELECT quote FROM quotes
-    WHERE quoteId=(
-        SELECT quoteId FROM (%s) AS q ORDER BY RANDOM() LIMIT 1)''' % query
-        params = ((channel,) + tuple(f'%{w}%' for w in words) + (channel,)
-                  + tuple(w.lower() for w in words))
-        await cursor.execute(query, params)
-        return (await cursor.fetchone() or [None])[0]
 
+def _mayMatch(channel: str, words: Sequence[str]) -> bool:
+    plain: Optional[List[str]]
+    plain = searchquery.plainWords(searchquery.parsed(words))
+    return plain is None or membership.mayMatch(channel, plain)
 
+
+@metrics.instrument
+async def getRandomQuoteBySearch(channel: str,
+                                 words: Sequence[str]) -> Optional[str]:
+    if not _mayMatch(channel, words):
+        return None
+    attempt: int
+    for attempt in range(randomAttempts):
+        quoteIds: Tuple[int, ...] = await searchcache.matches(
+            channel, words, lambda: _searchQuoteIds(channel, words))
+        if not quoteIds:
+            return None
+        quote: Optional[str] = await getQuoteById(channel,
+                                                  random.choice(quoteIds))
+        if quote is not None:
+            return quote
+        searchcache.invalidate(channel)
+    return None
+
+
+def _bestQuery(condition: str, rank: str) -> str:
+    order: str = 'quoteId'
+    if rank:
+        order = f'ts_rank_cd(document, {rank}) DESC, quoteId'
+    return f'''
+SELECT quoteId, quote FROM quotes WHERE broadcaster=? AND {condition}
+    ORDER BY {order} LIMIT ?
+'''
+
+
+@metrics.instrument
+async def getBestQuotesBySearch(channel: str,
+                                words: Sequence[str],
+                                k: int) -> List[Tuple[int, str]]:
+    plain: Optional[List[str]]
+    plain = searchquery.plainWords(searchquery.parsed(words))
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        query: str
+        params: Tuple[Any, ...]
+        if not db.isPostgres and plain is not None:
+            query, params = await search.sqliteRankedMatch(cursor, channel,
+                                                           plain, k)
+            return [(i, q)
+                    async for i, q in await cursor.execute(query, params)]
+        fts: bool = not db.isPostgres and await search.hasSqliteSearch(cursor)
+        compiled: searchquery.Compiled
+        compiled = searchquery.compile(words, db.isPostgres, fts)
+        if not compiled.condition:
+            return []
+        query = statements.statement(
+            ('getBestQuotesBySearch', compiled.shape),
+            lambda: _bestQuery(compiled.condition, compiled.rank))
+        params = ((channel,) + compiled.params + compiled.rankParams
+                  + (k,))
+        return [(i, q) async for i, q in await cursor.execute(query, params)]
+
+
+@metrics.instrument
 async def getAnyRandomQuote() -> Tuple[Optional[str], Optional[str]]:
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
-SELECT quote, broadcaster FROM quotes ORDER BY random() LIMIT 1
+SELECT (SELECT MIN(quoteId) FROM quotes), (SELECT MAX(quoteId) FROM quotes)
 '''
         await cursor.execute(query)
-        row: Optional[Tuple[str, str]] = await cursor.fetchone()
+        low: Optional[int]
+        high: Optional[int]
+        low, high = await cursor.fetchone() or (None, None)
+        if low is None or high is None:
+            return None, None
+
+        row: Optional[Tuple[str, str]]
+        query = '''
+SELECT quote, broadcaster FROM quotes WHERE quoteId=?
+'''
+        attempt: int
+        for attempt in range(randomAttempts):
+            await cursor.execute(query, (random.randint(low, high),))
+            row = await cursor.fetchone()
+            if row:
+                return row[0], row[1]
+
+        query = '''
+SELECT COUNT(*) FROM quotes
+'''
+        await cursor.execute(query)
+        count: int = int((await cursor.fetchone() or [0])[0])
+        if not count:
+            return None, None
+        query = '''
+SELECT quote, broadcaster FROM quotes ORDER BY quoteId LIMIT 1 OFFSET ?
+'''
+        await cursor.execute(query, (random.randrange(count),))
+        row = await cursor.fetchone()
         return (row[0], row[1]) if row else (None, None)
 
 
+@metrics.instrument
 async def getAnyQuoteById(id: int
                           ) -> Tuple[Optional[str], Optional[str]]:
+    quote: Optional[str]
+    broadcaster: Optional[str]
+    quote, broadcaster = cache.getAnyQuote(id)
+    if quote is not None:
+        return quote, broadcaster
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 SELECT quote, broadcaster FROM quotes WHERE quoteId=?
 '''
         await cursor.execute(query, (id,))
         row: Optional[Tuple[str, str]] = await cursor.fetchone()
-        return (row[0], row[1]) if row else (None, None)
+        if not row:
+            return None, None
+        cache.putAnyQuote(id, row[0], row[1])
+        return row[0], row[1]
 
 
+@metrics.instrument
 async def getAnyRandomQuoteBySearch(words: Sequence[str]
                                     ) -> Tuple[Optional[str], Optional[str]]:
-    db: DatabaseMain
-    cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
-        query: str
-        params: Tuple[str, ...]
-        row: Optional[Tuple[str, str]]
-        if db.isPostgres:
-            query = '''
-SELECT quoteId FROM quotes WHERE document @@ to_tsquery(?)
-    UNION SELECT quoteId FROM quotes q WHERE
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
-            query = '''
-SELECT quote, broadcaster FROM quotes
-    WHERE quoteId=(
-        SELECT quoteId FROM (%s) AS q ORDER BY RANDOM() LIMIT 1)''' % query
-            params = ((' | '.join(words),) + tuple(w.lower() for w in words))
-            await cursor.execute(query, params)
-            row = await cursor.fetchone()
-            return (row[0], row[1]) if row else (None, None)
-
-        query = '''
-SELECT quoteId FROM quotes WHERE 1=1 AND
-''' + ' AND '.join(['quote LIKE ?'] * len(words)) + '''
-    UNION SELECT quoteId FROM quotes q WHERE 1=1 AND
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
-        query = f'''
-SELECT quote, broadcaster FROM quotes WHERE quoteId=(
-    SELECT quoteId FROM ({query}) AS q ORDER BY RANDOM() LIMIT 1)
-'''
-        params = (tuple(f'%{w}%' for w in words)
-                  + tuple(w.lower() for w in words))
-        await cursor.execute(query, params)
-        row = await cursor.fetchone()
-        return (row[0], row[1]) if row else (None, None)
-
-
+    attempt: int
+    for attempt in range(randomAttempts):
+        quoteIds: Tuple[int, ...] = await searchcache.matches(
+            None, words, lambda: _searchQuoteIds(None, words))
+        if not quoteIds:
+            break
+        quote: Optional[str]
+        broadcaster: Optional[str]
+        quote, broadcaster = await getAnyQuoteById(random.choice(quoteIds))
+        if quote is not None:
+            return quote, broadcaster
+        searchcache.invalidateAll()
+    return None, None
+
+
+@metrics.instrument
 async def addQuote(channel: str,
                    nick: str,
                    quote: str) -> int:
+    deferred: bool = historywriter.enabled()
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
-        query: str
-        quoteId: int
-        if db.isPostgres:
-            query = '''
-INSERT INTO quotes (broadcaster, quote, document) VALUES (?, ?, to_tsvector(?))
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        query: str = '''
+INSERT INTO quotes (broadcaster, quote) VALUES (?, ?) RETURNING quoteId
 '''
-            await cursor.execute(query, (channel, quote, quote))
-            await cursor.execute('SELECT lastval()')
-            quoteId = int((await cursor.fetchone() or [0])[0])
-        else:
+        params: Tuple[Any, ...] = channel, quote
+        if await _setsDocument(db, cursor):
             query = '''
-INSERT INTO quotes (broadcaster, quote) VALUES (?, ?)
+INSERT INTO quotes (broadcaster, quote, document)
+    VALUES (?, ?, to_tsvector(?))
+    RETURNING quoteId
 '''
-            await cursor.execute(query, (channel, quote))
-            await cursor.execute('SELECT last_insert_rowid()')
-            quoteId = int((await cursor.fetchone() or [0])[0])
-
-        query = '''
-INSERT INTO quotes_history (quoteId, createdTime, broadcaster, quote, editor)
-    VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?)
-'''
-        await cursor.execute(query, (quoteId, channel, quote, nick))
+            params = channel, quote, quote
+        await cursor.execute(query, params)
+        quoteId: int = int((await cursor.fetchone() or [0])[0])
+        if not deferred:
+            await history.write(
+                cursor, [history.record(quoteId, channel, quote, nick)],
+                await _legacyHistory(db, cursor, True), db.isPostgres)
         await db.commit()
-        return quoteId
+    if deferred:
+        await historywriter.put(quoteId, channel, quote, nick)
+    _quoteAdded(channel, quoteId, quote)
+    return quoteId
 
 
+@metrics.instrument
 async def updateQuote(channel: str,
                       nick: str,
                       quoteId: int,
                       quote: str) -> bool:
+    deferred: bool = historywriter.enabled()
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
-        query: str
-        if db.isPostgres:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        query: str = '''
+UPDATE quotes SET quote=? WHERE quoteId=? AND broadcaster=?
+'''
+        params: Tuple[Any, ...] = quote, quoteId, channel
+        if await _setsDocument(db, cursor):
             query = '''
 UPDATE quotes SET quote=?, document=to_tsvector(?)
     WHERE quoteId=? AND broadcaster=?
-            '''
-            await cursor.execute(query, (quote, quote, quoteId, channel))
-        else:
-            query = '''
-UPDATE quotes SET quote=? WHERE quoteId=? AND broadcaster=?
 '''
-            await cursor.execute(query, (quote, quoteId, channel))
+            params = quote, quote, quoteId, channel
+        await cursor.execute(query, params)
         if cursor.rowcount == 0:
             return False
+        if not deferred:
+            await history.write(
+                cursor, [history.record(quoteId, channel, quote, nick)],
+                await _legacyHistory(db, cursor, True), db.isPostgres)
+        await db.commit()
+    if deferred:
+        await historywriter.put(quoteId, channel, quote, nick)
+    _quoteUpdated(channel, quoteId, quote)
+    return True
 
-        query = '''
-INSERT INTO quotes_history (quoteId, createdTime, broadcaster, quote, editor)
-    VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?)
+
+@metrics.instrument
+async def getQuoteHistory(channel: str,
+                          quoteId: int,
+                          limit: int) -> List[history.Revision]:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        query: str = '''
+SELECT 1 FROM quotes WHERE quoteId=? AND broadcaster=?
 '''
-        await cursor.execute(query, (quoteId, channel, quote, nick))
-        await db.commit()
-        return True
+        await cursor.execute(query, (quoteId, channel))
+        if await cursor.fetchone() is None:
+            return []
+        revisions: List[history.Revision] = await history.latest(
+            cursor, quoteId, limit, await _legacyHistory(db, cursor))
+        return revisions[::-1]
 
 
+@metrics.instrument
+async def revertQuote(channel: str,
+                      nick: str,
+                      quoteId: int,
+                      revision: int) -> bool:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        target: Optional[history.Revision] = await history.revision(
+            cursor, quoteId, revision, await _legacyHistory(db, cursor))
+    if target is None:
+        return False
+    return await updateQuote(channel, nick, quoteId, target.quote)
+
+
+@metrics.instrument
 async def deleteQuote(channel: str,
                       quoteId: int) -> bool:
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 DELETE FROM quotes WHERE quoteId=? AND broadcaster=?
 '''
         await cursor.execute(query, (quoteId, channel))
         await db.commit()
-        return cursor.rowcount != 0
+        if cursor.rowcount == 0:
+            return False
+        _quoteDeleted(channel, quoteId)
+        return True
 
 
+@metrics.instrument
 async def copyQuote(from_channel: str,
                     to_channel: str,
                     nick: str,
                     quoteId: int) -> Optional[int]:
+    deferred: bool = historywriter.enabled()
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
-SELECT quote FROM quotes WHERE quoteId=? AND broadcaster=?
-'''
-        await cursor.execute(query, (quoteId, from_channel))
-        quote: Optional[str] = ((await cursor.fetchone()) or [None])[0]
-        if quote is None:
-            return None
-        newQuoteId: int
-        if db.isPostgres:
-            query = '''
-INSERT INTO quotes (broadcaster, quote, document) VALUES (?, ?, to_tsvector(?))
-'''
-            await cursor.execute(query, (to_channel, quote, quote))
-            await cursor.execute('SELECT lastval()')
-            newQuoteId = int((await cursor.fetchone() or [0])[0])
-        else:
-            query = '''
-INSERT INTO quotes (broadcaster, quote) VALUES (?, ?)
-'''
-            await cursor.execute(query, (to_channel, quote))
-            await cursor.execute('SELECT last_insert_rowid()')
-            newQuoteId = int((await cursor.fetchone() or [0])[0])
-
-        query = '''
-SELECT tag FROM quotes_tags WHERE quoteId=?
+INSERT INTO quotes (broadcaster, quote)
+    SELECT ?, quote FROM quotes WHERE quoteId=? AND broadcaster=?
+    RETURNING quoteId, quote
 '''
-        quoteTagsParams: List[Tuple[int, str]]
-        quoteTagsParams = [(newQuoteId, t) async for t,
-                           in await cursor.execute(query, (quoteId,))]
-        if quoteTagsParams:
+        if await _setsDocument(db, cursor):
             query = '''
-INSERT INTO quotes_tags (quoteId, tag) VALUES (?, ?)
+INSERT INTO quotes (broadcaster, quote, document)
+    SELECT ?, quote, to_tsvector(quote) FROM quotes
+        WHERE quoteId=? AND broadcaster=?
+    RETURNING quoteId, quote
 '''
-            await cursor.executemany(query, quoteTagsParams)
+        await cursor.execute(query, (to_channel, quoteId, from_channel))
+        row: Optional[Tuple[int, str]] = await cursor.fetchone()
+        if row is None:
+            return None
 
         query = '''
-INSERT INTO quotes_history (quoteId, createdTime, broadcaster, quote, editor)
-VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?)
+INSERT INTO quotes_tags (quoteId, tag)
+    SELECT ?, tag FROM quotes_tags WHERE quoteId=?
 '''
-        await cursor.execute(query, (newQuoteId, to_channel, quote, nick))
+        await cursor.execute(query, (row[0], quoteId))
+        if not deferred:
+            await history.write(
+                cursor, [history.record(row[0], to_channel, row[1], nick)],
+                await _legacyHistory(db, cursor, True), db.isPostgres)
         await db.commit()
-        return newQuoteId
+    newQuoteId: int = int(row[0])
+    if deferred:
+        await historywriter.put(newQuoteId, to_channel, row[1], nick)
+    _quoteCopied(to_channel, quoteId, newQuoteId, row[1])
+    return newQuoteId
 
 
+@metrics.instrument
 async def getTagsOfQuote(quoteId: int) -> Set[str]:
+    cached: Optional[FrozenSet[str]] = cache.getTags(quoteId)
+    if cached is not None:
+        return set(cached)
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 SELECT tag FROM quotes_tags WHERE quoteId=?
 '''
-        return {t async for t, in await cursor.execute(query, (quoteId,))}
+        tags: Set[str]
+        tags = {t async for t, in await cursor.execute(query, (quoteId,))}
+        cache.putTags(quoteId, tags)
+        return tags
 
 
+@metrics.instrument
 async def addTagsToQuote(quoteId: int,
                          tags: List[str]) -> bool:
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 INSERT INTO quotes_tags (quoteId, tag) VALUES (?, ?)
 '''
         await cursor.executemany(query, map(lambda t: (quoteId, t), tags))
         await db.commit()
+        _tagsChanged(None, quoteId, tags, [])
         return bool(tags)
 
 
+@metrics.instrument
 async def deleteTagsToQuote(quoteId: int,
                             tags: List[str]) -> bool:
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str = '''
 DELETE FROM quotes_tags WHERE quoteId=? AND tag=?
 '''
         await cursor.executemany(query, map(lambda t: (quoteId, t), tags))
         await db.commit()
+        _tagsChanged(None, quoteId, [], tags)
         return bool(tags)
 
 
-async def getQuoteIdsByWords(channel: str,
-                             words: Sequence[str]) -> List[int]:
+def _toggleQuery(count: int) -> str:
+    return f'''
+DELETE FROM quotes_tags
+    WHERE quoteId=? AND tag IN ({', '.join(['?'] * count)})
+    RETURNING tag
+'''
+
+
+@metrics.instrument
+async def toggleQuoteTags(channel: str,
+                          quoteId: int,
+                          tags: Sequence[str]) -> Optional[QuoteTags]:
+    ignored: List[str] = []
+    toggle: List[str] = []
+    tag: str
+    for tag in tags:
+        if tag[0] in '0123456789':
+            ignored.append(tag)
+        elif tag not in toggle:
+            toggle.append(tag)
+
     db: DatabaseMain
     cursor: aioodbc.cursor.Cursor
-    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+    async with metrics.acquire() as db, await db.cursor() as cursor:
         query: str
-        params: Tuple[str, ...]
         if db.isPostgres:
             query = '''
-SELECT quoteId FROM quotes WHERE broadcaster=? AND document @@ to_tsquery(?)
-    UNION SELECT quoteId FROM quotes q WHERE broadcaster=? AND
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
+SELECT 1 FROM quotes WHERE quoteId=? AND broadcaster=? FOR UPDATE
+'''
+        else:
+            query = '''
+SELECT 1 FROM quotes WHERE quoteId=? AND broadcaster=?
+'''
+        await cursor.execute(query, (quoteId, channel))
+        if await cursor.fetchone() is None:
+            return None
+
+        removed: Set[str] = set()
+        if toggle:
+            query = statements.statement(
+                ('toggleQuoteTags', len(toggle)),
+                lambda: _toggleQuery(len(toggle)))
+            removed = {t async for t, in await cursor.execute(
+                query, (quoteId,) + tuple(toggle))}
+        added: List[str] = [t for t in toggle if t not in removed]
+        deleted: List[str] = [t for t in toggle if t in removed]
+        if added:
             query = '''
-SELECT quoteId FROM (%s) AS q ORDER BY quoteId ASC
-''' % query
-            params = ((channel, ' | '.join(words), channel,)
-                      + tuple(w.lower() for w in words))
-            await cursor.execute(query, params)
-            return [i async for i, in await cursor.execute(query, params)]
+INSERT INTO quotes_tags (quoteId, tag) VALUES (?, ?)
+'''
+            await cursor.executemany(query, [(quoteId, t) for t in added])
+        await db.commit()
+        if added or deleted:
+            _tagsChanged(channel, quoteId, added, deleted)
+        return QuoteTags(added, deleted, ignored)
 
-        query = '''
-SELECT quoteId FROM quotes WHERE broadcaster=? AND
-''' + ' AND '.join(['quote LIKE ?'] * len(words)) + '''
-    UNION SELECT quoteId FROM quotes q WHERE broadcaster=? AND
-''' + ' AND '.join(['? IN (SELECT LOWER(tag) FROM quotes_tags AS t '
-                    'WHERE t.quoteId=q.quoteId)'] * len(words))
-        query = 'SELECT quoteId FROM (' + query + ') AS q ORDER BY quoteId ASC'
-        params = ((channel,) + tuple(f'%{w}%' for w in words) + (channel,)
-                  + tuple(w.lower() for w in words))
-        return [i async for i, in await cursor.execute(query, params)]
+
+@metrics.instrument
+async def getQuoteIdsByWords(channel: str,
+                             words: Sequence[str]) -> List[int]:
+    if not _mayMatch(channel, words):
+        return []
+    quoteIds: Tuple[int, ...] = await searchcache.matches(
+        channel, words, lambda: _searchQuoteIds(channel, words))
+    return sorted(quoteIds)
+
+
+async def iterateQuoteIdsByWords(channel: str,
+                                 words: Sequence[str],
+                                 limit: int
+                                 ) -> AsyncIterator[Tuple[int, int]]:
+    if not _mayMatch(channel, words):
+        return
+    quoteIds: Optional[Sequence[int]] = searchcache.cached(channel, words)
+    plain: Optional[List[str]]
+    plain = searchquery.plainWords(searchquery.parsed(words))
+    if quoteIds is None and plain is not None and searchindex.loaded:
+        quoteIds = searchindex.matches(channel, plain)
+    quoteId: int
+    if quoteIds is not None:
+        for quoteId in heapq.nsmallest(limit, quoteIds):
+            yield quoteId, len(quoteIds)
+        return
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        statement: Optional[Tuple[str, Tuple[Any, ...]]]
+        statement = await _searchStatement(db, cursor, channel, words, plain)
+        if statement is None:
+            return
+        query: str = statements.statement(
+            ('iterateQuoteIdsByWords', statement[0]),
+            lambda: f'''
+SELECT quoteId, COUNT(*) OVER () FROM ({statement[0]}) AS matches
+    GROUP BY quoteId ORDER BY quoteId LIMIT ?
+''')
+        total: int
+        async for quoteId, total in await cursor.execute(
+                query, statement[1] + (limit,)):
+            yield quoteId, total
+
+
+@metrics.instrument
+async def getSimilarQuotes(channel: str,
+                           quoteId: int,
+                           k: int) -> Optional[List[Tuple[int, str]]]:
+    vectors: Optional[similar.ChannelVectors] = similar.get(channel)
+    if vectors is None:
+        db: DatabaseMain
+        cursor: aioodbc.cursor.Cursor
+        async with metrics.acquire() as db, await db.cursor() as cursor:
+            vectors = await similar.load(cursor, channel)
+    return vectors.similar(quoteId, k)
+
+
+async def exportQuotes(channel: str) -> AsyncIterator[TransferRow]:
+    after: int = 0
+    while True:
+        rows: List[TransferRow] = []
+        db: DatabaseMain
+        cursor: aioodbc.cursor.Cursor
+        async with metrics.acquire() as db, await db.cursor() as cursor:
+            query: str = '''
+SELECT quoteId, quote FROM quotes WHERE broadcaster=? AND quoteId>?
+    ORDER BY quoteId LIMIT ?
+'''
+            quoteId: int
+            quote: str
+            quotes: List[Tuple[int, str]] = [
+                (quoteId, quote) async for quoteId, quote
+                in await cursor.execute(
+                    query, (channel, after, transfer.pageSize))]
+            if not quotes:
+                return
+            legacy: bool = await _legacyHistory(db, cursor)
+            query = '''
+SELECT t.quoteId, t.tag FROM quotes_tags AS t
+    JOIN quotes AS q ON q.quoteId=t.quoteId
+    WHERE q.broadcaster=? AND q.quoteId>? AND q.quoteId<=?
+    ORDER BY t.quoteId, t.tag
+'''
+            tags: Dict[int, List[str]] = {}
+            tag: str
+            async for quoteId, tag in await cursor.execute(
+                    query, (channel, after, quotes[-1][0])):
+                tags.setdefault(quoteId, []).append(tag)
+            revisions: Dict[int, List[history.Revision]]
+            revisions = await history.revisionsOf(
+                cursor, [i for i, _ in quotes], legacy)
+            for quoteId, quote in quotes:
+                rows.append(TransferRow('quote', quoteId, quote))
+                rows.extend(TransferRow('tag', quoteId, tag)
+                            for tag in tags.get(quoteId, []))
+                revision: history.Revision
+                for revision in revisions[quoteId]:
+                    rows.append(TransferRow(
+                        'revision', quoteId, revision.quote,
+                        revision.revision, revision.createdTime,
+                        revision.editor))
+        row: TransferRow
+        for row in rows:
+            yield row
+        after = quotes[-1][0]
+
+
+def _insertQuotesQuery(count: int, setsDocument: bool) -> str:
+    if setsDocument:
+        return f'''
+INSERT INTO quotes (broadcaster, quote, document)
+    VALUES {', '.join(['(?, ?, to_tsvector(?))'] * count)}
+    RETURNING quoteId
+'''
+    return f'''
+INSERT INTO quotes (broadcaster, quote)
+    VALUES {', '.join(['(?, ?)'] * count)}
+    RETURNING quoteId
+'''
+
+
+async def _insertQuotes(cursor: 'aioodbc.cursor.Cursor',
+                        channel: str,
+                        texts: List[str],
+                        setsDocument: bool) -> List[int]:
+    quoteIds: List[int] = []
+    start: int
+    for start in range(0, len(texts), importChunk):
+        chunk: List[str] = texts[start:start + importChunk]
+        query: str = statements.statement(
+            ('_insertQuotes', setsDocument, len(chunk)),
+            lambda: _insertQuotesQuery(len(chunk), setsDocument))
+        params: List[str] = []
+        text: str
+        for text in chunk:
+            params += [channel, text]
+            if setsDocument:
+                params.append(text)
+        quoteIds += sorted([i async for i, in await cursor.execute(query,
+                                                                   params)])
+    return quoteIds
+
+
+@metrics.instrument
+async def _importBatch(channel: str,
+                       nick: str,
+                       rows: List[TransferRow]) -> Dict[int, int]:
+    quoteIds: Dict[int, int] = {}
+    quotes: Dict[int, str] = {}
+    latest: Dict[int, str] = {}
+    tags: Dict[Tuple[int, str], None] = {}
+    records: List[history.HistoryRecord] = []
+    now: datetime = datetime.utcnow()
+    sources: Set[int] = {r.quoteId for r in rows if r.kind == 'quote'}
+    row: TransferRow
+    for row in rows:
+        if row.quoteId not in sources:
+            raise ValueError(
+                f'{row.kind} row refers to unknown quote {row.quoteId}')
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        quoteRows: List[TransferRow] = [r for r in rows if r.kind == 'quote']
+        inserted: List[int] = await _insertQuotes(
+            cursor, channel, [r.text for r in quoteRows],
+            await _setsDocument(db, cursor))
+        quoteId: int
+        for row, quoteId in zip(quoteRows, inserted):
+            quoteIds[row.quoteId] = quoteId
+            quotes[quoteId] = row.text
+        for row in rows:
+            if row.kind == 'quote':
+                continue
+            quoteId = quoteIds[row.quoteId]
+            if row.kind == 'tag':
+                tags[quoteId, row.text] = None
+                continue
+            records.append(history.HistoryRecord(
+                quoteId, row.createdTime or now, channel, row.text,
+                row.editor or nick))
+            latest[quoteId] = row.text
+        for quoteId, quote in quotes.items():
+            if latest.get(quoteId) != quote:
+                records.append(history.record(quoteId, channel, quote, nick))
+        if tags:
+            query: str = '''
+INSERT INTO quotes_tags (quoteId, tag) VALUES (?, ?)
+'''
+            await cursor.executemany(query, list(tags))
+        await history.write(cursor, records,
+                            await _legacyHistory(db, cursor, True),
+                            db.isPostgres)
+        await db.commit()
+    for quoteId, quote in quotes.items():
+        _quoteAdded(channel, quoteId, quote)
+        added: List[str] = [t for i, t in tags if i == quoteId]
+        if added:
+            _tagsChanged(channel, quoteId, added, [])
+    return quoteIds
+
+
+async def _importRows(channel: str,
+                      nick: str,
+                      batch: List[TransferRow],
+                      progress: ImportProgress,
+                      report: Optional[Callable[[ImportProgress], None]]
+                      ) -> ImportProgress:
+    await _importBatch(channel, nick, batch)
+    kinds: List[str] = [r.kind for r in batch]
+    progress = progress._replace(
+        rows=progress.rows + len(batch),
+        quotes=progress.quotes + kinds.count('quote'),
+        tags=progress.tags + kinds.count('tag'),
+        revisions=progress.revisions + kinds.count('revision'))
+    if report is not None:
+        report(progress)
+    return progress
+
+
+async def importQuotes(channel: str,
+                       nick: str,
+                       rows: AsyncIterable[TransferRow],
+                       resume: int = 0,
+                       report: Optional[Callable[[ImportProgress], None]]
+                       = None) -> ImportProgress:
+    progress: ImportProgress = ImportProgress(rows=resume)
+    batch: List[TransferRow] = []
+    skipped: int = 0
+    row: TransferRow
+    async for row in rows:
+        if skipped < resume:
+            skipped += 1
+            continue
+        if (batch and row.kind == 'quote'
+                and len(batch) >= transfer.batchSize):
+            progress = await _importRows(channel, nick, batch, progress,
+                                         report)
+            batch = []
+        batch.append(row)
+    if batch:
+        progress = await _importRows(channel, nick, batch, progress, report)
+    return progress
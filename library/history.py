@@ -0,0 +1,323 @@
+import json
+import zlib
+from datetime import datetime
+from difflib import SequenceMatcher
+from typing import Dict, List, NamedTuple, Optional, Sequence  # noqa: F401
+from typing import Tuple, Union  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+keyframeInterval: int = 16
+
+Delta = List[Union[int, str]]
+
+
+class HistoryRecord(NamedTuple):
+    quoteId: int
+    createdTime: datetime
+    broadcaster: str
+    quote: str
+    editor: str
+
+
+class Revision(NamedTuple):
+    quoteId: int
+    revision: int
+    createdTime: datetime
+    broadcaster: str
+    quote: str
+    editor: str
+
+
+def record(quoteId: int,
+           broadcaster: str,
+           quote: str,
+           editor: str) -> HistoryRecord:
+    return HistoryRecord(quoteId, datetime.utcnow(), broadcaster, quote,
+                         editor)
+
+
+def compress(payload: bytes) -> bytes:
+    compressed: bytes = zlib.compress(payload, 9)
+    if len(compressed) < len(payload):
+        return b'z' + compressed
+    return b'r' + payload
+
+
+def decompress(data: bytes) -> bytes:
+    data = bytes(data)
+    if data[:1] == b'z':
+        return zlib.decompress(data[1:])
+    return data[1:]
+
+
+def diff(base: str, text: str) -> Delta:
+    delta: Delta = []
+    matcher: SequenceMatcher = SequenceMatcher(None, base, text,
+                                               autojunk=False)
+    tag: str
+    i1: int
+    i2: int
+    j1: int
+    j2: int
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append(text[j1:j2])
+    return delta
+
+
+def patch(base: str, delta: Delta) -> str:
+    parts: List[str] = []
+    position: int = 0
+    op: Union[int, str]
+    for op in delta:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(base[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def encodeKeyframe(text: str) -> bytes:
+    return compress(text.encode())
+
+
+def encodeDelta(base: str, text: str) -> bytes:
+    return compress(json.dumps(diff(base, text), ensure_ascii=False,
+                               separators=(',', ':')).encode())
+
+
+def decode(base: Optional[str], keyframe: bool, data: bytes) -> str:
+    payload: str = decompress(data).decode()
+    if keyframe:
+        return payload
+    assert base is not None
+    return patch(base, json.loads(payload))
+
+
+async def _tail(cursor: 'aioodbc.cursor.Cursor',
+                quoteId: int) -> Tuple[int, int, Optional[str]]:
+    query: str = '''
+SELECT revision, keyframe, data FROM quotes_revisions
+    WHERE quoteId=? AND revision>=(
+        SELECT MAX(revision) FROM quotes_revisions
+            WHERE quoteId=? AND keyframe)
+    ORDER BY revision
+'''
+    revision: int = 0
+    chain: int = 0
+    text: Optional[str] = None
+    keyframe: bool
+    data: bytes
+    async for revision, keyframe, data in await cursor.execute(
+            query, (quoteId, quoteId)):
+        text = decode(text, keyframe, data)
+        chain = 0 if keyframe else chain + 1
+    return revision, chain, text
+
+
+async def _lock(cursor: 'aioodbc.cursor.Cursor',
+                quoteIds: Sequence[int]) -> None:
+    query: str = '''
+SELECT pg_advisory_xact_lock(hashtext('quotes_revisions'), CAST(? AS INTEGER))
+'''
+    quoteId: int
+    for quoteId in sorted(set(quoteIds)):
+        await cursor.execute(query, (quoteId,))
+
+
+async def write(cursor: 'aioodbc.cursor.Cursor',
+                records: Sequence[HistoryRecord],
+                legacy: bool = False,
+                lock: bool = False) -> int:
+    if legacy:
+        return await _writeLegacy(cursor, records)
+    if lock:
+        await _lock(cursor, [r.quoteId for r in records])
+    tails: Dict[int, Tuple[int, int, Optional[str]]] = {}
+    rows: List[Tuple[int, int, datetime, str, str, bool, bytes]] = []
+    entry: HistoryRecord
+    for entry in records:
+        if entry.quoteId not in tails:
+            tails[entry.quoteId] = await _tail(cursor, entry.quoteId)
+        revision: int
+        chain: int
+        base: Optional[str]
+        revision, chain, base = tails[entry.quoteId]
+        data: bytes = encodeKeyframe(entry.quote)
+        keyframe: bool = True
+        if base is not None and chain + 1 < keyframeInterval:
+            delta: bytes = encodeDelta(base, entry.quote)
+            if len(delta) < len(data):
+                data, keyframe = delta, False
+        rows.append((entry.quoteId, revision + 1, entry.createdTime,
+                     entry.broadcaster, entry.editor, keyframe, data))
+        tails[entry.quoteId] = (revision + 1, 0 if keyframe else chain + 1,
+                                entry.quote)
+    if rows:
+        query: str = '''
+INSERT INTO quotes_revisions
+    (quoteId, revision, createdTime, broadcaster, editor, keyframe, data)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+        await cursor.executemany(query, rows)
+    return len(rows)
+
+
+async def _writeLegacy(cursor: 'aioodbc.cursor.Cursor',
+                       records: Sequence[HistoryRecord]) -> int:
+    if records:
+        query: str = '''
+INSERT INTO quotes_history (quoteId, createdTime, broadcaster, quote, editor)
+    VALUES (?, ?, ?, ?, ?)
+'''
+        await cursor.executemany(query, [tuple(r) for r in records])
+    return len(records)
+
+
+async def _legacy(cursor: 'aioodbc.cursor.Cursor',
+                  quoteId: int) -> List[Revision]:
+    query: str = '''
+SELECT createdTime, broadcaster, quote, editor FROM quotes_history
+    WHERE quoteId=? ORDER BY createdTime, id
+'''
+    result: List[Revision] = []
+    createdTime: datetime
+    broadcaster: str
+    quote: str
+    editor: str
+    async for createdTime, broadcaster, quote, editor in await cursor.execute(
+            query, (quoteId,)):
+        result.append(Revision(quoteId, len(result) + 1, createdTime,
+                               broadcaster, quote, editor))
+    return result
+
+
+async def revisions(cursor: 'aioodbc.cursor.Cursor',
+                    quoteId: int,
+                    last: Optional[int] = None,
+                    legacy: bool = False) -> List[Revision]:
+    if legacy:
+        return (await _legacy(cursor, quoteId))[:last]
+    query: str = '''
+SELECT revision, createdTime, broadcaster, editor, keyframe, data
+    FROM quotes_revisions WHERE quoteId=? ORDER BY revision
+'''
+    params: Tuple[int, ...] = (quoteId,)
+    if last is not None:
+        query = '''
+SELECT revision, createdTime, broadcaster, editor, keyframe, data
+    FROM quotes_revisions
+    WHERE quoteId=? AND revision<=? AND revision>=(
+        SELECT MAX(revision) FROM quotes_revisions
+            WHERE quoteId=? AND revision<=? AND keyframe)
+    ORDER BY revision
+'''
+        params = (quoteId, last, quoteId, last)
+    return await _chain(cursor, quoteId, query, params)
+
+
+async def latest(cursor: 'aioodbc.cursor.Cursor',
+                 quoteId: int,
+                 limit: int,
+                 legacy: bool = False) -> List[Revision]:
+    if limit <= 0:
+        return []
+    if legacy:
+        return (await _legacy(cursor, quoteId))[-limit:]
+    query: str = '''
+SELECT revision, createdTime, broadcaster, editor, keyframe, data
+    FROM quotes_revisions
+    WHERE quoteId=? AND revision>=COALESCE((
+        SELECT MAX(revision) FROM quotes_revisions
+            WHERE quoteId=? AND keyframe AND revision<=(
+                SELECT MAX(revision) FROM quotes_revisions
+                    WHERE quoteId=?) - ?), 0)
+    ORDER BY revision
+'''
+    chain: List[Revision] = await _chain(
+        cursor, quoteId, query, (quoteId, quoteId, quoteId, limit - 1))
+    return chain[-limit:]
+
+
+async def _chain(cursor: 'aioodbc.cursor.Cursor',
+                 quoteId: int,
+                 query: str,
+                 params: Tuple[int, ...]) -> List[Revision]:
+    result: List[Revision] = []
+    text: Optional[str] = None
+    revision: int
+    createdTime: datetime
+    broadcaster: str
+    editor: str
+    keyframe: bool
+    data: bytes
+    async for (revision, createdTime, broadcaster, editor, keyframe,
+               data) in await cursor.execute(query, params):
+        text = decode(text, keyframe, data)
+        result.append(Revision(quoteId, revision, createdTime, broadcaster,
+                               text, editor))
+    return result
+
+
+async def revisionsOf(cursor: 'aioodbc.cursor.Cursor',
+                      quoteIds: Sequence[int],
+                      legacy: bool = False) -> Dict[int, List[Revision]]:
+    result: Dict[int, List[Revision]] = {i: [] for i in quoteIds}
+    if not quoteIds:
+        return result
+    inList: str = ', '.join(['?'] * len(quoteIds))
+    query: str
+    quoteId: int
+    createdTime: datetime
+    broadcaster: str
+    editor: str
+    chain: List[Revision]
+    if legacy:
+        query = f'''
+SELECT quoteId, createdTime, broadcaster, quote, editor FROM quotes_history
+    WHERE quoteId IN ({inList})
+    ORDER BY quoteId, createdTime, id
+'''
+        quote: str
+        async for (quoteId, createdTime, broadcaster, quote,
+                   editor) in await cursor.execute(query, list(quoteIds)):
+            chain = result[quoteId]
+            chain.append(Revision(quoteId, len(chain) + 1, createdTime,
+                                  broadcaster, quote, editor))
+        return result
+    query = f'''
+SELECT quoteId, revision, createdTime, broadcaster, editor, keyframe, data
+    FROM quotes_revisions
+    WHERE quoteId IN ({inList})
+    ORDER BY quoteId, revision
+'''
+    revision: int
+    keyframe: bool
+    data: bytes
+    async for (quoteId, revision, createdTime, broadcaster, editor, keyframe,
+               data) in await cursor.execute(query, list(quoteIds)):
+        chain = result[quoteId]
+        text: str = decode(chain[-1].quote if chain else None, keyframe, data)
+        chain.append(Revision(quoteId, revision, createdTime, broadcaster,
+                              text, editor))
+    return result
+
+
+async def revision(cursor: 'aioodbc.cursor.Cursor',
+                   quoteId: int,
+                   number: int,
+                   legacy: bool = False) -> Optional[Revision]:
+    chain: List[Revision] = await revisions(cursor, quoteId, number,
+                                            legacy)
+    if not chain or chain[-1].revision != number:
+        return None
+    return chain[-1]
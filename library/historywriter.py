@@ -0,0 +1,151 @@
+import asyncio
+from typing import List, Optional  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+import bot
+from bot import utils
+from lib.database import DatabaseMain
+from . import history, metrics, migration
+from .history import HistoryRecord
+
+queueSize: int = 1024
+batchSize: int = 100
+flushInterval: float = 1.0
+retryDelay: float = 5.0
+maxRetries: int = 3
+writeBehind: bool = False
+
+_queue: 'Optional[asyncio.Queue[HistoryRecord]]' = None
+_full: Optional[asyncio.Event] = None
+_writer: Optional[asyncio.Future] = None
+_pending: List[HistoryRecord] = []
+_flushing: int = 0
+_stopping: bool = False
+
+
+def enabled() -> bool:
+    return _writer is not None
+
+
+def start() -> None:
+    global _queue, _full, _writer
+    if _writer is not None:
+        return
+    _queue = asyncio.Queue(queueSize)
+    _full = asyncio.Event()
+    _writer = asyncio.ensure_future(_run())
+
+
+async def put(quoteId: int,
+              broadcaster: str,
+              quote: str,
+              editor: str) -> None:
+    record: HistoryRecord = history.record(quoteId, broadcaster, quote, editor)
+    if _queue is None or _full is None:
+        await writeHistory([record])
+        return
+    await _queue.put(record)
+    if _queue.qsize() >= batchSize:
+        _full.set()
+
+
+def _drain() -> None:
+    assert _queue is not None
+    while len(_pending) < batchSize and not _queue.empty():
+        _pending.append(_queue.get_nowait())
+
+
+async def _run() -> None:
+    global _queue, _full, _writer
+    assert _queue is not None and _full is not None
+    try:
+        while True:
+            if not _pending and _queue.empty():
+                if _stopping or not bot.globals.running:
+                    break
+                _full.clear()
+                try:
+                    await asyncio.wait_for(_full.wait(), flushInterval)
+                except asyncio.TimeoutError:
+                    pass
+            if not _flushing and _queue.qsize() < batchSize:
+                _full.clear()
+            _drain()
+            if not _pending:
+                continue
+            await _write(_pending)
+            for _ in _pending:
+                _queue.task_done()
+            _pending.clear()
+    except asyncio.CancelledError:
+        while not _queue.empty():
+            _pending.append(_queue.get_nowait())
+        if _pending:
+            await _write(_pending)
+            _pending.clear()
+        raise
+    finally:
+        _queue = None
+        _full = None
+        _writer = None
+
+
+async def _write(records: List[HistoryRecord]) -> None:
+    attempt: int
+    for attempt in range(maxRetries):
+        try:
+            await writeHistory(records)
+            return
+        except Exception:
+            migration.expire()
+            await asyncio.sleep(retryDelay)
+    record: HistoryRecord
+    for record in records:
+        try:
+            await writeHistory([record])
+        except Exception:
+            utils.logException(
+                f'Discarded history of quote {record.quoteId}')
+
+
+@metrics.instrument
+async def writeHistory(records: List[HistoryRecord]) -> int:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with metrics.acquire() as db, await db.cursor() as cursor:
+        legacy: bool = not await migration.applied(db, cursor, 6, True)
+        count: int = await history.write(cursor, records, legacy,
+                                         db.isPostgres)
+        await db.commit()
+        return count
+
+
+async def flush() -> None:
+    global _flushing
+    if _queue is None or _full is None:
+        return
+    _flushing += 1
+    try:
+        _full.set()
+        await _queue.join()
+    finally:
+        _flushing -= 1
+
+
+async def stop() -> None:
+    global _queue, _full, _writer, _stopping
+    writer: Optional[asyncio.Future] = _writer
+    if writer is None or _full is None:
+        return
+    _stopping = True
+    try:
+        _full.set()
+        await writer
+    except asyncio.CancelledError:
+        pass
+    finally:
+        _stopping = False
+        _queue = None
+        _full = None
+        _writer = None
@@ -0,0 +1,154 @@
+import math
+from typing import Dict, Iterable, Iterator, List, Optional  # noqa: F401
+from typing import Sequence  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+from . import search
+
+errorRate: float = 0.01
+minimumCapacity: int = 1024
+maxChannels: int = 1024
+
+
+class BloomFilter:
+    __slots__ = ('capacity', 'size', 'hashes', 'bits', 'count')
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity: int = max(capacity, minimumCapacity)
+        self.size: int = math.ceil(
+            -self.capacity * math.log(errorRate) / math.log(2) ** 2)
+        self.hashes: int = max(1, round(self.size / self.capacity
+                                        * math.log(2)))
+        self.bits: bytearray = bytearray((self.size + 7) // 8)
+        self.count: int = 0
+
+    def _positions(self, key: str) -> Iterator[int]:
+        value: int = hash(key)
+        first: int = value & 0xffffffff
+        second: int = (value >> 32) | 1
+        i: int
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str) -> None:
+        added: bool = False
+        position: int
+        for position in self._positions(key):
+            mask: int = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        return all(self.bits[p >> 3] & (1 << (p & 7))
+                   for p in self._positions(key))
+
+    def full(self) -> bool:
+        return self.count > self.capacity
+
+
+_channels: Dict[str, BloomFilter] = {}
+_versions: Dict[str, int] = {}
+_epoch: int = 0
+
+
+def trigrams(text: str) -> Iterator[str]:
+    lowered: str = text.lower()
+    i: int
+    for i in range(len(lowered) - search.trigramLength + 1):
+        yield 'q:' + lowered[i:i + search.trigramLength]
+
+
+def tagKey(tag: str) -> str:
+    return 't:' + tag.lower()
+
+
+def checkable(word: str) -> bool:
+    return len(word) >= search.trigramLength and word.isascii()
+
+
+async def load(cursor: 'aioodbc.cursor.Cursor',
+               channel: str) -> Optional[BloomFilter]:
+    if channel in _channels:
+        return _channels[channel]
+    version: int = _versions.get(channel, 0)
+    epoch: int = _epoch
+    query: str = '''
+SELECT quote FROM quotes WHERE broadcaster=?
+'''
+    quotes: List[str]
+    quotes = [q async for q, in await cursor.execute(query, (channel,))]
+    query = '''
+SELECT DISTINCT t.tag FROM quotes_tags AS t
+    JOIN quotes AS q ON q.quoteId=t.quoteId
+    WHERE q.broadcaster=?
+'''
+    tags: List[str]
+    tags = [t async for t, in await cursor.execute(query, (channel,))]
+    keys: List[str] = [k for q in quotes for k in trigrams(q)]
+    keys.extend(tagKey(t) for t in tags)
+    bloom: BloomFilter = BloomFilter(2 * len(set(keys)))
+    key: str
+    for key in keys:
+        bloom.add(key)
+    if _versions.get(channel, 0) != version or _epoch != epoch:
+        return None
+    if len(_channels) >= maxChannels:
+        del _channels[next(iter(_channels))]
+    _channels[channel] = bloom
+    return bloom
+
+
+def mayMatch(channel: str, words: Sequence[str]) -> bool:
+    bloom: Optional[BloomFilter] = _channels.get(channel)
+    if bloom is None:
+        return True
+    if all(not w.isascii() or tagKey(w) in bloom for w in words):
+        return True
+    word: str
+    for word in words:
+        if checkable(word) and not all(k in bloom for k in trigrams(word)):
+            return False
+    return True
+
+
+def _added(channel: str, keys: Iterable[str]) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    bloom: Optional[BloomFilter] = _channels.get(channel)
+    if bloom is None:
+        return
+    key: str
+    for key in keys:
+        bloom.add(key)
+    if bloom.full():
+        del _channels[channel]
+
+
+def addQuote(channel: str, quote: str) -> None:
+    _added(channel, trigrams(quote))
+
+
+def addTags(channel: Optional[str], tags: Iterable[str]) -> None:
+    global _epoch
+    keys: List[str] = [tagKey(t) for t in tags]
+    if channel is not None:
+        _added(channel, keys)
+        return
+    _epoch += 1
+    name: str
+    for name in list(_channels):
+        _added(name, keys)
+
+
+def reset(channel: str) -> None:
+    _channels.pop(channel, None)
+
+
+def clear() -> None:
+    _channels.clear()
+    _versions.clear()
@@ -0,0 +1,261 @@
+import contextvars
+import functools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional  # noqa: F401
+from typing import Sequence, Tuple, TypeVar, cast  # noqa: F401
+
+from lib.database import DatabaseMain
+from . import statements
+
+F = TypeVar('F', bound=Callable[..., Awaitable[Any]])
+
+latencyBuckets: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+    2.5)
+rowBuckets: Tuple[float, ...] = (0, 1, 5, 10, 50, 100, 500, 1000)
+prefix: str = 'quote_db'
+
+enabled: bool = False
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets: Tuple[float, ...] = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        index: int
+        bound: float
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total: int = 0
+        result: List[Tuple[str, int]] = []
+        bound: float
+        count: int
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((f'{bound:g}', total))
+        result.append(('+Inf', total + self.counts[-1]))
+        return result
+
+    def asDict(self) -> Dict[str, Any]:
+        return {
+            'buckets': dict(self.cumulative()),
+            'sum': self.sum,
+            'count': self.count,
+        }
+
+
+class FunctionMetrics:
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.errors: int = 0
+        self.rows: Histogram = Histogram(rowBuckets)
+        self.latency: Histogram = Histogram(latencyBuckets)
+        self.poolWait: Histogram = Histogram(latencyBuckets)
+
+    def asDict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows.asDict(),
+            'latency': self.latency.asDict(),
+            'poolWait': self.poolWait.asDict(),
+        }
+
+
+class CallRecord:
+    def __init__(self) -> None:
+        self.backend: Optional[str] = None
+        self.poolWait: float = 0.0
+
+    def merge(self, other: 'CallRecord') -> None:
+        self.backend = self.backend or other.backend
+        self.poolWait += other.poolWait
+
+
+class InstrumentedAcquire:
+    def __init__(self) -> None:
+        self.acquire: Any = DatabaseMain.acquire()
+
+    async def __aenter__(self) -> DatabaseMain:
+        record: Optional[CallRecord] = _current.get()
+        if record is None:
+            return await self.acquire.__aenter__()
+        start: float = time.perf_counter()
+        db: DatabaseMain = await self.acquire.__aenter__()
+        record.poolWait += time.perf_counter() - start
+        record.backend = 'postgres' if db.isPostgres else 'sqlite'
+        return db
+
+    async def __aexit__(self, *exc_info: Any) -> Any:
+        return await self.acquire.__aexit__(*exc_info)
+
+
+_current: 'contextvars.ContextVar[Optional[CallRecord]]'
+_current = contextvars.ContextVar('quote_db_call', default=None)
+_functions: Dict[Tuple[str, str], FunctionMetrics] = {}
+
+
+def enable() -> None:
+    global enabled
+    enabled = True
+
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+
+def acquire() -> InstrumentedAcquire:
+    return InstrumentedAcquire()
+
+
+def rowCount(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, bool):
+        return int(result)
+    if isinstance(result, (list, set, frozenset, dict)):
+        return len(result)
+    if isinstance(result, tuple) and result and result[0] is None:
+        return 0
+    return 1
+
+
+def _observe(name: str,
+             record: CallRecord,
+             elapsed: float,
+             rows: int,
+             error: bool) -> None:
+    key: Tuple[str, str] = name, record.backend or 'none'
+    if key not in _functions:
+        _functions[key] = FunctionMetrics()
+    metrics: FunctionMetrics = _functions[key]
+    metrics.calls += 1
+    metrics.latency.observe(elapsed)
+    metrics.poolWait.observe(record.poolWait)
+    metrics.rows.observe(rows)
+    if error:
+        metrics.errors += 1
+
+
+def instrument(func: F) -> F:
+    @functools.wraps(func)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not enabled:
+            return await func(*args, **kwargs)
+        parent: Optional[CallRecord] = _current.get()
+        record: CallRecord = CallRecord()
+        token: contextvars.Token = _current.set(record)
+        start: float = time.perf_counter()
+        try:
+            result: Any = await func(*args, **kwargs)
+        except Exception:
+            _observe(func.__name__, record, time.perf_counter() - start, 0,
+                     True)
+            raise
+        finally:
+            _current.reset(token)
+            if parent is not None:
+                parent.merge(record)
+        _observe(func.__name__, record, time.perf_counter() - start,
+                 rowCount(result), False)
+        return result
+    return cast(F, wrapper)
+
+
+def snapshot() -> Dict[str, Dict[str, Dict[str, Any]]]:
+    result: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    name: str
+    backend: str
+    metrics: FunctionMetrics
+    for (name, backend), metrics in sorted(_functions.items()):
+        result.setdefault(name, {})[backend] = metrics.asDict()
+    return result
+
+
+def _labels(name: str, backend: str, **extra: str) -> str:
+    labels: Dict[str, str] = {'function': name, 'backend': backend}
+    labels.update(extra)
+    return ','.join(f'{k}="{v}"' for k, v in labels.items())
+
+
+def prometheus() -> str:
+    lines: List[str] = []
+    items: List[Tuple[Tuple[str, str], FunctionMetrics]]
+    items = sorted(_functions.items())
+    counters: List[Tuple[str, str, Callable[[FunctionMetrics], int]]] = [
+        ('calls_total', 'Calls of the quote database functions.',
+         lambda m: m.calls),
+        ('errors_total', 'Calls of the quote database functions that raised.',
+         lambda m: m.errors),
+    ]
+    metric: str
+    text: str
+    value: Callable[[FunctionMetrics], int]
+    name: str
+    backend: str
+    metrics: FunctionMetrics
+    for metric, text, value in counters:
+        lines.append(f'# HELP {prefix}_{metric} {text}')
+        lines.append(f'# TYPE {prefix}_{metric} counter')
+        for (name, backend), metrics in items:
+            lines.append(f'{prefix}_{metric}{{{_labels(name, backend)}}} '
+                         f'{value(metrics)}')
+    histograms: List[Tuple[str, str, Callable[[FunctionMetrics], Histogram]]]
+    histograms = [
+        ('latency_seconds', 'Latency of the quote database functions.',
+         lambda m: m.latency),
+        ('pool_wait_seconds', 'Time spent waiting for a pooled connection.',
+         lambda m: m.poolWait),
+        ('rows', 'Rows returned by the quote database functions.',
+         lambda m: m.rows),
+    ]
+    histogram: Callable[[FunctionMetrics], Histogram]
+    for metric, text, histogram in histograms:
+        lines.append(f'# HELP {prefix}_{metric} {text}')
+        lines.append(f'# TYPE {prefix}_{metric} histogram')
+        for (name, backend), metrics in items:
+            data: Histogram = histogram(metrics)
+            bound: str
+            count: int
+            for bound, count in data.cumulative():
+                labels: str = _labels(name, backend, le=bound)
+                lines.append(f'{prefix}_{metric}_bucket{{{labels}}} {count}')
+            lines.append(f'{prefix}_{metric}_sum{{{_labels(name, backend)}}} '
+                         f'{data.sum}')
+            lines.append(f'{prefix}_{metric}_count'
+                         f'{{{_labels(name, backend)}}} {data.count}')
+    cached: Dict[str, Any] = statements.stats.asDict()
+    statementCounters: List[Tuple[str, str, Any]] = [
+        ('sql_text_cache_hits_total',
+         'Generated SQL text reused from the shape cache.',
+         cached['hits']),
+        ('sql_text_cache_misses_total',
+         'Generated SQL text built for a new shape.',
+         cached['misses']),
+        ('sql_text_build_seconds_total',
+         'Time spent generating SQL text.',
+         cached['buildSeconds']),
+    ]
+    total: Any
+    for metric, text, total in statementCounters:
+        lines.append(f'# HELP {prefix}_{metric} {text}')
+        lines.append(f'# TYPE {prefix}_{metric} counter')
+        lines.append(f'{prefix}_{metric} {total}')
+    return '\n'.join(lines) + '\n'
+
+
+def clear() -> None:
+    _functions.clear()
@@ -0,0 +1,489 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, List, NamedTuple  # noqa: F401
+from typing import Dict, Optional, Set, Tuple  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+from lib.database import DatabaseMain
+from . import history, search
+
+backfillBatch: int = 1000
+backfillDelay: float = 0.1
+convertBatch: int = 100
+refreshSeconds: float = 60.0
+
+sqliteSearchSchema: List[str] = [
+    '''
+CREATE VIRTUAL TABLE IF NOT EXISTS quotes_search USING fts5(
+    quote,
+    content='quotes',
+    content_rowid='quoteId',
+    tokenize='trigram'
+)
+''',
+    '''
+CREATE TRIGGER IF NOT EXISTS quotes_search_insert
+    AFTER INSERT ON quotes BEGIN
+    INSERT INTO quotes_search (rowid, quote) VALUES (new.quoteId, new.quote);
+END
+''',
+    '''
+CREATE TRIGGER IF NOT EXISTS quotes_search_delete
+    AFTER DELETE ON quotes BEGIN
+    INSERT INTO quotes_search (quotes_search, rowid, quote)
+        VALUES ('delete', old.quoteId, old.quote);
+END
+''',
+    '''
+CREATE TRIGGER IF NOT EXISTS quotes_search_update
+    AFTER UPDATE OF quote ON quotes BEGIN
+    INSERT INTO quotes_search (quotes_search, rowid, quote)
+        VALUES ('delete', old.quoteId, old.quote);
+    INSERT INTO quotes_search (rowid, quote) VALUES (new.quoteId, new.quote);
+END
+''',
+    '''
+INSERT INTO quotes_search (quotes_search) VALUES ('rebuild')
+''',
+]
+
+tagIndexSchema: List[str] = [
+    '''
+CREATE INDEX IF NOT EXISTS quotes_tags_lower
+    ON quotes_tags (LOWER(tag), quoteId)
+''',
+]
+
+postgresTagIndexSchema: List[str] = [
+    '''
+CREATE INDEX CONCURRENTLY IF NOT EXISTS quotes_tags_lower
+    ON quotes_tags (LOWER(tag), quoteId)
+''',
+]
+
+broadcasterIndexSchema: List[str] = [
+    '''
+CREATE INDEX IF NOT EXISTS quotes_broadcaster_id
+    ON quotes (broadcaster, quoteId)
+''',
+    '''
+DROP INDEX IF EXISTS quotes_broadcaster
+''',
+    '''
+DROP INDEX IF EXISTS quotes_tags_id
+''',
+]
+
+postgresBroadcasterIndexSchema: List[str] = [
+    '''
+CREATE INDEX CONCURRENTLY IF NOT EXISTS quotes_broadcaster_id
+    ON quotes (broadcaster, quoteId)
+''',
+    '''
+DROP INDEX CONCURRENTLY IF EXISTS quotes_broadcaster
+''',
+    '''
+DROP INDEX CONCURRENTLY IF EXISTS quotes_tags_id
+''',
+]
+
+historyIndexSchema: List[str] = [
+    '''
+CREATE INDEX IF NOT EXISTS quotes_history_quote
+    ON quotes_history (quoteId, createdTime)
+''',
+]
+
+postgresHistoryIndexSchema: List[str] = [
+    '''
+CREATE INDEX CONCURRENTLY IF NOT EXISTS quotes_history_quote
+    ON quotes_history (quoteId, createdTime)
+''',
+]
+
+postgresDocumentSchema: List[str] = [
+    '''
+CREATE OR REPLACE FUNCTION quotes_document() RETURNS trigger AS $$
+BEGIN
+    NEW.document := to_tsvector(NEW.quote);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+''',
+    '''
+DROP TRIGGER IF EXISTS quotes_document ON quotes
+''',
+    '''
+CREATE TRIGGER quotes_document BEFORE INSERT OR UPDATE OF quote ON quotes
+    FOR EACH ROW EXECUTE PROCEDURE quotes_document()
+''',
+]
+
+revisionsSchema: List[str] = [
+    '''
+CREATE TABLE IF NOT EXISTS quotes_revisions (
+    quoteId INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    createdTime TIMESTAMP NOT NULL,
+    broadcaster VARCHAR NOT NULL,
+    editor VARCHAR NOT NULL,
+    keyframe BOOLEAN NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (quoteId, revision)
+)
+''',
+    '''
+CREATE INDEX IF NOT EXISTS quotes_revisions_broadcaster
+    ON quotes_revisions (broadcaster)
+''',
+]
+
+postgresRevisionsSchema: List[str] = [
+    revisionsSchema[0].replace('BLOB', 'BYTEA'),
+    revisionsSchema[1],
+]
+
+postgresPartitionSchema: List[str] = [
+    '''
+ALTER TABLE quotes_revisions RENAME TO quotes_revisions_default
+''',
+    '''
+ALTER INDEX quotes_revisions_pkey RENAME TO quotes_revisions_default_pkey
+''',
+    '''
+ALTER INDEX quotes_revisions_broadcaster
+    RENAME TO quotes_revisions_default_broadcaster
+''',
+    '''
+CREATE TABLE quotes_revisions (
+    quoteId INTEGER NOT NULL,
+    revision INTEGER NOT NULL,
+    createdTime TIMESTAMP NOT NULL,
+    broadcaster VARCHAR NOT NULL,
+    editor VARCHAR NOT NULL,
+    keyframe BOOLEAN NOT NULL,
+    data BYTEA NOT NULL,
+    PRIMARY KEY (quoteId, revision, createdTime)
+) PARTITION BY RANGE (createdTime)
+''',
+    '''
+CREATE INDEX quotes_revisions_broadcaster ON quotes_revisions (broadcaster)
+''',
+    '''
+ALTER TABLE quotes_revisions ATTACH PARTITION quotes_revisions_default DEFAULT
+''',
+]
+
+
+migrationsSchema: str = '''
+CREATE TABLE IF NOT EXISTS quotes_migrations (
+    version INTEGER NOT NULL PRIMARY KEY,
+    name VARCHAR NOT NULL,
+    appliedTime TIMESTAMP NOT NULL
+)
+'''
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sqlite: List[str]
+    postgres: List[str]
+    online: bool
+    convert: Optional[Callable[[DatabaseMain, 'aioodbc.cursor.Cursor'],
+                               Awaitable[Any]]] = None
+
+
+async def _hasTable(db: DatabaseMain,
+                    cursor: 'aioodbc.cursor.Cursor',
+                    table: str) -> bool:
+    query: str = '''
+SELECT 1 FROM sqlite_master WHERE type='table' AND name=?
+'''
+    if db.isPostgres:
+        query = '''
+SELECT 1 FROM information_schema.tables
+    WHERE table_schema=current_schema() AND table_name=?
+'''
+    await cursor.execute(query, (table,))
+    return await cursor.fetchone() is not None
+
+
+async def _convertHistory(db: DatabaseMain,
+                          cursor: 'aioodbc.cursor.Cursor',
+                          batchSize: int,
+                          commit: bool) -> int:
+    total: int = 0
+    while True:
+        query: str = '''
+SELECT DISTINCT quoteId FROM quotes_history ORDER BY quoteId LIMIT ?
+'''
+        quoteIds: List[int] = [
+            i async for i, in await cursor.execute(query, (batchSize,))]
+        if not quoteIds:
+            return total
+        query = f'''
+SELECT id, quoteId, createdTime, broadcaster, quote, editor
+    FROM quotes_history
+    WHERE quoteId IN ({', '.join(['?'] * len(quoteIds))})
+    ORDER BY quoteId, createdTime, id
+'''
+        ids: List[int] = []
+        records: List[history.HistoryRecord] = []
+        historyId: int
+        row: List[Any]
+        async for historyId, *row in await cursor.execute(query, quoteIds):
+            ids.append(historyId)
+            records.append(history.HistoryRecord(*row))
+        total += await history.write(cursor, records, False, db.isPostgres)
+        query = '''
+DELETE FROM quotes_history WHERE id=?
+'''
+        await cursor.executemany(query, [(i,) for i in ids])
+        if commit:
+            await db.commit()
+
+
+async def convertHistory(db: DatabaseMain,
+                         cursor: 'aioodbc.cursor.Cursor',
+                         batchSize: Optional[int] = None) -> int:
+    if not await _hasTable(db, cursor, 'quotes_history'):
+        return 0
+    batchSize = batchSize or convertBatch
+    total: int = await _convertHistory(db, cursor, batchSize, True)
+    if db.isPostgres:
+        await cursor.execute('''
+LOCK TABLE quotes_migrations IN EXCLUSIVE MODE
+''')
+        await cursor.execute('''
+LOCK TABLE quotes_history IN ACCESS EXCLUSIVE MODE
+''')
+    total += await _convertHistory(db, cursor, batchSize, False)
+    await cursor.execute('''DROP TABLE quotes_history''')
+    return total
+
+
+async def vacuumDatabase(db: DatabaseMain,
+                         cursor: 'aioodbc.cursor.Cursor') -> None:
+    if db.isPostgres:
+        return
+    _setAutocommit(db, True)
+    try:
+        query: str = '''
+PRAGMA auto_vacuum = INCREMENTAL
+'''
+        await cursor.execute(query)
+        query = '''
+VACUUM
+'''
+        await cursor.execute(query)
+    finally:
+        _setAutocommit(db, False)
+
+
+migrations: List[Migration] = [
+    Migration(1, 'sqlite trigram search', sqliteSearchSchema, [], False),
+    Migration(2, 'lowercase tag index', tagIndexSchema,
+              postgresTagIndexSchema, True),
+    Migration(3, 'broadcaster quote id index', broadcasterIndexSchema,
+              postgresBroadcasterIndexSchema, True),
+    Migration(4, 'history quote id index', historyIndexSchema,
+              postgresHistoryIndexSchema, True),
+    Migration(5, 'postgres document trigger', [], postgresDocumentSchema,
+              False),
+    Migration(6, 'delta encoded history', revisionsSchema,
+              postgresRevisionsSchema, False, convertHistory),
+    Migration(7, 'partitioned history', [], postgresPartitionSchema, False),
+    Migration(8, 'sqlite incremental vacuum', [], [], False, vacuumDatabase),
+]
+
+_backfill: 'Optional[asyncio.Future[int]]' = None
+_applied: Set[int] = set()
+_missing: Dict[int, float] = {}
+
+
+def _setAutocommit(db: DatabaseMain, enabled: bool) -> None:
+    connection: Any = getattr(db.connection, '_conn', db.connection)
+    connection.autocommit = enabled
+
+
+async def _dropInvalidIndexes(cursor: 'aioodbc.cursor.Cursor') -> None:
+    query: str = '''
+SELECT c.relname FROM pg_index AS i
+    JOIN pg_class AS c ON c.oid=i.indexrelid
+    JOIN pg_class AS t ON t.oid=i.indrelid
+    WHERE NOT i.indisvalid AND t.relname LIKE 'quotes%'
+'''
+    indexes: List[str] = [i async for i, in await cursor.execute(query)]
+    index: str
+    for index in indexes:
+        await cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{index}"')
+
+
+async def appliedMigrations(cursor: 'aioodbc.cursor.Cursor') -> Set[int]:
+    query: str = '''
+SELECT version FROM quotes_migrations
+'''
+    return {v async for v, in await cursor.execute(query)}
+
+
+async def applied(db: DatabaseMain,
+                  cursor: 'aioodbc.cursor.Cursor',
+                  version: int,
+                  lock: bool = False) -> bool:
+    if version in _applied:
+        return True
+    now: float = time.monotonic()
+    if now - _missing.get(version, -refreshSeconds) < refreshSeconds:
+        return False
+    _missing[version] = now
+    if not await _hasTable(db, cursor, 'quotes_migrations'):
+        return False
+    query: str
+    if lock and db.isPostgres:
+        query = '''
+LOCK TABLE quotes_migrations IN ROW SHARE MODE
+'''
+        await cursor.execute(query)
+    query = '''
+SELECT 1 FROM quotes_migrations WHERE version=?
+'''
+    await cursor.execute(query, (version,))
+    if await cursor.fetchone() is None:
+        return False
+    del _missing[version]
+    _applied.add(version)
+    return True
+
+
+def expire() -> None:
+    _missing.clear()
+
+
+def clear() -> None:
+    _applied.clear()
+    expire()
+
+
+async def migrate(target: Optional[int] = None) -> List[int]:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+        await cursor.execute(migrationsSchema)
+        await db.commit()
+        versions: Set[int] = await appliedMigrations(cursor)
+        completed: List[int] = []
+        migration: Migration
+        for migration in migrations:
+            if migration.version in versions:
+                continue
+            if target is not None and migration.version > target:
+                break
+            statements: List[str] = migration.sqlite
+            if db.isPostgres:
+                statements = migration.postgres
+            query: str
+            if migration.online:
+                await db.commit()
+                _setAutocommit(db, True)
+                try:
+                    if db.isPostgres:
+                        await _dropInvalidIndexes(cursor)
+                    for query in statements:
+                        await cursor.execute(query)
+                finally:
+                    _setAutocommit(db, False)
+            else:
+                for query in statements:
+                    await cursor.execute(query)
+            if migration.convert is not None:
+                await db.commit()
+                await migration.convert(db, cursor)
+            query = '''
+INSERT INTO quotes_migrations (version, name, appliedTime)
+    VALUES (?, ?, CURRENT_TIMESTAMP)
+'''
+            await cursor.execute(query, (migration.version, migration.name))
+            await db.commit()
+            completed.append(migration.version)
+            _applied.add(migration.version)
+            _missing.pop(migration.version, None)
+        if completed and not db.isPostgres:
+            search.sqliteSearch = None
+        if completed and db.isPostgres:
+            startBackfill()
+        return completed
+
+
+async def backfillDocuments(batchSize: int = backfillBatch) -> int:
+    total: int = 0
+    last: int = 0
+    while True:
+        db: DatabaseMain
+        cursor: aioodbc.cursor.Cursor
+        async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+            if not db.isPostgres:
+                return total
+            query: str = '''
+WITH b AS (
+    SELECT quoteId FROM quotes WHERE quoteId>? AND document IS NULL
+        ORDER BY quoteId LIMIT ? FOR UPDATE SKIP LOCKED
+)
+UPDATE quotes SET document=to_tsvector(quote) FROM b
+    WHERE quotes.quoteId=b.quoteId
+    RETURNING quotes.quoteId
+'''
+            quoteIds: List[int] = [
+                i async for i, in await cursor.execute(query,
+                                                       (last, batchSize))]
+            await db.commit()
+        total += len(quoteIds)
+        if len(quoteIds) < batchSize:
+            return total
+        last = max(quoteIds)
+        await asyncio.sleep(backfillDelay)
+
+
+def startBackfill() -> 'asyncio.Future[int]':
+    global _backfill
+    if _backfill is None or _backfill.done():
+        _backfill = asyncio.ensure_future(backfillDocuments())
+    return _backfill
+
+
+async def stopBackfill() -> None:
+    global _backfill
+    backfill: Optional[asyncio.Future] = _backfill
+    _backfill = None
+    if backfill is None:
+        return
+    backfill.cancel()
+    try:
+        await backfill
+    except asyncio.CancelledError:
+        pass
+
+
+async def migrateSqliteSearch() -> bool:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+        if db.isPostgres or await search.hasSqliteSearch(cursor):
+            return False
+        query: str
+        for query in sqliteSearchSchema:
+            await cursor.execute(query)
+        await db.commit()
+        search.sqliteSearch = True
+        return True
+
+
+async def migrateTagIndex() -> None:
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+        query: str
+        for query in tagIndexSchema:
+            await cursor.execute(query)
+        await db.commit()
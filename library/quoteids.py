@@ -0,0 +1,108 @@
+import bisect
+import random
+import time
+from array import array
+from typing import Dict, Optional  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+refreshSeconds: float = 300.0
+
+
+class ChannelQuoteIds:
+    __slots__ = ('ids', 'loadedAt', 'lastId')
+
+    def __init__(self, loadedAt: float) -> None:
+        self.ids: array = array('q')
+        self.loadedAt: float = loadedAt
+        self.lastId: int = 0
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, quoteId: object) -> bool:
+        if not isinstance(quoteId, int):
+            return False
+        index: int = bisect.bisect_left(self.ids, quoteId)
+        return index < len(self.ids) and self.ids[index] == quoteId
+
+    def add(self, quoteId: int) -> None:
+        self.lastId = max(self.lastId, quoteId)
+        index: int = bisect.bisect_left(self.ids, quoteId)
+        if index == len(self.ids) or self.ids[index] != quoteId:
+            self.ids.insert(index, quoteId)
+
+    def remove(self, quoteId: int) -> None:
+        index: int = bisect.bisect_left(self.ids, quoteId)
+        if index < len(self.ids) and self.ids[index] == quoteId:
+            del self.ids[index]
+
+    def choice(self) -> Optional[int]:
+        if not self.ids:
+            return None
+        return self.ids[random.randrange(len(self.ids))]
+
+    def expired(self, now: float) -> bool:
+        return now - self.loadedAt >= refreshSeconds
+
+
+_channels: Dict[str, ChannelQuoteIds] = {}
+_versions: Dict[str, int] = {}
+_epoch: int = 0
+
+
+async def load(cursor: 'aioodbc.cursor.Cursor',
+               channel: str) -> ChannelQuoteIds:
+    now: float = time.monotonic()
+    quoteIds: Optional[ChannelQuoteIds] = _channels.get(channel)
+    if quoteIds is not None and not quoteIds.expired(now):
+        return quoteIds
+    version: int = _versions.get(channel, 0)
+    epoch: int = _epoch
+    quoteIds = ChannelQuoteIds(now)
+    query: str = '''
+SELECT quoteId FROM quotes WHERE broadcaster=? ORDER BY quoteId
+'''
+    quoteIds.ids.extend(
+        [i async for i, in await cursor.execute(query, (channel,))])
+    if quoteIds.ids:
+        quoteIds.lastId = quoteIds.ids[-1]
+    if _versions.get(channel, 0) == version and _epoch == epoch:
+        _channels[channel] = quoteIds
+    return quoteIds
+
+
+def loaded(channel: str) -> bool:
+    quoteIds: Optional[ChannelQuoteIds] = _channels.get(channel)
+    return quoteIds is not None and not quoteIds.expired(time.monotonic())
+
+
+def missing(channel: str, quoteId: int) -> bool:
+    quoteIds: Optional[ChannelQuoteIds] = _channels.get(channel)
+    if quoteIds is None or quoteIds.expired(time.monotonic()):
+        return False
+    return quoteId <= quoteIds.lastId and quoteId not in quoteIds
+
+
+def add(channel: str, quoteId: int) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    if channel in _channels:
+        _channels[channel].add(quoteId)
+
+
+def remove(channel: str, quoteId: int) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    if channel in _channels:
+        _channels[channel].remove(quoteId)
+
+
+def reset(channel: str) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    _channels.pop(channel, None)
+
+
+def clear() -> None:
+    global _epoch
+    _epoch += 1
+    _channels.clear()
+    _versions.clear()
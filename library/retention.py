@@ -0,0 +1,322 @@
+import asyncio
+import re
+from datetime import datetime, timedelta
+from typing import Callable, List, Match, NamedTuple  # noqa: F401
+from typing import Optional, Pattern, Set, Tuple  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+from lib.database import DatabaseMain
+from . import history, migration
+
+batchSize: int = 500
+batchDelay: float = 0.05
+vacuumPages: int = 256
+partitionsAhead: int = 2
+partitionPattern: Pattern = re.compile(r'quotes_revisions_y(\d{4})m(\d{2})')
+
+
+class RetentionPolicy(NamedTuple):
+    keepRevisions: int = 10
+    keepDays: float = 90.0
+
+
+class RetentionProgress(NamedTuple):
+    quotes: int = 0
+    compacted: int = 0
+    deleted: int = 0
+    partitions: int = 0
+
+
+Boundary = Tuple[int, int, int]
+
+
+def _month(year: int, month: int, offset: int) -> Tuple[int, int]:
+    index: int = year * 12 + month - 1 + offset
+    return index // 12, index % 12 + 1
+
+
+def partitionName(year: int, month: int) -> str:
+    return f'quotes_revisions_y{year:04d}m{month:02d}'
+
+
+async def ensurePartitions(now: Optional[datetime] = None) -> List[str]:
+    now = now or datetime.utcnow()
+    created: List[str] = []
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+        if not db.isPostgres or not await migration.applied(db, cursor, 7):
+            return created
+        existing: List[str] = await _partitions(cursor)
+        months: Set[Tuple[int, int]] = {
+            _month(now.year, now.month, offset)
+            for offset in range(1, partitionsAhead + 1)}
+        query: str = '''
+SELECT DISTINCT CAST(EXTRACT(YEAR FROM createdTime) AS INTEGER),
+        CAST(EXTRACT(MONTH FROM createdTime) AS INTEGER)
+    FROM quotes_revisions_default WHERE createdTime<?
+'''
+        year: int
+        month: int
+        months.update([(year, month) async for year, month
+                       in await cursor.execute(
+                           query, (datetime(now.year, now.month, 1),))])
+        await db.commit()
+        for year, month in sorted(months):
+            name: str = partitionName(year, month)
+            if name in existing:
+                continue
+            await _createPartition(db, cursor, name, year, month)
+            created.append(name)
+    return created
+
+
+async def _moveRows(db: DatabaseMain,
+                    cursor: 'aioodbc.cursor.Cursor',
+                    name: str,
+                    bounds: Tuple[datetime, datetime]) -> int:
+    query: str = f'''
+WITH moved AS (
+    DELETE FROM quotes_revisions_default WHERE ctid IN (
+        SELECT ctid FROM quotes_revisions_default
+            WHERE createdTime>=? AND createdTime<? LIMIT ?)
+    RETURNING *
+)
+INSERT INTO {name} SELECT * FROM moved
+'''
+    total: int = 0
+    while True:
+        await cursor.execute(query, bounds + (batchSize,))
+        moved: int = cursor.rowcount
+        await db.commit()
+        total += moved
+        if moved < batchSize:
+            return total
+        await asyncio.sleep(batchDelay)
+
+
+async def _createPartition(db: DatabaseMain,
+                           cursor: 'aioodbc.cursor.Cursor',
+                           name: str,
+                           year: int,
+                           month: int) -> None:
+    end: Tuple[int, int] = _month(year, month, 1)
+    bounds: Tuple[datetime, datetime] = (datetime(year, month, 1),
+                                         datetime(end[0], end[1], 1))
+    start: str = f"'{year:04d}-{month:02d}-01'"
+    stop: str = f"'{end[0]:04d}-{end[1]:02d}-01'"
+    await cursor.execute(f'''
+CREATE TABLE IF NOT EXISTS {name}
+    (LIKE quotes_revisions INCLUDING DEFAULTS INCLUDING INDEXES)
+''')
+    await cursor.execute(f'''
+ALTER TABLE {name} DROP CONSTRAINT IF EXISTS {name}_bounds,
+    ADD CONSTRAINT {name}_bounds
+        CHECK (createdTime>={start} AND createdTime<{stop})
+''')
+    await db.commit()
+    await _moveRows(db, cursor, name, bounds)
+    await cursor.execute(f'''
+ALTER TABLE quotes_revisions_default DROP CONSTRAINT IF EXISTS {name}_bounds,
+    ADD CONSTRAINT {name}_bounds
+        CHECK (createdTime<{start} OR createdTime>={stop}) NOT VALID
+''')
+    await db.commit()
+    await _moveRows(db, cursor, name, bounds)
+    await cursor.execute(f'''
+ALTER TABLE quotes_revisions_default VALIDATE CONSTRAINT {name}_bounds
+''')
+    await db.commit()
+    await cursor.execute(f'''
+ALTER TABLE quotes_revisions ATTACH PARTITION {name}
+    FOR VALUES FROM ({start}) TO ({stop})
+''')
+    await cursor.execute(f'''
+ALTER TABLE quotes_revisions_default DROP CONSTRAINT {name}_bounds
+''')
+    await cursor.execute(f'''
+ALTER TABLE {name} DROP CONSTRAINT {name}_bounds
+''')
+    await db.commit()
+
+
+async def _partitions(cursor: 'aioodbc.cursor.Cursor') -> List[str]:
+    query: str = '''
+SELECT c.relname FROM pg_inherits AS i
+    JOIN pg_class AS c ON c.oid=i.inhrelid
+    WHERE i.inhparent='quotes_revisions'::regclass
+    ORDER BY c.relname
+'''
+    return [n async for n, in await cursor.execute(query)]
+
+
+async def _boundaries(cursor: 'aioodbc.cursor.Cursor',
+                      after: int,
+                      policy: RetentionPolicy,
+                      cutoff: datetime) -> List[Boundary]:
+    query: str = '''
+SELECT quoteId, MIN(revision), MAX(revision),
+        MIN(CASE WHEN createdTime>=? THEN revision END)
+    FROM quotes_revisions WHERE quoteId>?
+    GROUP BY quoteId ORDER BY quoteId LIMIT ?
+'''
+    result: List[Boundary] = []
+    quoteId: int
+    first: int
+    last: int
+    recent: Optional[int]
+    async for quoteId, first, last, recent in await cursor.execute(
+            query, (cutoff, after, batchSize)):
+        keep: int = last - max(policy.keepRevisions, 1) + 1
+        if recent is not None:
+            keep = min(keep, recent)
+        result.append((quoteId, first, keep))
+    return result
+
+
+async def _compactBatch(db: DatabaseMain,
+                        cursor: 'aioodbc.cursor.Cursor',
+                        boundaries: List[Boundary],
+                        delete: bool) -> Tuple[int, int]:
+    compacted: int = 0
+    deleted: int = 0
+    quoteId: int
+    first: int
+    keep: int
+    for quoteId, first, keep in boundaries:
+        if first >= keep:
+            continue
+        query: str = '''
+SELECT keyframe FROM quotes_revisions WHERE quoteId=? AND revision=?
+'''
+        await cursor.execute(query, (quoteId, keep))
+        row: Optional[Tuple[bool]] = await cursor.fetchone()
+        if row is not None and not row[0]:
+            revision: Optional[history.Revision]
+            revision = await history.revision(cursor, quoteId, keep)
+            assert revision is not None
+            query = '''
+UPDATE quotes_revisions SET keyframe=?, data=?
+    WHERE quoteId=? AND revision=?
+'''
+            await cursor.execute(
+                query, (True, history.encodeKeyframe(revision.quote),
+                        quoteId, keep))
+            compacted += 1
+        if delete:
+            query = '''
+DELETE FROM quotes_revisions WHERE quoteId=? AND revision<?
+'''
+            await cursor.execute(query, (quoteId, keep))
+            deleted += cursor.rowcount
+    await db.commit()
+    return compacted, deleted
+
+
+async def _dropPartitions(db: DatabaseMain,
+                          cursor: 'aioodbc.cursor.Cursor',
+                          policy: RetentionPolicy,
+                          cutoff: datetime) -> int:
+    dropped: int = 0
+    name: str
+    for name in await _partitions(cursor):
+        match: Optional[Match[str]] = partitionPattern.fullmatch(name)
+        if match is None:
+            continue
+        end: Tuple[int, int] = _month(int(match.group(1)),
+                                      int(match.group(2)), 1)
+        if datetime(end[0], end[1], 1) > cutoff:
+            continue
+        query: str = f'''
+SELECT 1 FROM {name} AS p
+    WHERE p.revision>(SELECT MAX(revision) FROM quotes_revisions AS r
+                      WHERE r.quoteId=p.quoteId) - ?
+    LIMIT 1
+'''
+        await cursor.execute(query, (max(policy.keepRevisions, 1),))
+        if await cursor.fetchone() is not None:
+            continue
+        await cursor.execute(
+            f'ALTER TABLE quotes_revisions DETACH PARTITION {name}')
+        await cursor.execute(f'DROP TABLE {name}')
+        await db.commit()
+        dropped += 1
+    return dropped
+
+
+async def _pass(policy: RetentionPolicy,
+                cutoff: datetime,
+                delete: bool,
+                progress: RetentionProgress,
+                report: Optional[Callable[[RetentionProgress], None]]
+                ) -> RetentionProgress:
+    after: int = 0
+    while True:
+        db: DatabaseMain
+        cursor: aioodbc.cursor.Cursor
+        async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+            boundaries: List[Boundary] = await _boundaries(
+                cursor, after, policy, cutoff)
+            if not boundaries:
+                return progress
+            compacted: int
+            deleted: int
+            compacted, deleted = await _compactBatch(db, cursor, boundaries,
+                                                     delete)
+        after = boundaries[-1][0]
+        progress = progress._replace(
+            quotes=progress.quotes + (len(boundaries) if delete else 0),
+            compacted=progress.compacted + compacted,
+            deleted=progress.deleted + deleted)
+        if report is not None:
+            report(progress)
+        await asyncio.sleep(batchDelay)
+
+
+async def compact(policy: RetentionPolicy = RetentionPolicy(),
+                  report: Optional[Callable[[RetentionProgress], None]] = None,
+                  now: Optional[datetime] = None) -> RetentionProgress:
+    cutoff: datetime = (now or datetime.utcnow()) - timedelta(
+        days=policy.keepDays)
+    progress: RetentionProgress = RetentionProgress()
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db:
+        postgres: bool = db.isPostgres
+    if postgres:
+        progress = await _pass(policy, cutoff, False, progress, report)
+        async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+            progress = progress._replace(
+                partitions=await _dropPartitions(db, cursor, policy, cutoff))
+        if report is not None:
+            report(progress)
+    progress = await _pass(policy, cutoff, True, progress, report)
+    if not postgres:
+        await vacuum()
+    return progress
+
+
+async def _freePages(cursor: 'aioodbc.cursor.Cursor') -> int:
+    await cursor.execute('''PRAGMA freelist_count''')
+    return int((await cursor.fetchone() or [0])[0])
+
+
+async def vacuum() -> int:
+    freed: int = 0
+    while True:
+        db: DatabaseMain
+        cursor: aioodbc.cursor.Cursor
+        async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+            before: int = await _freePages(cursor)
+            if not before:
+                return freed
+            await cursor.execute(f'''
+PRAGMA incremental_vacuum({vacuumPages})
+''')
+            await db.commit()
+            after: int = await _freePages(cursor)
+        if after >= before:
+            return freed
+        freed += before - after
+        await asyncio.sleep(batchDelay)
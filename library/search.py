@@ -0,0 +1,86 @@
+from typing import Any, List, Optional, Sequence, Tuple  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+from . import statements
+
+trigramLength: int = 3
+
+sqliteSearch: Optional[bool] = None
+
+
+async def hasSqliteSearch(cursor: 'aioodbc.cursor.Cursor') -> bool:
+    global sqliteSearch
+    if sqliteSearch is None:
+        query: str = '''
+SELECT 1 FROM sqlite_master WHERE type='table' AND name='quotes_search'
+'''
+        await cursor.execute(query)
+        sqliteSearch = await cursor.fetchone() is not None
+    return sqliteSearch
+
+
+def ftsPhrase(word: str) -> str:
+    return '"' + word.replace('"', '""') + '"'
+
+
+def likePattern(word: str) -> str:
+    escaped: str = (word.replace('\\', '\\\\')
+                    .replace('%', '\\%')
+                    .replace('_', '\\_'))
+    return f'%{escaped}%'
+
+
+async def sqliteRankedMatch(cursor: 'aioodbc.cursor.Cursor',
+                            channel: str,
+                            words: Sequence[str],
+                            limit: int) -> Tuple[str, Tuple[Any, ...]]:
+    if (all(len(w) >= trigramLength for w in words)
+            and await hasSqliteSearch(cursor)):
+        phrases: List[str] = [ftsPhrase(w) for w in words]
+        return '''
+SELECT q.quoteId, q.quote FROM quotes_search AS s
+    JOIN quotes AS q ON q.quoteId=s.rowid
+    WHERE quotes_search MATCH ? AND q.broadcaster=?
+    ORDER BY bm25(quotes_search), q.quoteId LIMIT ?
+''', (' OR '.join(phrases), channel, limit)
+    patterns: Tuple[str, ...] = tuple(likePattern(w) for w in words)
+    query: str = statements.statement(
+        ('sqliteRankedMatch', len(words)),
+        lambda: _rankedLikeQuery(len(words)))
+    return query, (channel,) + patterns + patterns + (limit,)
+
+
+def _rankedLikeQuery(count: int) -> str:
+    likes: List[str] = ["(quote LIKE ? ESCAPE '\\')"] * count
+    return f'''
+SELECT quoteId, quote FROM quotes
+    WHERE broadcaster=? AND ({' OR '.join(likes)})
+    ORDER BY {' + '.join(likes)} DESC, quoteId LIMIT ?
+'''
+
+
+def tagMatch(words: Sequence[str],
+             channel: Optional[str]) -> Tuple[str, Tuple[Any, ...]]:
+    tags: List[str] = sorted({w.lower() for w in words})
+    query: str = statements.statement(
+        ('tagMatch', channel is None, len(tags)),
+        lambda: _tagQuery(channel is None, len(tags)))
+    if channel is None:
+        return query, tuple(tags) + (len(tags),)
+    return query, (channel,) + tuple(tags) + (len(tags),)
+
+
+def _tagQuery(anyChannel: bool, count: int) -> str:
+    inList: str = ', '.join(['?'] * count)
+    if anyChannel:
+        return f'''
+SELECT quoteId FROM quotes_tags WHERE LOWER(tag) IN ({inList})
+    GROUP BY quoteId HAVING COUNT(DISTINCT LOWER(tag))=?
+'''
+    return f'''
+SELECT t.quoteId FROM quotes_tags AS t
+    JOIN quotes AS q ON q.quoteId=t.quoteId
+    WHERE q.broadcaster=? AND LOWER(t.tag) IN ({inList})
+    GROUP BY t.quoteId HAVING COUNT(DISTINCT LOWER(t.tag))=?
+'''
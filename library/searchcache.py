@@ -0,0 +1,135 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, FrozenSet, Hashable  # noqa: F401
+from typing import Iterable, List, Optional, Sequence, Tuple  # noqa: F401
+
+from . import searchquery
+from .cache import CacheStats, LruCache
+
+channelSize: int = 64
+maxChannels: int = 1024
+ttlSeconds: float = 60.0
+
+Key = Tuple[Optional[str], Hashable]
+Results = LruCache[Hashable, Tuple[int, ...]]
+
+
+class SearchStats(CacheStats):
+    __slots__ = ('coalesced',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.coalesced: int = 0
+
+    def asDict(self) -> Dict[str, int]:
+        stats: Dict[str, int] = super().asDict()
+        stats['coalesced'] = self.coalesced
+        return stats
+
+
+_stats: SearchStats = SearchStats()
+_results: 'LruCache[Optional[str], Results]'
+_results = LruCache(maxChannels, ttl=float('inf'))
+_inflight: 'Dict[Key, asyncio.Future]' = {}
+_generations: Dict[Optional[str], int] = {}
+_epoch: int = 0
+
+
+def normalize(words: Sequence[str]) -> Hashable:
+    plain: Optional[List[str]]
+    plain = searchquery.plainWords(searchquery.parsed(words))
+    if plain is None:
+        return tuple(words)
+    return frozenset(w.lower() for w in plain)
+
+
+def _generation(channel: Optional[str]) -> Tuple[int, int, int]:
+    return (_epoch, _generations.get(channel, 0), _generations.get(None, 0))
+
+
+async def matches(channel: Optional[str],
+                  words: Sequence[str],
+                  loader: Callable[[], Awaitable[Iterable[int]]]
+                  ) -> Tuple[int, ...]:
+    key: Key = channel, normalize(words)
+    results: Optional[Results] = _results.get(channel)
+    quoteIds: Optional[Tuple[int, ...]] = None
+    if results is not None:
+        quoteIds = results.get(key[1])
+    else:
+        _stats.misses += 1
+    if quoteIds is not None:
+        return quoteIds
+
+    inflight: Optional[asyncio.Future] = _inflight.get(key)
+    if inflight is not None:
+        _stats.coalesced += 1
+        try:
+            return await asyncio.shield(inflight)
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+        return await matches(channel, words, loader)
+
+    future: asyncio.Future = asyncio.get_event_loop().create_future()
+    _inflight[key] = future
+    generation: Tuple[int, int, int] = _generation(channel)
+    try:
+        quoteIds = tuple(await loader())
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()
+        raise
+    finally:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+    if generation == _generation(channel):
+        results = _results.get(channel)
+        if results is None:
+            results = LruCache(channelSize, _stats, ttlSeconds)
+            _results.put(channel, results)
+        results.put(key[1], quoteIds)
+    future.set_result(quoteIds)
+    return quoteIds
+
+
+def cached(channel: Optional[str],
+           words: Sequence[str]) -> Optional[Tuple[int, ...]]:
+    results: Optional[Results] = _results.get(channel)
+    if results is None:
+        return None
+    return results.get(normalize(words))
+
+
+def invalidate(channel: str) -> None:
+    name: Optional[str]
+    for name in [channel, None]:
+        _generations[name] = _generations.get(name, 0) + 1
+        _results.pop(name)
+    key: Key
+    for key in [k for k in _inflight if k[0] in (channel, None)]:
+        del _inflight[key]
+
+
+def stats() -> Dict[str, int]:
+    stats: Dict[str, int] = _stats.asDict()
+    stats['channels'] = len(_results)
+    stats['inflight'] = len(_inflight)
+    return stats
+
+
+def invalidateAll() -> None:
+    global _epoch
+    _epoch += 1
+    _results.clear()
+    _inflight.clear()
+
+
+def clear() -> None:
+    invalidateAll()
+    _stats.hits = 0
+    _stats.misses = 0
+    _stats.evictions = 0
+    _stats.coalesced = 0
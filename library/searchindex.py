@@ -0,0 +1,257 @@
+import bisect
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence  # noqa: F401
+from typing import Set, Tuple  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+from lib.database import DatabaseMain
+from . import search
+
+loadAttempts: int = 3
+refreshSeconds: float = 3600.0
+enabled: bool = False
+
+loaded: bool = False
+_loadedAt: float = 0.0
+
+
+def _insert(postings: array, quoteId: int) -> None:
+    index: int = bisect.bisect_left(postings, quoteId)
+    if index == len(postings) or postings[index] != quoteId:
+        postings.insert(index, quoteId)
+
+
+def _delete(postings: array, quoteId: int) -> None:
+    index: int = bisect.bisect_left(postings, quoteId)
+    if index < len(postings) and postings[index] == quoteId:
+        del postings[index]
+
+
+def _contains(postings: array, quoteId: int) -> bool:
+    index: int = bisect.bisect_left(postings, quoteId)
+    return index < len(postings) and postings[index] == quoteId
+
+
+def _intersect(lists: List[array]) -> List[int]:
+    lists = sorted(lists, key=len)
+    return [i for i in lists[0] if all(_contains(p, i) for p in lists[1:])]
+
+
+def _union(first: Sequence[int], second: Sequence[int]) -> List[int]:
+    result: List[int] = []
+    i: int = 0
+    j: int = 0
+    while i < len(first) and j < len(second):
+        if first[i] < second[j]:
+            result.append(first[i])
+            i += 1
+        elif second[j] < first[i]:
+            result.append(second[j])
+            j += 1
+        else:
+            result.append(first[i])
+            i += 1
+            j += 1
+    result.extend(first[i:])
+    result.extend(second[j:])
+    return result
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + search.trigramLength]
+            for i in range(len(text) - search.trigramLength + 1)}
+
+
+class ChannelIndex:
+    __slots__ = ('quotes', 'grams', 'tags', 'quoteTags')
+
+    def __init__(self) -> None:
+        self.quotes: Dict[int, str] = {}
+        self.grams: Dict[str, array] = {}
+        self.tags: Dict[str, array] = {}
+        self.quoteTags: Dict[int, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.quotes)
+
+    def addQuote(self, quoteId: int, quote: str) -> None:
+        self.removeQuote(quoteId, keepTags=True)
+        text: str = quote.lower()
+        self.quotes[quoteId] = text
+        gram: str
+        for gram in trigrams(text):
+            if gram not in self.grams:
+                self.grams[gram] = array('q')
+            _insert(self.grams[gram], quoteId)
+
+    def removeQuote(self, quoteId: int, keepTags: bool = False) -> None:
+        text: Optional[str] = self.quotes.pop(quoteId, None)
+        if text is not None:
+            gram: str
+            for gram in trigrams(text):
+                _delete(self.grams[gram], quoteId)
+                if not self.grams[gram]:
+                    del self.grams[gram]
+        if not keepTags:
+            self.removeTags(quoteId, list(self.quoteTags.get(quoteId, ())))
+
+    def addTags(self, quoteId: int, tags: Iterable[str]) -> None:
+        quoteTags: Set[str] = self.quoteTags.setdefault(quoteId, set())
+        tag: str
+        for tag in tags:
+            quoteTags.add(tag)
+            if tag.lower() not in self.tags:
+                self.tags[tag.lower()] = array('q')
+            _insert(self.tags[tag.lower()], quoteId)
+
+    def removeTags(self, quoteId: int, tags: Iterable[str]) -> None:
+        quoteTags: Set[str] = self.quoteTags.get(quoteId, set())
+        quoteTags.difference_update(tags)
+        remaining: Set[str] = {t.lower() for t in quoteTags}
+        tag: str
+        for tag in {t.lower() for t in tags} - remaining:
+            if tag in self.tags:
+                _delete(self.tags[tag], quoteId)
+                if not self.tags[tag]:
+                    del self.tags[tag]
+        if not quoteTags:
+            self.quoteTags.pop(quoteId, None)
+
+    def matchText(self, words: Sequence[str]) -> List[int]:
+        lowered: List[str] = [w.lower() for w in words]
+        lists: List[array] = []
+        word: str
+        for word in lowered:
+            gram: str
+            for gram in trigrams(word):
+                if gram not in self.grams:
+                    return []
+                lists.append(self.grams[gram])
+        candidates: Iterable[int]
+        candidates = _intersect(lists) if lists else sorted(self.quotes)
+        return [i for i in candidates
+                if all(w in self.quotes[i] for w in lowered)]
+
+    def matchTags(self, words: Sequence[str]) -> List[int]:
+        lists: List[array] = []
+        tag: str
+        for tag in {w.lower() for w in words}:
+            if tag not in self.tags:
+                return []
+            lists.append(self.tags[tag])
+        return _intersect(lists) if lists else []
+
+    def search(self, words: Sequence[str]) -> List[int]:
+        return _union(self.matchText(words), self.matchTags(words))
+
+
+_channels: Dict[str, ChannelIndex] = {}
+_owners: Dict[int, str] = {}
+_version: int = 0
+
+
+def _channel(channel: str) -> ChannelIndex:
+    if channel not in _channels:
+        _channels[channel] = ChannelIndex()
+    return _channels[channel]
+
+
+async def load() -> bool:
+    global loaded, _loadedAt
+    db: DatabaseMain
+    cursor: aioodbc.cursor.Cursor
+    async with DatabaseMain.acquire() as db, await db.cursor() as cursor:
+        if db.isPostgres:
+            return False
+        attempt: int
+        for attempt in range(loadAttempts):
+            version: int = _version
+            channels: Dict[str, ChannelIndex] = {}
+            owners: Dict[int, str] = {}
+            query: str = '''
+SELECT quoteId, broadcaster, quote FROM quotes
+'''
+            quoteId: int
+            broadcaster: str
+            quote: str
+            async for quoteId, broadcaster, quote in await cursor.execute(
+                    query):
+                if broadcaster not in channels:
+                    channels[broadcaster] = ChannelIndex()
+                channels[broadcaster].addQuote(quoteId, quote)
+                owners[quoteId] = broadcaster
+            query = '''
+SELECT quoteId, tag FROM quotes_tags
+'''
+            tag: str
+            async for quoteId, tag in await cursor.execute(query):
+                if quoteId in owners:
+                    channels[owners[quoteId]].addTags(quoteId, [tag])
+            if version == _version:
+                _channels.clear()
+                _channels.update(channels)
+                _owners.clear()
+                _owners.update(owners)
+                loaded = True
+                _loadedAt = time.monotonic()
+                return True
+        return False
+
+
+def stale() -> bool:
+    return not loaded or time.monotonic() - _loadedAt >= refreshSeconds
+
+
+def matches(channel: Optional[str], words: Sequence[str]) -> List[int]:
+    if channel is not None:
+        if channel not in _channels:
+            return []
+        return _channels[channel].search(words)
+    return [i for index in _channels.values() for i in index.search(words)]
+
+
+def _changed() -> None:
+    global _version
+    _version += 1
+
+
+def addQuote(channel: str, quoteId: int, quote: str) -> None:
+    _changed()
+    if loaded:
+        _channel(channel).addQuote(quoteId, quote)
+        _owners[quoteId] = channel
+
+
+def removeQuote(quoteId: int) -> None:
+    _changed()
+    if loaded and quoteId in _owners:
+        _channels[_owners.pop(quoteId)].removeQuote(quoteId)
+
+
+def addTags(quoteId: int, tags: Iterable[str]) -> None:
+    _changed()
+    if loaded and quoteId in _owners:
+        _channels[_owners[quoteId]].addTags(quoteId, tags)
+
+
+def removeTags(quoteId: int, tags: Iterable[str]) -> None:
+    _changed()
+    if loaded and quoteId in _owners:
+        _channels[_owners[quoteId]].removeTags(quoteId, tags)
+
+
+def copyTags(fromQuoteId: int, toQuoteId: int) -> None:
+    _changed()
+    if loaded and fromQuoteId in _owners:
+        tags: Set[str] = _channels[_owners[fromQuoteId]].quoteTags.get(
+            fromQuoteId, set())
+        addTags(toQuoteId, list(tags))
+
+
+def unload() -> None:
+    global loaded
+    loaded = False
+    _channels.clear()
+    _owners.clear()
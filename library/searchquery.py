@@ -0,0 +1,228 @@
+import re
+from typing import Any, Dict, Hashable, List, Match, NamedTuple  # noqa: F401
+from typing import Optional, Pattern, Sequence, Tuple  # noqa: F401
+
+from . import search, statements
+from .cache import LruCache
+
+parsedSize: int = 1024
+
+termPattern: Pattern = re.compile(r'(-?)(?:"([^"]*)"?|(\S+))')
+lexemePattern: Pattern = re.compile(r'\w+')
+
+
+class Term(NamedTuple):
+    kind: str
+    text: str
+    negated: bool
+
+
+Query = Tuple[Tuple[Term, ...], ...]
+
+
+class Compiled(NamedTuple):
+    condition: str
+    params: Tuple[Any, ...]
+    rank: str
+    rankParams: Tuple[Any, ...]
+    shape: Hashable
+
+
+def parse(words: Sequence[str]) -> Query:
+    groups: List[List[Term]] = [[]]
+    match: Match
+    for match in termPattern.finditer(' '.join(words)):
+        negated: bool = bool(match.group(1))
+        phrase: Optional[str] = match.group(2)
+        word: str = match.group(3)
+        if phrase is not None:
+            phrase = ' '.join(phrase.split())
+            if phrase:
+                groups[-1].append(Term('phrase', phrase, negated))
+        elif not negated and word == 'OR':
+            groups.append([])
+        elif not negated and word == 'AND':
+            pass
+        elif word.lower().startswith('tag:') and len(word) > 4:
+            groups[-1].append(Term('tag', word[4:], negated))
+        elif word.endswith('*') and word.rstrip('*'):
+            groups[-1].append(Term('prefix', word.rstrip('*'), negated))
+        else:
+            groups[-1].append(Term('word', word, negated))
+    return tuple(tuple(group) for group in groups if group)
+
+
+def plainWords(query: Query) -> Optional[List[str]]:
+    if len(query) != 1:
+        return None
+    if any(t.kind != 'word' or t.negated for t in query[0]):
+        return None
+    return [t.text for t in query[0]]
+
+
+def anyOf(query: Query) -> Query:
+    return tuple((term,) for group in query for term in group)
+
+
+_fragments: Dict[str, str] = {
+    'tag': '''\
+quoteId IN (SELECT quoteId FROM quotes_tags WHERE LOWER(tag)=?)''',
+    '-tag': '''\
+quoteId NOT IN (SELECT quoteId FROM quotes_tags WHERE LOWER(tag)=?)''',
+    'like': "quote LIKE ? ESCAPE '\\'",
+    '-like': "quote NOT LIKE ? ESCAPE '\\'",
+    'fts': '''\
+quoteId IN (SELECT rowid FROM quotes_search WHERE quotes_search MATCH ?)''',
+}
+
+
+def _class(kind: str, term: Term) -> str:
+    return ('-' if term.negated else '') + kind
+
+
+def _sqliteShape(query: Query, fts: bool) -> Tuple[Hashable, List[Any]]:
+    shape: List[Tuple[str, ...]] = []
+    params: List[Any] = []
+    group: Tuple[Term, ...]
+    for group in query:
+        classes: List[str] = []
+        groupParams: List[Any] = []
+        phrases: List[str] = []
+        term: Term
+        for term in group:
+            if term.kind == 'tag':
+                classes.append(_class('tag', term))
+                groupParams.append(term.text.lower())
+            elif (fts and not term.negated
+                    and len(term.text) >= search.trigramLength):
+                phrases.append(search.ftsPhrase(term.text))
+            else:
+                classes.append(_class('like', term))
+                groupParams.append(search.likePattern(term.text))
+        if phrases:
+            classes.insert(0, 'fts')
+            groupParams.insert(0, ' AND '.join(phrases))
+        if all(c.startswith('-') for c in classes):
+            continue
+        shape.append(tuple(classes))
+        params.extend(groupParams)
+    return tuple(shape), params
+
+
+def _sqliteCondition(shape: Tuple[Tuple[str, ...], ...]) -> str:
+    return '(' + ' OR '.join(
+        '(' + ' AND '.join(_fragments[c] for c in classes) + ')'
+        for classes in shape) + ')'
+
+
+def _tsquery(term: Term) -> Optional[Tuple[str, str]]:
+    if term.kind == 'phrase':
+        return 'phraseto_tsquery(?)', term.text
+    if term.kind == 'prefix':
+        lexemes: List[str] = lexemePattern.findall(term.text)
+        if not lexemes:
+            return None
+        return 'to_tsquery(?)', ' & '.join(f"'{x}':*" for x in lexemes)
+    return 'plainto_tsquery(?)', term.text
+
+
+def _postgresShape(query: Query) -> Tuple[Hashable, List[Any], List[Any]]:
+    shape: List[Tuple[Tuple[str, ...], Tuple[str, ...]]] = []
+    textParams: List[Any] = []
+    mixedParams: List[Any] = []
+    rankParams: List[Any] = []
+    group: Tuple[Term, ...]
+    for group in query:
+        tsqueries: List[str] = []
+        tags: List[str] = []
+        params: List[Any] = []
+        tagParams: List[Any] = []
+        term: Term
+        for term in group:
+            if term.kind == 'tag':
+                tags.append(_class('tag', term))
+                tagParams.append(term.text.lower())
+                continue
+            tsquery: Optional[Tuple[str, str]] = _tsquery(term)
+            if tsquery is None:
+                continue
+            tsqueries.append(('!!' if term.negated else '') + tsquery[0])
+            params.append(tsquery[1])
+            if not term.negated:
+                rankParams.append(tsquery[1])
+        if (all(q.startswith('!!') for q in tsqueries)
+                and all(t.startswith('-') for t in tags)):
+            continue
+        shape.append((tuple(tsqueries), tuple(tags)))
+        if tags:
+            mixedParams.extend(params + tagParams)
+        else:
+            textParams.extend(params)
+    return tuple(shape), textParams + mixedParams, rankParams
+
+
+def _postgresCondition(shape: Tuple[Tuple[Tuple[str, ...], Tuple[str, ...]],
+                                    ...]) -> Tuple[str, str]:
+    textOnly: List[str] = []
+    mixed: List[str] = []
+    rank: List[str] = []
+    tsqueries: Tuple[str, ...]
+    tags: Tuple[str, ...]
+    for tsqueries, tags in shape:
+        rank.extend(q for q in tsqueries if not q.startswith('!!'))
+        if not tags:
+            textOnly.append('(' + ' && '.join(tsqueries) + ')')
+            continue
+        conditions: List[str] = [_fragments[c] for c in tags]
+        if tsqueries:
+            conditions.insert(0, f'document @@ ({" && ".join(tsqueries)})')
+        mixed.append('(' + ' AND '.join(conditions) + ')')
+    disjuncts: List[str] = []
+    if textOnly:
+        disjuncts.append(f'document @@ ({" || ".join(textOnly)})')
+    disjuncts.extend(mixed)
+    return ('(' + ' OR '.join(disjuncts) + ')',
+            '(' + ' || '.join(rank) + ')' if rank else '')
+
+
+_parsed: 'LruCache[Tuple[str, ...], Query]'
+_parsed = LruCache(parsedSize, ttl=float('inf'))
+
+
+def parsed(words: Sequence[str]) -> Query:
+    key: Tuple[str, ...] = tuple(words)
+    query: Optional[Query] = _parsed.get(key)
+    if query is None:
+        query = parse(key)
+        _parsed.put(key, query)
+    return query
+
+
+def compile(words: Sequence[str], postgres: bool, fts: bool) -> Compiled:
+    query: Query = parsed(words)
+    shape: Hashable
+    params: List[Any]
+    if postgres:
+        if plainWords(query) is not None:
+            query = anyOf(query)
+        rankParams: List[Any]
+        shape, params, rankParams = _postgresShape(query)
+        if not shape:
+            return Compiled('', (), '', (), None)
+        condition: str
+        rank: str
+        condition, rank = statements.statement(
+            ('searchCondition', 'postgres', shape),
+            lambda: _postgresCondition(shape))
+        return Compiled(condition, tuple(params), rank, tuple(rankParams),
+                        ('postgres', shape))
+    shape, params = _sqliteShape(query, fts)
+    if not shape:
+        return Compiled('', (), '', (), None)
+    condition = statements.statement(('searchCondition', 'sqlite', shape),
+                                     lambda: _sqliteCondition(shape))
+    return Compiled(condition, tuple(params), '', (), ('sqlite', shape))
+
+
+def clear() -> None:
+    _parsed.clear()
@@ -0,0 +1,212 @@
+import re
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Pattern, Tuple  # noqa: F401
+
+import aioodbc.cursor  # noqa: F401
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+maxChannels: int = 64
+minimumScore: float = 1e-9
+minimumCapacity: int = 64
+tokenPattern: Pattern = re.compile(r'\w+')
+
+
+def available() -> bool:
+    return numpy is not None
+
+
+def tokens(text: str) -> Counter:
+    return Counter(tokenPattern.findall(text.lower()))
+
+
+class ChannelVectors:
+    def __init__(self) -> None:
+        self.quotes: Dict[int, str] = {}
+        self.counts: Dict[int, Counter] = {}
+        self.frequency: Counter = Counter()
+        self.ids: List[Optional[int]] = []
+        self.rows: Dict[int, int] = {}
+        self.spans: List[Tuple[int, int]] = []
+        self.columns: Dict[str, int] = {}
+        self.used: int = 0
+        self.dead: int = 0
+        self.documents: 'numpy.ndarray' = numpy.zeros(minimumCapacity)
+        self.indices: 'numpy.ndarray' = numpy.zeros(minimumCapacity,
+                                                    dtype=numpy.int64)
+        self.weights: 'numpy.ndarray' = numpy.zeros(minimumCapacity)
+        self.rowOf: 'numpy.ndarray' = numpy.zeros(minimumCapacity,
+                                                  dtype=numpy.int64)
+
+    def __len__(self) -> int:
+        return len(self.quotes)
+
+    def _reserve(self, entries: int) -> None:
+        if self.used + entries <= len(self.indices):
+            return
+        capacity: int = max(2 * len(self.indices), self.used + entries)
+        self.indices = numpy.resize(self.indices, capacity)
+        self.weights = numpy.resize(self.weights, capacity)
+        self.rowOf = numpy.resize(self.rowOf, capacity)
+
+    def _column(self, token: str) -> int:
+        if token not in self.columns:
+            self.columns[token] = len(self.columns)
+            if len(self.columns) > len(self.documents):
+                self.documents = numpy.concatenate(
+                    [self.documents, numpy.zeros(len(self.documents))])
+        return self.columns[token]
+
+    def put(self, quoteId: int, quote: str) -> None:
+        self.remove(quoteId)
+        counts: Counter = tokens(quote)
+        self.quotes[quoteId] = quote
+        self.counts[quoteId] = counts
+        self.frequency.update(counts.keys())
+        columns: numpy.ndarray = numpy.array(
+            [self._column(t) for t in counts], dtype=numpy.int64)
+        self.documents[columns] += 1
+        self._reserve(len(columns))
+        row: int = len(self.ids)
+        end: int = self.used + len(columns)
+        self.indices[self.used:end] = columns
+        self.weights[self.used:end] = list(counts.values())
+        self.rowOf[self.used:end] = row
+        self.ids.append(quoteId)
+        self.rows[quoteId] = row
+        self.spans.append((self.used, end))
+        self.used = end
+
+    def remove(self, quoteId: int) -> None:
+        if quoteId not in self.quotes:
+            return
+        del self.quotes[quoteId]
+        counts: Counter = self.counts.pop(quoteId)
+        self.frequency.subtract(counts.keys())
+        token: str
+        for token in counts:
+            if self.frequency[token] <= 0:
+                del self.frequency[token]
+        row: int = self.rows.pop(quoteId)
+        start: int
+        end: int
+        start, end = self.spans[row]
+        self.documents[self.indices[start:end]] -= 1
+        self.weights[start:end] = 0
+        self.ids[row] = None
+        self.dead += end - start
+        if self.dead > max(self.used - self.dead, minimumCapacity):
+            self._compact()
+
+    def _compact(self) -> None:
+        alive: numpy.ndarray = numpy.array(
+            [i is not None for i in self.ids], dtype=bool)
+        renumber: numpy.ndarray = numpy.cumsum(alive) - 1
+        kept: numpy.ndarray = alive[self.rowOf[:self.used]]
+        indices: numpy.ndarray = self.indices[:self.used][kept]
+        weights: numpy.ndarray = self.weights[:self.used][kept]
+        rowOf: numpy.ndarray = renumber[self.rowOf[:self.used][kept]]
+        self.used = len(indices)
+        self.dead = 0
+        self.indices[:self.used] = indices
+        self.weights[:self.used] = weights
+        self.rowOf[:self.used] = rowOf
+        lengths: List[int] = [e - s for (s, e), i in zip(self.spans, self.ids)
+                              if i is not None]
+        self.ids = [i for i in self.ids if i is not None]
+        self.rows = {quoteId: row for row, quoteId in enumerate(self.ids)
+                     if quoteId is not None}
+        self.spans = []
+        position: int = 0
+        length: int
+        for length in lengths:
+            self.spans.append((position, position + length))
+            position += length
+
+    def similar(self, quoteId: int, k: int) -> Optional[List[Tuple[int, str]]]:
+        if quoteId not in self.quotes:
+            return None
+        if k <= 0:
+            return []
+        row: int = self.rows[quoteId]
+        indices: numpy.ndarray = self.indices[:self.used]
+        rowOf: numpy.ndarray = self.rowOf[:self.used]
+        idf: numpy.ndarray = numpy.log(
+            (1 + len(self.quotes))
+            / (1 + self.documents[:len(self.columns)])) + 1
+        data: numpy.ndarray = self.weights[:self.used] * idf[indices]
+        norms: numpy.ndarray = numpy.sqrt(numpy.bincount(
+            rowOf, weights=data ** 2, minlength=len(self.ids)))
+        if norms[row] == 0:
+            return []
+        start: int
+        end: int
+        start, end = self.spans[row]
+        query: numpy.ndarray = numpy.zeros(len(self.columns))
+        query[indices[start:end]] = data[start:end] / norms[row]
+        scores: numpy.ndarray = numpy.bincount(
+            rowOf, weights=data * query[indices], minlength=len(self.ids))
+        numpy.divide(scores, norms, out=scores, where=norms > 0)
+        scores[row] = 0
+        candidates: numpy.ndarray = numpy.flatnonzero(scores > minimumScore)
+        if len(candidates) > k:
+            candidates = candidates[
+                numpy.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[
+            numpy.argsort(-scores[candidates], kind='stable')]
+        result: List[Tuple[int, str]] = []
+        index: int
+        for index in candidates:
+            candidate: Optional[int] = self.ids[index]
+            assert candidate is not None
+            result.append((candidate, self.quotes[candidate]))
+        return result
+
+
+_channels: 'OrderedDict[str, ChannelVectors]' = OrderedDict()
+_versions: Dict[str, int] = {}
+
+
+def get(channel: str) -> Optional[ChannelVectors]:
+    if channel not in _channels:
+        return None
+    _channels.move_to_end(channel)
+    return _channels[channel]
+
+
+async def load(cursor: 'aioodbc.cursor.Cursor',
+               channel: str) -> ChannelVectors:
+    version: int = _versions.get(channel, 0)
+    vectors: ChannelVectors = ChannelVectors()
+    query: str = '''
+SELECT quoteId, quote FROM quotes WHERE broadcaster=?
+'''
+    quoteId: int
+    quote: str
+    async for quoteId, quote in await cursor.execute(query, (channel,)):
+        vectors.put(quoteId, quote)
+    if _versions.get(channel, 0) == version:
+        _channels[channel] = vectors
+        while len(_channels) > maxChannels:
+            _channels.popitem(last=False)
+    return vectors
+
+
+def putQuote(channel: str, quoteId: int, quote: str) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    if channel in _channels:
+        _channels[channel].put(quoteId, quote)
+
+
+def removeQuote(channel: str, quoteId: int) -> None:
+    _versions[channel] = _versions.get(channel, 0) + 1
+    if channel in _channels:
+        _channels[channel].remove(quoteId)
+
+
+def clear() -> None:
+    _channels.clear()
+    _versions.clear()
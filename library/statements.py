@@ -0,0 +1,46 @@
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple  # noqa: F401
+from typing import TypeVar  # noqa: F401
+
+from .cache import CacheStats, LruCache
+
+T = TypeVar('T')
+
+cacheSize: int = 1024
+
+
+class StatementStats(CacheStats):
+    __slots__ = ('buildSeconds',)
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.buildSeconds: float = 0.0
+
+    def asDict(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = dict(super().asDict())
+        result['buildSeconds'] = self.buildSeconds
+        return result
+
+
+stats: StatementStats = StatementStats()
+_statements: 'LruCache[Tuple[Hashable, ...], Any]'
+_statements = LruCache(cacheSize, stats, ttl=float('inf'))
+
+
+def statement(key: Tuple[Hashable, ...], build: Callable[[], T]) -> T:
+    cached: Optional[T] = _statements.get(key)
+    if cached is not None:
+        return cached
+    start: float = time.perf_counter()
+    result: T = build()
+    stats.buildSeconds += time.perf_counter() - start
+    _statements.put(key, result)
+    return result
+
+
+def clear() -> None:
+    _statements.clear()
+    stats.hits = 0
+    stats.misses = 0
+    stats.evictions = 0
+    stats.buildSeconds = 0.0
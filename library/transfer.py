@@ -0,0 +1,152 @@
+import asyncio
+import csv
+import functools
+import itertools
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable  # noqa: F401
+from typing import Dict, IO, Iterator, List, NamedTuple  # noqa: F401
+from typing import Optional  # noqa: F401
+
+batchSize: int = 500
+pageSize: int = 100
+
+formats: List[str] = ['jsonl', 'csv']
+kinds: List[str] = ['quote', 'tag', 'revision']
+fields: List[str] = ['kind', 'quoteId', 'text', 'revision', 'createdTime',
+                     'editor']
+
+
+class TransferRow(NamedTuple):
+    kind: str
+    quoteId: int
+    text: str
+    revision: Optional[int] = None
+    createdTime: Optional[datetime] = None
+    editor: Optional[str] = None
+
+
+class ImportProgress(NamedTuple):
+    rows: int = 0
+    quotes: int = 0
+    tags: int = 0
+    revisions: int = 0
+
+
+def formatOf(path: str) -> Optional[str]:
+    extension: str = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'json':
+        extension = 'jsonl'
+    return extension if extension in formats else None
+
+
+def _serialize(row: TransferRow) -> Dict[str, Any]:
+    return {
+        'kind': row.kind,
+        'quoteId': row.quoteId,
+        'text': row.text,
+        'revision': row.revision,
+        'createdTime': (row.createdTime.isoformat()
+                        if row.createdTime is not None else None),
+        'editor': row.editor,
+        }
+
+
+def _deserialize(item: Dict[str, Any]) -> TransferRow:
+    kind: str = str(item.get('kind') or '')
+    if kind not in kinds:
+        raise ValueError(f'Unknown row kind: {kind!r}')
+    revision: Any = item.get('revision')
+    createdTime: Any = item.get('createdTime')
+    editor: Any = item.get('editor')
+    return TransferRow(
+        kind,
+        int(item['quoteId']),
+        str(item['text']),
+        int(revision) if revision not in (None, '') else None,
+        (datetime.fromisoformat(str(createdTime))
+         if createdTime not in (None, '') else None),
+        str(editor) if editor not in (None, '') else None)
+
+
+def writer(file: IO[str], format: str) -> Callable[[TransferRow], None]:
+    if format == 'csv':
+        output: csv.DictWriter = csv.DictWriter(file, fields)
+        output.writeheader()
+
+        def writeCsv(row: TransferRow) -> None:
+            output.writerow(_serialize(row))
+        return writeCsv
+
+    def writeJson(row: TransferRow) -> None:
+        item: Dict[str, Any] = {k: v for k, v in _serialize(row).items()
+                                if v is not None}
+        file.write(json.dumps(item, ensure_ascii=False) + '\n')
+    return writeJson
+
+
+def reader(file: IO[str], format: str) -> Iterator[TransferRow]:
+    item: Dict[str, Any]
+    if format == 'csv':
+        for item in csv.DictReader(file):
+            yield _deserialize(item)
+        return
+    line: str
+    for line in file:
+        if line.strip():
+            yield _deserialize(json.loads(line))
+
+
+def _writeChunk(write: Callable[[TransferRow], None],
+                rows: List[TransferRow]) -> None:
+    row: TransferRow
+    for row in rows:
+        write(row)
+
+
+async def writeRows(path: str,
+                    format: str,
+                    rows: AsyncIterable[TransferRow]) -> int:
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    file: IO[str] = await loop.run_in_executor(
+        None, functools.partial(open, path, 'w', encoding='utf-8',
+                                newline=''))
+    try:
+        write: Callable[[TransferRow], None] = await loop.run_in_executor(
+            None, writer, file, format)
+        count: int = 0
+        chunk: List[TransferRow] = []
+        row: TransferRow
+        async for row in rows:
+            chunk.append(row)
+            if len(chunk) >= pageSize:
+                await loop.run_in_executor(None, _writeChunk, write, chunk)
+                count += len(chunk)
+                chunk = []
+        await loop.run_in_executor(None, _writeChunk, write, chunk)
+        return count + len(chunk)
+    finally:
+        await loop.run_in_executor(None, file.close)
+
+
+def _readChunk(rows: Iterator[TransferRow]) -> List[TransferRow]:
+    return list(itertools.islice(rows, batchSize))
+
+
+async def readRows(path: str, format: str) -> AsyncIterator[TransferRow]:
+    loop: asyncio.AbstractEventLoop = asyncio.get_event_loop()
+    file: IO[str] = await loop.run_in_executor(
+        None, functools.partial(open, path, encoding='utf-8', newline=''))
+    try:
+        rows: Iterator[TransferRow] = reader(file, format)
+        while True:
+            chunk: List[TransferRow] = await loop.run_in_executor(
+                None, _readChunk, rows)
+            if not chunk:
+                return
+            row: TransferRow
+            for row in chunk:
+                yield row
+    finally:
+        await loop.run_in_executor(None, file.close)
@@ -0,0 +1,104 @@
+from typing import Awaitable, Callable, Dict, List, Optional  # noqa: F401
+
+from lib.data import ManageBotArgs
+
+from .library import database, migration, retention, transfer
+from .library.transfer import ImportProgress  # noqa: F401
+
+
+async def manageQuotes(args: ManageBotArgs) -> bool:
+    if len(args.message) < 3:
+        return False
+
+    handlers: Dict[str, Callable[[ManageBotArgs], Awaitable[bool]]]
+    handlers = {
+        'export': manageExportQuotes,
+        'import': manageImportQuotes,
+        'migrate': manageMigrateQuotes,
+        'retention': manageQuoteRetention,
+    }
+
+    if args.message.lower[2] in handlers:
+        return await handlers[args.message.lower[2]](args)
+    return False
+
+
+async def manageExportQuotes(args: ManageBotArgs) -> bool:
+    if len(args.message) < 5:
+        return False
+    channel: str = args.message.lower[3]
+    path: str = args.message[4]
+    format: Optional[str] = transfer.formatOf(path)
+    if format is None:
+        args.send(f'Unknown export format for {path}')
+        return True
+    count: int = await transfer.writeRows(path, format,
+                                          database.exportQuotes(channel))
+    args.send(f'Exported {count} rows of quotes for {channel} to {path}')
+    return True
+
+
+async def manageImportQuotes(args: ManageBotArgs) -> bool:
+    if len(args.message) < 5:
+        return False
+    channel: str = args.message.lower[3]
+    path: str = args.message[4]
+    format: Optional[str] = transfer.formatOf(path)
+    if format is None:
+        args.send(f'Unknown import format for {path}')
+        return True
+    resume: int = 0
+    if len(args.message) >= 6:
+        try:
+            resume = int(args.message[5])
+        except ValueError:
+            args.send('Resume position is not a number.')
+            return True
+    progress: List[ImportProgress] = [ImportProgress(rows=resume)]
+    try:
+        await database.importQuotes(
+            channel, args.nick, transfer.readRows(path, format), resume,
+            progress.append)
+    except Exception:
+        args.send(f'''\
+Import of {path} stopped after {progress[-1].rows} rows. Resume from row \
+{progress[-1].rows}.''')
+        raise
+    args.send(f'''\
+Imported {progress[-1].quotes} quotes, {progress[-1].tags} tags and \
+{progress[-1].revisions} revisions for {channel} from {path}''')
+    return True
+
+
+async def manageMigrateQuotes(args: ManageBotArgs) -> bool:
+    target: Optional[int] = None
+    if len(args.message) >= 4:
+        try:
+            target = int(args.message[3])
+        except ValueError:
+            args.send('Migration version is not a number.')
+            return True
+    completed: List[int] = await migration.migrate(target)
+    if completed:
+        versions: str = ', '.join(str(v) for v in completed)
+        args.send(f'Applied quote migrations: {versions}')
+    else:
+        args.send('Quote migrations are up to date')
+    return True
+
+
+async def manageQuoteRetention(args: ManageBotArgs) -> bool:
+    policy: retention.RetentionPolicy = retention.RetentionPolicy()
+    try:
+        if len(args.message) >= 4:
+            policy = policy._replace(keepRevisions=int(args.message[3]))
+        if len(args.message) >= 5:
+            policy = policy._replace(keepDays=float(args.message[4]))
+    except ValueError:
+        args.send('Revisions or days to keep is not a number.')
+        return True
+    progress: retention.RetentionProgress = await retention.compact(policy)
+    args.send(f'''\
+Compacted {progress.compacted} and deleted {progress.deleted} revisions of \
+{progress.quotes} quotes, dropped {progress.partitions} partitions''')
+    return True
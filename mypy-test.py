@@ -3,5 +3,6 @@ from .items import whisper  # noqa: F401
 from .items import custom  # noqa: F401
 from .items import manage  # noqa: F401
 from .items import feature  # noqa: F401
+from .items import background  # noqa: F401
 
 from . import ircmessage  # noqa: F401
@@ -1,9 +1,73 @@
-from datetime import datetime
+import random
+import re
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
 import pyodbc
 
 from tests.unittest.mock_class import TypeMatch
-from ..library import database
+from ..library import cache, database, history, historywriter, membership
+from ..library import metrics
+from ..library import migration, quoteids, retention, transfer
+from ..library import searchcache, searchindex, searchquery, similar
+from ..library import statements
+
+
+async def asyncRows(rows):
+    for row in rows:
+        yield row
+
+
+class RecordingCursor:
+    def __init__(self, cursor, queries):
+        self.cursor = cursor
+        self.queries = queries
+
+    async def __aenter__(self):
+        await self.cursor.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        return await self.cursor.__aexit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    async def execute(self, query, *params):
+        self.queries.append((query, tuple(params[0]) if params else ()))
+        return await self.cursor.execute(query, *params)
+
+    async def executemany(self, query, params):
+        params = list(params)
+        if params:
+            self.queries.append((query, tuple(params[0])))
+        return await self.cursor.executemany(query, params)
+
+
+class RecordingDatabase:
+    def __init__(self, database, queries):
+        self.database = database
+        self.queries = queries
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    async def cursor(self):
+        return RecordingCursor(await self.database.cursor(), self.queries)
+
+
+class RecordingAcquire:
+    def __init__(self, acquire, queries):
+        self.acquire = acquire
+        self.queries = queries
+
+    async def __aenter__(self):
+        return RecordingDatabase(await self.acquire.__aenter__(),
+                                 self.queries)
+
+    async def __aexit__(self, *args):
+        return await self.acquire.__aexit__(*args)
 
 
 class TestDatabaseQuotes:
@@ -18,14 +82,71 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
 ''')
 
     async def tearDown(self):
+        await migration.stopBackfill()
+        await historywriter.stop()
         if self.database.isPostgres:
             await self.database.connection.rollback()
         await self.execute(['''DROP TABLE quotes_tags''',
                             '''DROP TABLE quotes''',
-                            '''DROP TABLE quotes_history''',
+                            '''DROP TABLE IF EXISTS quotes_revisions''',
+                            '''DROP TABLE IF EXISTS quotes_history''',
+                            '''DROP TABLE IF EXISTS quotes_migrations''',
                             ])
+        quoteids.clear()
+        membership.clear()
+        migration.clear()
+        cache.clear()
+        searchcache.clear()
+        searchindex.unload()
+        searchquery.clear()
+        similar.clear()
+        statements.clear()
+        metrics.disable()
+        metrics.clear()
         await super().tearDown()
 
+    async def historyRows(self):
+        quoteIds = [i for i, in await self.rows('''
+SELECT DISTINCT quoteId FROM quotes_revisions ORDER BY quoteId
+''')]
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            return [r for i in quoteIds
+                    for r in await history.revisions(cursor, i)]
+
+    async def writeHistory(self, records):
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            await history.write(
+                cursor, [history.HistoryRecord(*r) for r in records])
+            await db.commit()
+
+    async def createLegacyHistory(self, rows):
+        idType = 'SERIAL' if self.database.isPostgres else 'INTEGER'
+        await self.execute(f'''
+CREATE TABLE quotes_history (
+    id {idType} NOT NULL PRIMARY KEY,
+    quoteId INTEGER NOT NULL,
+    createdTime TIMESTAMP NOT NULL,
+    broadcaster VARCHAR NOT NULL,
+    quote VARCHAR NOT NULL,
+    editor VARCHAR NOT NULL
+)
+''')
+        for row in rows:
+            await self.execute('''
+INSERT INTO quotes_history (quoteId, createdTime, broadcaster, quote, editor)
+    VALUES (?, CURRENT_TIMESTAMP, ?, ?, ?)
+''', row)
+
+    async def useLegacyHistory(self, rows):
+        await self.execute(['''DROP TABLE quotes_revisions''',
+                            '''
+DELETE FROM quotes_migrations WHERE version IN (6, 7)
+''',
+                            ])
+        await self.createLegacyHistory(rows)
+
     async def test_get_random_quote(self):
         self.assertEqual(
             await database.getRandomQuote('megotsthis'),
@@ -35,6 +156,44 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertIsNone(
             await database.getRandomQuote('botgotsthis'))
 
+    async def test_get_random_quote_many(self):
+        await self.execute(['''
+INSERT INTO quotes (broadcaster, quote) VALUES ('megotsthis', 'Keepo')
+''',
+                            '''
+INSERT INTO quotes (broadcaster, quote) VALUES ('botgotsthis', 'FrankerZ')
+''',
+                            ])
+        for _ in range(10):
+            self.assertIn(
+                await database.getRandomQuote('megotsthis'),
+                ['Kappa', 'Keepo'])
+
+    async def test_get_random_quote_added(self):
+        self.assertIsNone(
+            await database.getRandomQuote('botgotsthis'))
+        await database.addQuote('botgotsthis', 'botgotsthis', 'FrankerZ')
+        self.assertEqual(
+            await database.getRandomQuote('botgotsthis'),
+            'FrankerZ')
+
+    async def test_get_random_quote_deleted(self):
+        self.assertEqual(
+            await database.getRandomQuote('megotsthis'),
+            'Kappa')
+        await database.deleteQuote('megotsthis', 1)
+        self.assertIsNone(
+            await database.getRandomQuote('megotsthis'))
+
+    async def test_get_random_quote_stale(self):
+        self.assertEqual(
+            await database.getRandomQuote('megotsthis'),
+            'Kappa')
+        await self.execute('''DELETE FROM quotes''')
+        cache.clear()
+        self.assertIsNone(
+            await database.getRandomQuote('megotsthis'))
+
     async def test_get_quote_id(self):
         self.assertEqual(
             await database.getQuoteById('megotsthis', 1),
@@ -46,6 +205,90 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertIsNone(
             await database.getQuoteById('megotsthis', 0))
 
+    async def test_get_quote_id_cached(self):
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        self.assertEqual(cache.stats()['quotes']['hits'], 1)
+
+    async def test_get_quote_id_metrics(self):
+        metrics.enable()
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        backend = 'postgres' if self.database.isPostgres else 'sqlite'
+        result = metrics.snapshot()['getQuoteById']
+        self.assertEqual(result[backend]['calls'], 1)
+        self.assertEqual(result[backend]['rows']['sum'], 1)
+        self.assertEqual(result['none']['calls'], 1)
+
+    async def test_get_quote_id_updated(self):
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        await database.updateQuote('megotsthis', 'botgotsthis', 1, 'FrankerZ')
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'FrankerZ')
+        self.assertEqual(await database.getAnyQuoteById(1),
+                         ('FrankerZ', 'megotsthis'))
+
+    async def test_get_quote_id_deleted(self):
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 1),
+            'Kappa')
+        self.assertEqual(await database.getAnyQuoteById(1),
+                         ('Kappa', 'megotsthis'))
+        await database.deleteQuote('megotsthis', 1)
+        self.assertIsNone(
+            await database.getQuoteById('megotsthis', 1))
+        self.assertEqual(await database.getAnyQuoteById(1),
+                         (None, None))
+
+    async def test_get_quote_id_missing(self):
+        self.assertEqual(
+            await database.getRandomQuote('megotsthis'),
+            'Kappa')
+        self.assertIsNone(
+            await database.getQuoteById('megotsthis', 2))
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 2),
+            'FrankerZ')
+
+    async def test_get_quote_id_does_not_load_ids(self):
+        self.assertIsNone(
+            await database.getQuoteById('megotsthis', 2))
+        self.assertIs(quoteids.loaded('megotsthis'), False)
+
+    async def test_get_quote_id_known_missing(self):
+        await self.execute(['''
+INSERT INTO quotes VALUES (2, 'botgotsthis', 'FrankerZ')
+''',
+                            '''
+INSERT INTO quotes VALUES (3, 'megotsthis', 'PogChamp')
+''',
+                            ])
+        await database.getRandomQuote('megotsthis')
+        await self.execute('''
+INSERT INTO quotes VALUES (4, 'megotsthis', 'Keepo')
+''')
+        metrics.enable()
+        self.assertIsNone(
+            await database.getQuoteById('megotsthis', 2))
+        self.assertEqual(
+            await database.getQuoteById('megotsthis', 4), 'Keepo')
+        backend = 'postgres' if self.database.isPostgres else 'sqlite'
+        result = metrics.snapshot()['getQuoteById']
+        self.assertEqual(result[backend]['calls'], 1)
+        self.assertEqual(result['none']['calls'], 1)
+
     async def test_get_quote_search(self):
         self.assertEqual(
             await database.getRandomQuoteBySearch('megotsthis', ['Kappa']),
@@ -60,6 +303,198 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertIsNone(
             await database.getRandomQuoteBySearch('botgotsthis', ['Kappa']))
 
+    async def test_get_quote_search_changed(self):
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['FrankerZ']))
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['FrankerZ']),
+            'FrankerZ')
+        await database.toggleQuoteTags('megotsthis', 1, ['pogchamp'])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['PogChamp']),
+            [1])
+        await database.deleteQuote('megotsthis', 2)
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['FrankerZ']))
+
+    async def test_get_quote_search_copied(self):
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('botgotsthis', ['Keepo']))
+        await database.copyQuote('megotsthis', 'botgotsthis', 'botgotsthis',
+                                 1)
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('botgotsthis', ['Keepo']),
+            'Kappa')
+        await database.addTagsToQuote(2, ['PogChamp'])
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('botgotsthis',
+                                                  ['pogchamp']),
+            'Kappa')
+
+    async def test_get_quote_search_index(self):
+        self.assertIs(await searchindex.load(),
+                      not self.database.isPostgres)
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['Kappa']),
+            'Kappa')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['KEEPO']),
+            'Kappa')
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['FrankerZ']),
+            [2])
+        await database.toggleQuoteTags('megotsthis', 2, ['PogChamp'])
+        self.assertEqual(
+            await database.getAnyRandomQuoteBySearch(['pogchamp']),
+            ('FrankerZ', 'megotsthis'))
+        await database.deleteQuote('megotsthis', 2)
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['FrankerZ']))
+
+    async def test_get_quote_search_tags(self):
+        await self.execute('''
+INSERT INTO quotes_tags VALUES (1, 'FrankerZ')
+''')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['keepo', 'FRANKERZ']),
+            'Kappa')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['Keepo', 'keepo']),
+            'Kappa')
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['Keepo', 'PogChamp']))
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('botgotsthis',
+                                                  ['Keepo', 'FrankerZ']))
+
+    async def test_get_quote_search_expression(self):
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        await database.addQuote('megotsthis', 'botgotsthis',
+                                'Kappa and FrankerZ')
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['Kappa', '-FrankerZ']),
+            [1])
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['Kappa', 'AND', 'FrankerZ']),
+            [3])
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['Kappa', 'OR', 'FrankerZ']),
+            [1, 2, 3])
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['"kappa', 'and', 'frankerz"']),
+            [3])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Frank*']),
+            [2, 3])
+
+    async def test_get_quote_search_expression_tags(self):
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['tag:keepo']),
+            [1])
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['Kappa', '-tag:Keepo']),
+            [2])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('botgotsthis', ['tag:Keepo']),
+            [])
+
+    async def test_get_quote_search_punctuation(self):
+        await database.addQuote('megotsthis', 'botgotsthis', '100% FrankerZ')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['100%']),
+            [2])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['_']),
+            [])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['"', '-']),
+            [])
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['K%a']))
+
+    async def test_get_quote_search_statements(self):
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Kappa']),
+            [1])
+        misses = statements.stats.misses
+        self.assertEqual(
+            await database.getQuoteIdsByWords('botgotsthis', ['Keepo']),
+            [])
+        self.assertEqual(statements.stats.misses, misses)
+        self.assertGreater(statements.stats.hits, 0)
+
+    async def test_get_quote_search_random(self):
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa Keepo')
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa Kappa')
+        random.seed(0)
+        self.assertEqual(
+            {await database.getRandomQuoteBySearch('megotsthis', ['Kappa'])
+             for i in range(100)},
+            {'Kappa', 'Kappa Keepo', 'Kappa Kappa'})
+        self.assertEqual(
+            {await database.getAnyRandomQuoteBySearch(['Keepo'])
+             for i in range(100)},
+            {('Kappa', 'megotsthis'), ('Kappa Keepo', 'megotsthis')})
+
+    async def test_get_best_quotes_search(self):
+        await database.addQuote('megotsthis', 'botgotsthis', 'Keepo')
+        await database.addQuote('megotsthis', 'botgotsthis',
+                                'Kappa Keepo Kappa')
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        await database.addQuote('botgotsthis', 'botgotsthis', 'Kappa Keepo')
+        self.assertEqual(
+            await database.getBestQuotesBySearch(
+                'megotsthis', ['Kappa', 'Keepo'], 1),
+            [(3, 'Kappa Keepo Kappa')])
+        self.assertCountEqual(
+            [i for i, q in await database.getBestQuotesBySearch(
+                'megotsthis', ['Kappa', 'Keepo'], 5)],
+            [1, 2, 3])
+        self.assertEqual(
+            await database.getBestQuotesBySearch(
+                'megotsthis', ['FrankerZ'], 5),
+            [(4, 'FrankerZ')])
+        self.assertEqual(
+            await database.getBestQuotesBySearch(
+                'megotsthis', ['PogChamp'], 5),
+            [])
+
+    @unittest.skipIf(not similar.available(), 'numpy is not installed')
+    async def test_get_similar_quotes(self):
+        await self.execute('''
+INSERT INTO quotes (quoteId, broadcaster, quote) VALUES
+    (2, 'megotsthis', 'Kappa Keepo'),
+    (3, 'megotsthis', 'FrankerZ'),
+    (4, 'botgotsthis', 'Kappa Keepo')
+''')
+        self.assertEqual(
+            await database.getSimilarQuotes('megotsthis', 1, 5),
+            [(2, 'Kappa Keepo')])
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa FrankerZ')
+        self.assertEqual(
+            await database.getSimilarQuotes('megotsthis', 3, 5),
+            [(5, 'Kappa FrankerZ')])
+        await database.updateQuote('megotsthis', 'botgotsthis', 5, 'Keepo')
+        self.assertEqual(
+            await database.getSimilarQuotes('megotsthis', 3, 5), [])
+        await database.deleteQuote('megotsthis', 2)
+        self.assertEqual(
+            await database.getSimilarQuotes('megotsthis', 1, 5), [])
+        self.assertIsNone(
+            await database.getSimilarQuotes('megotsthis', 4, 5))
+
     async def test_get_any_random_quote(self):
         self.assertEqual(await database.getAnyRandomQuote(),
                          ('Kappa', 'megotsthis'))
@@ -69,6 +504,31 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertEqual(await database.getAnyRandomQuote(),
                          (None, None))
 
+    async def test_get_any_random_quote_gaps(self):
+        await self.execute(['''
+INSERT INTO quotes (quoteId, broadcaster, quote)
+    VALUES (10, 'botgotsthis', 'FrankerZ')
+''',
+                            '''DELETE FROM quotes WHERE quoteId=1''',
+                            ])
+        self.assertEqual(await database.getAnyRandomQuote(),
+                         ('FrankerZ', 'botgotsthis'))
+
+    async def test_get_any_random_quote_offset(self):
+        await self.execute('''
+INSERT INTO quotes (quoteId, broadcaster, quote)
+    VALUES (10, 'botgotsthis', 'FrankerZ')
+''')
+        with patch.object(database.random, 'randint', return_value=5), \
+                patch.object(database.random, 'randrange',
+                             return_value=0) as mock_randrange:
+            self.assertEqual(await database.getAnyRandomQuote(),
+                             ('Kappa', 'megotsthis'))
+            mock_randrange.assert_called_once_with(2)
+            mock_randrange.return_value = 1
+            self.assertEqual(await database.getAnyRandomQuote(),
+                             ('FrankerZ', 'botgotsthis'))
+
     async def test_get_any_quote_id(self):
         self.assertEqual(await database.getAnyQuoteById(1),
                          ('Kappa', 'megotsthis'))
@@ -85,6 +545,17 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
             await database.getAnyRandomQuoteBySearch(['Keepo']),
             ('Kappa', 'megotsthis'))
 
+    async def test_get_any_quote_search_tags(self):
+        await self.execute('''
+INSERT INTO quotes_tags VALUES (1, 'FrankerZ')
+''')
+        self.assertEqual(
+            await database.getAnyRandomQuoteBySearch(['keepo', 'FRANKERZ']),
+            ('Kappa', 'megotsthis'))
+        self.assertEqual(
+            await database.getAnyRandomQuoteBySearch(['Keepo', 'PogChamp']),
+            (None, None))
+
     async def test_get_any_quote_search_empty(self):
         self.assertEqual(
             await database.getAnyRandomQuoteBySearch(['FrankerZ']),
@@ -101,10 +572,48 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'megotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'megotsthis',
                                 'FrankerZ', 'botgotsthis')])
 
+    async def test_write_quotes_deferred_history(self):
+        historywriter.start()
+        self.assertEqual(
+            await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ'),
+            2)
+        self.assertIs(
+            await database.updateQuote('megotsthis', 'mebotsthis', 2,
+                                       'PogChamp'),
+            True)
+        self.assertIs(
+            await database.updateQuote('megotsthis', 'mebotsthis', 3,
+                                       'PogChamp'),
+            False)
+        self.assertEqual(
+            await database.copyQuote('megotsthis', 'mebotsthis', 'botgotsthis',
+                                     1),
+            3)
+        self.assertCountEqual(
+            await self.rows('SELECT quoteId, broadcaster, quote FROM quotes'),
+            [(1, 'megotsthis', 'Kappa'),
+             (2, 'megotsthis', 'PogChamp'),
+             (3, 'mebotsthis', 'Kappa'),
+             ])
+        self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
+                              [(1, 'Keepo'),
+                               (3, 'Keepo'),
+                               ])
+        await historywriter.stop()
+        self.assertCountEqual(
+            await self.historyRows(),
+            [(2, 1, TypeMatch(datetime), 'megotsthis', 'FrankerZ',
+              'botgotsthis'),
+             (2, 2, TypeMatch(datetime), 'megotsthis', 'PogChamp',
+              'mebotsthis'),
+             (3, 1, TypeMatch(datetime), 'mebotsthis', 'Kappa',
+              'botgotsthis'),
+             ])
+
     async def test_update_quote(self):
         self.assertEqual(
             await database.updateQuote('megotsthis', 'botgotsthis', 1,
@@ -116,7 +625,7 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
+        self.assertCountEqual(await self.historyRows(),
                               [(1, 1, TypeMatch(datetime), 'megotsthis',
                                 'FrankerZ', 'botgotsthis')])
 
@@ -135,7 +644,7 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_delete_quote(self):
         self.assertEqual(
@@ -143,7 +652,7 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
             True)
         self.assertEqual(await self.rows('SELECT * FROM quotes'), [])
         self.assertEqual(await self.rows('SELECT * FROM quotes_tags'), [])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_delete_quote_false(self):
         self.assertEqual(
@@ -158,7 +667,7 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_copy_quote(self):
         self.assertEqual(
@@ -173,8 +682,8 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
                               [(1, 'Keepo'),
                                (2, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'mebotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'mebotsthis',
                                 'Kappa', 'botgotsthis')])
 
     async def test_copy_quote_no_tags(self):
@@ -188,8 +697,8 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
                                (2, 'mebotsthis', 'Kappa'),
                                ])
         self.assertEqual(await self.rows('SELECT * FROM quotes_tags'), [])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'mebotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'mebotsthis',
                                 'Kappa', 'botgotsthis')])
 
     async def test_copy_quote_none(self):
@@ -205,13 +714,26 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_get_tags(self):
         self.assertCountEqual(
             await database.getTagsOfQuote(1),
             ['Keepo'])
 
+    async def test_get_tags_updated(self):
+        self.assertCountEqual(
+            await database.getTagsOfQuote(1),
+            ['Keepo'])
+        await database.addTagsToQuote(1, ['FrankerZ'])
+        self.assertCountEqual(
+            await database.getTagsOfQuote(1),
+            ['Keepo', 'FrankerZ'])
+        await database.deleteTagsToQuote(1, ['Keepo'])
+        self.assertCountEqual(
+            await database.getTagsOfQuote(1),
+            ['FrankerZ'])
+
     async def test_get_tags_empty(self):
         await self.execute('''DELETE FROM quotes_tags''')
         self.assertCountEqual(
@@ -260,7 +782,504 @@ INSERT INTO quotes_tags VALUES (1, 'Keepo')
                               [(1, 'Keepo'),
                                ])
 
+    async def test_toggle_tags(self):
+        self.assertEqual(
+            await database.toggleQuoteTags(
+                'megotsthis', 1, ['Keepo', 'FrankerZ', '0abc', 'FrankerZ']),
+            (['FrankerZ'], ['Keepo'], ['0abc']))
+        self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
+                              [(1, 'FrankerZ'),
+                               ])
+
+    async def test_toggle_tags_cached(self):
+        self.assertCountEqual(
+            await database.getTagsOfQuote(1),
+            ['Keepo'])
+        await database.toggleQuoteTags('megotsthis', 1, ['Keepo', 'Kappa'])
+        self.assertCountEqual(
+            await database.getTagsOfQuote(1),
+            ['Kappa'])
+
+    async def test_toggle_tags_empty(self):
+        self.assertEqual(
+            await database.toggleQuoteTags('megotsthis', 1, []),
+            ([], [], []))
+        self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
+                              [(1, 'Keepo'),
+                               ])
+
+    async def test_toggle_tags_no_quote(self):
+        self.assertIsNone(
+            await database.toggleQuoteTags('megotsthis', 2, ['Keepo']))
+        self.assertIsNone(
+            await database.toggleQuoteTags('botgotsthis', 1, ['Keepo']))
+        self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
+                              [(1, 'Keepo'),
+                               ])
+
     async def test_ids(self):
         self.assertCountEqual(
             await database.getQuoteIdsByWords('megotsthis', ['Keepo']),
             [1])
+
+    async def iterateIds(self, channel, words, limit):
+        return [row async for row in database.iterateQuoteIdsByWords(
+            channel, words, limit)]
+
+    async def test_iterate_ids(self):
+        await self.execute('''
+INSERT INTO quotes (quoteId, broadcaster, quote) VALUES
+    (2, 'megotsthis', 'Kappa Keepo'),
+    (3, 'botgotsthis', 'Kappa'),
+    (4, 'megotsthis', 'Kappa Kappa')
+''')
+        await self.execute('''
+INSERT INTO quotes_tags VALUES (4, 'Keepo')
+''')
+        self.assertEqual(
+            await self.iterateIds('megotsthis', ['Kappa'], 2),
+            [(1, 3), (2, 3)])
+        self.assertEqual(
+            await self.iterateIds('megotsthis', ['Keepo'], 5),
+            [(1, 3), (2, 3), (4, 3)])
+        self.assertEqual(
+            await self.iterateIds('megotsthis', ['FrankerZ'], 5), [])
+
+    async def test_iterate_ids_cached(self):
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa Keepo')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Kappa']),
+            [1, 2])
+        await self.execute('''
+INSERT INTO quotes (quoteId, broadcaster, quote)
+    VALUES (3, 'megotsthis', 'Kappa')
+''')
+        self.assertEqual(
+            await self.iterateIds('megotsthis', ['Kappa'], 1), [(1, 2)])
+        self.assertIs(await searchindex.load(),
+                      not self.database.isPostgres)
+        self.assertEqual(
+            await self.iterateIds('megotsthis', ['Keepo'], 5),
+            [(1, 2), (2, 2)])
+
+    async def test_ids_tags(self):
+        await self.execute('''
+INSERT INTO quotes_tags VALUES (1, 'FrankerZ')
+''')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis',
+                                              ['keepo', 'FRANKERZ']),
+            [1])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis',
+                                              ['Keepo', 'PogChamp']),
+            [])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('botgotsthis', ['Keepo']),
+            [])
+
+    async def recordQueries(self, *calls):
+        queries = []
+        acquire = metrics.acquire
+
+        def recordingAcquire():
+            return RecordingAcquire(acquire(), queries)
+        with patch.object(metrics, 'acquire', recordingAcquire):
+            for call in calls:
+                quoteids.clear()
+                membership.clear()
+                cache.clear()
+                searchcache.clear()
+                await call()
+        return queries
+
+    async def test_queries_use_index(self):
+        calls = [
+            lambda: database.addQuote('megotsthis', 'botgotsthis',
+                                      'Kappa Keepo PogChamp'),
+            lambda: database.updateQuote('megotsthis', 'botgotsthis', 2,
+                                         'Kappa PogChamp'),
+            lambda: database.getRandomQuote('megotsthis'),
+            lambda: database.getQuoteById('megotsthis', 2),
+            lambda: database.getQuoteById('megotsthis', 3),
+            lambda: database.getRandomQuoteBySearch('megotsthis', ['Kappa']),
+            lambda: database.getRandomQuoteBySearch(
+                'megotsthis', ['Keepo', '-PogChamp']),
+            lambda: database.getRandomQuoteBySearch(
+                'megotsthis', ['"Kappa PogChamp"']),
+            lambda: database.getBestQuotesBySearch('megotsthis', ['Kappa'],
+                                                   5),
+            lambda: database.getAnyRandomQuote(),
+            lambda: database.getAnyQuoteById(2),
+            lambda: database.getAnyRandomQuoteBySearch(['PogChamp']),
+            lambda: database.getQuoteIdsByWords('megotsthis', ['Kappa']),
+            lambda: self.iterateIds('megotsthis', ['Kappa'], 1),
+            lambda: database.getTagsOfQuote(1),
+            lambda: database.addTagsToQuote(2, ['FrankerZ']),
+            lambda: database.deleteTagsToQuote(2, ['FrankerZ']),
+            lambda: database.toggleQuoteTags('megotsthis', 2,
+                                             ['FrankerZ', 'Keepo']),
+            lambda: database.getQuoteHistory('megotsthis', 2, 5),
+            lambda: database.revertQuote('megotsthis', 'botgotsthis', 2, 1),
+            lambda: database.copyQuote('megotsthis', 'botgotsthis',
+                                       'botgotsthis', 2),
+            lambda: self.exportRows('megotsthis'),
+            lambda: database.importQuotes(
+                'mebotsthis', 'botgotsthis',
+                asyncRows([transfer.TransferRow('quote', 1, 'Kappa'),
+                           transfer.TransferRow('tag', 1, 'Keepo')])),
+            lambda: database.deleteQuote('megotsthis', 2),
+        ]
+        if similar.available():
+            calls.append(
+                lambda: database.getSimilarQuotes('megotsthis', 1, 3))
+        queries = {}
+        for query, params in await self.recordQueries(*calls):
+            if not re.search(r'sqlite_master|information_schema|pg_',
+                             query):
+                queries.setdefault(query, params)
+        self.assertTrue(
+            any('RETURNING tag' in query for query in queries))
+        for query, params in queries.items():
+            with self.subTest(query=query):
+                await self.assertUsesIndex(query, params)
+
+    async def test_migrate(self):
+        await self.execute(['''DROP TABLE quotes_migrations''',
+                            '''DROP TABLE quotes_revisions''',
+                            ])
+        await self.createLegacyHistory(
+            [(1, 'megotsthis', 'Kappa', 'botgotsthis'),
+             (1, 'megotsthis', 'Kappa Keepo', 'mebotsthis'),
+             (2, 'megotsthis', 'FrankerZ', 'botgotsthis'),
+             ])
+        self.assertEqual(await migration.migrate(2), [1, 2])
+        self.assertEqual(await migration.migrate(), [3, 4, 5, 6, 7, 8])
+        self.assertEqual(await migration.migrate(), [])
+        self.assertEqual(
+            await self.rows('''
+SELECT version, name FROM quotes_migrations ORDER BY version
+'''),
+            [(m.version, m.name) for m in migration.migrations])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Kappa']), [1])
+        self.assertEqual(
+            await self.historyRows(),
+            [(1, 1, TypeMatch(datetime), 'megotsthis', 'Kappa',
+              'botgotsthis'),
+             (1, 2, TypeMatch(datetime), 'megotsthis', 'Kappa Keepo',
+              'mebotsthis'),
+             (2, 1, TypeMatch(datetime), 'megotsthis', 'FrankerZ',
+              'botgotsthis'),
+             ])
+
+    async def test_convert_history_batches(self):
+        await self.createLegacyHistory(
+            [(1, 'megotsthis', 'Kappa', 'botgotsthis'),
+             (2, 'megotsthis', 'FrankerZ', 'botgotsthis'),
+             (3, 'megotsthis', 'PogChamp', 'botgotsthis'),
+             ])
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            self.assertEqual(
+                await migration.convertHistory(db, cursor, 2), 3)
+            self.assertEqual(
+                await migration.convertHistory(db, cursor, 2), 0)
+        self.assertEqual([r.quote for r in await self.historyRows()],
+                         ['Kappa', 'FrankerZ', 'PogChamp'])
+
+    async def test_legacy_history(self):
+        await self.useLegacyHistory(
+            [(1, 'megotsthis', 'Kappa', 'botgotsthis')])
+        self.assertIs(
+            await database.updateQuote('megotsthis', 'mebotsthis', 1,
+                                       'Kappa Keepo'),
+            True)
+        self.assertEqual(
+            await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ'),
+            2)
+        self.assertEqual(
+            await self.rows('''
+SELECT quoteId, quote, editor FROM quotes_history ORDER BY id
+'''),
+            [(1, 'Kappa', 'botgotsthis'),
+             (1, 'Kappa Keepo', 'mebotsthis'),
+             (2, 'FrankerZ', 'botgotsthis'),
+             ])
+        revisions = await database.getQuoteHistory('megotsthis', 1, 1)
+        self.assertEqual([(r.revision, r.quote) for r in revisions],
+                         [(2, 'Kappa Keepo')])
+        self.assertIs(
+            await database.revertQuote('megotsthis', 'botgotsthis', 1, 1),
+            True)
+        self.assertEqual(await database.getQuoteById('megotsthis', 1),
+                         'Kappa')
+        self.assertEqual(await migration.migrate(), [6, 7])
+        self.assertIs(
+            await database.updateQuote('megotsthis', 'mebotsthis', 1,
+                                       'PogChamp'),
+            True)
+        self.assertEqual(
+            [(r.quoteId, r.revision, r.quote)
+             for r in await self.historyRows()],
+            [(1, 1, 'Kappa'), (1, 2, 'Kappa Keepo'), (1, 3, 'Kappa'),
+             (1, 4, 'PogChamp'), (2, 1, 'FrankerZ')])
+
+    async def test_applied_caches_missing(self):
+        await self.execute(['''
+DELETE FROM quotes_migrations WHERE version=2
+''',
+                            ])
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            self.assertIs(await migration.applied(db, cursor, 2), False)
+            self.assertIs(await migration.applied(db, cursor, 1), True)
+            await cursor.execute('''
+INSERT INTO quotes_migrations (version, name, appliedTime)
+    VALUES (2, 'lowercase tag index', CURRENT_TIMESTAMP)
+''')
+            await db.commit()
+            self.assertIs(await migration.applied(db, cursor, 2), False)
+            migration.expire()
+            self.assertIs(await migration.applied(db, cursor, 2), True)
+
+    async def test_history_revisions(self):
+        quotes = ['Kappa Keepo PogChamp FrankerZ',
+                  'Kappa Keepo PogChamp FrankerZ BibleThump',
+                  'Kappa PogChamp FrankerZ BibleThump',
+                  'Kappa PogChamp FrankerZ BibleThump Kreygasm',
+                  'Kappa']
+        for quote in quotes:
+            await database.updateQuote('megotsthis', 'botgotsthis', 1, quote)
+        rows = await self.rows('''
+SELECT revision, keyframe FROM quotes_revisions ORDER BY revision
+''')
+        self.assertEqual([bool(k) for _, k in rows],
+                         [True, False, False, False, True])
+        self.assertEqual([r.quote for r in await self.historyRows()], quotes)
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            revision = await history.revision(cursor, 1, 4)
+            self.assertEqual(revision.quote, quotes[3])
+            self.assertEqual(revision.editor, 'botgotsthis')
+            self.assertIsNone(await history.revision(cursor, 1, 6))
+            self.assertIsNone(await history.revision(cursor, 2, 1))
+
+    async def test_history_keyframe_interval(self):
+        for i in range(history.keyframeInterval + 1):
+            await database.updateQuote('megotsthis', 'botgotsthis', 1,
+                                       'Kappa Keepo PogChamp ' * 4 + str(i))
+        rows = await self.rows('''
+SELECT revision FROM quotes_revisions WHERE keyframe ORDER BY revision
+''')
+        self.assertEqual(rows, [(1,), (history.keyframeInterval + 1,)])
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            revision = await history.revision(cursor, 1,
+                                              history.keyframeInterval)
+        self.assertEqual(revision.quote,
+                         'Kappa Keepo PogChamp ' * 4
+                         + str(history.keyframeInterval - 1))
+
+    async def test_quote_history(self):
+        quotes = ['Kappa Keepo PogChamp FrankerZ',
+                  'Kappa Keepo PogChamp FrankerZ BibleThump',
+                  'Kappa PogChamp FrankerZ BibleThump',
+                  'Kappa PogChamp FrankerZ BibleThump Kreygasm',
+                  'Kappa']
+        for quote in quotes:
+            await database.updateQuote('megotsthis', 'botgotsthis', 1, quote)
+        revisions = await database.getQuoteHistory('megotsthis', 1, 2)
+        self.assertEqual([(r.revision, r.quote) for r in revisions],
+                         [(5, quotes[4]), (4, quotes[3])])
+        revisions = await database.getQuoteHistory('megotsthis', 1, 10)
+        self.assertEqual([r.quote for r in revisions], quotes[::-1])
+        self.assertEqual(
+            await database.getQuoteHistory('megotsthis', 1, 0), [])
+        self.assertEqual(
+            await database.getQuoteHistory('mebotsthis', 1, 10), [])
+        self.assertEqual(
+            await database.getQuoteHistory('megotsthis', 2, 10), [])
+
+    async def test_revert_quote(self):
+        quotes = ['Kappa Keepo PogChamp FrankerZ',
+                  'Kappa Keepo PogChamp FrankerZ BibleThump',
+                  'Kappa PogChamp FrankerZ BibleThump']
+        for quote in quotes:
+            await database.updateQuote('megotsthis', 'botgotsthis', 1, quote)
+        self.assertIs(
+            await database.revertQuote('megotsthis', 'mebotsthis', 1, 1),
+            True)
+        self.assertEqual(await database.getQuoteById('megotsthis', 1),
+                         quotes[0])
+        revisions = await database.getQuoteHistory('megotsthis', 1, 1)
+        self.assertEqual(
+            revisions,
+            [(1, 4, TypeMatch(datetime), 'megotsthis', quotes[0],
+              'mebotsthis')])
+        self.assertIs(
+            await database.revertQuote('megotsthis', 'mebotsthis', 1, 9),
+            False)
+        self.assertIs(
+            await database.revertQuote('mebotsthis', 'mebotsthis', 1, 2),
+            False)
+        self.assertEqual(await database.getQuoteById('megotsthis', 1),
+                         quotes[0])
+
+    async def exportRows(self, channel):
+        return [r async for r in database.exportQuotes(channel)]
+
+    async def test_export_quotes(self):
+        await database.updateQuote('megotsthis', 'botgotsthis', 1, 'Keepo')
+        await database.addQuote('mebotsthis', 'botgotsthis', 'FrankerZ')
+        await database.addQuote('megotsthis', 'botgotsthis', 'PogChamp')
+        self.assertEqual(
+            await self.exportRows('megotsthis'),
+            [('quote', 1, 'Keepo', None, None, None),
+             ('tag', 1, 'Keepo', None, None, None),
+             ('revision', 1, 'Keepo', 1, TypeMatch(datetime), 'botgotsthis'),
+             ('quote', 3, 'PogChamp', None, None, None),
+             ('revision', 3, 'PogChamp', 1, TypeMatch(datetime),
+              'botgotsthis'),
+             ])
+        self.assertEqual(await self.exportRows('botgotsthis'), [])
+
+    async def test_import_quotes(self):
+        await database.updateQuote('megotsthis', 'botgotsthis', 1, 'Keepo')
+        await database.updateQuote('megotsthis', 'mebotsthis', 1, 'Kappa')
+        rows = await self.exportRows('megotsthis') + [
+            transfer.TransferRow('quote', 7, 'FrankerZ'),
+            transfer.TransferRow('tag', 7, 'Kappa'),
+            transfer.TransferRow('tag', 7, 'Kappa'),
+            ]
+        progress = []
+        result = await database.importQuotes('botgotsthis', 'megotsthis',
+                                             asyncRows(rows),
+                                             report=progress.append)
+        self.assertEqual(result, (7, 2, 3, 2))
+        self.assertEqual(progress, [result])
+        self.assertEqual(
+            await database.getQuoteById('botgotsthis', 2), 'Kappa')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('botgotsthis', ['FrankerZ']),
+            [3])
+        self.assertEqual(await database.getTagsOfQuote(3), {'Kappa'})
+        self.assertEqual(
+            await self.exportRows('botgotsthis'),
+            [('quote', 2, 'Kappa', None, None, None),
+             ('tag', 2, 'Keepo', None, None, None),
+             ('revision', 2, 'Keepo', 1, TypeMatch(datetime), 'botgotsthis'),
+             ('revision', 2, 'Kappa', 2, TypeMatch(datetime), 'mebotsthis'),
+             ('quote', 3, 'FrankerZ', None, None, None),
+             ('tag', 3, 'Kappa', None, None, None),
+             ('revision', 3, 'FrankerZ', 1, TypeMatch(datetime),
+              'megotsthis'),
+             ])
+
+    async def test_export_quotes_legacy_history(self):
+        transfer.pageSize = 1
+        self.addCleanup(setattr, transfer, 'pageSize', 100)
+        await self.useLegacyHistory(
+            [(1, 'megotsthis', 'Kappa', 'botgotsthis')])
+        self.assertEqual(
+            await database.addQuote('megotsthis', 'mebotsthis', 'FrankerZ'),
+            2)
+        self.assertEqual(
+            await self.exportRows('megotsthis'),
+            [transfer.TransferRow('quote', 1, 'Kappa'),
+             transfer.TransferRow('tag', 1, 'Keepo'),
+             transfer.TransferRow('revision', 1, 'Kappa', 1,
+                                  TypeMatch(datetime), 'botgotsthis'),
+             transfer.TransferRow('quote', 2, 'FrankerZ'),
+             transfer.TransferRow('revision', 2, 'FrankerZ', 1,
+                                  TypeMatch(datetime), 'mebotsthis'),
+             ])
+
+    async def test_import_quotes_batches(self):
+        transfer.batchSize = 3
+        self.addCleanup(setattr, transfer, 'batchSize', 500)
+        rows = [
+            transfer.TransferRow('quote', 1, 'Keepo'),
+            transfer.TransferRow('tag', 1, 'Kappa'),
+            transfer.TransferRow('quote', 2, 'FrankerZ'),
+            transfer.TransferRow('quote', 3, 'PogChamp'),
+            transfer.TransferRow('tag', 3, 'Kappa'),
+            transfer.TransferRow('tag', 2, 'Kappa'),
+            ]
+        progress = []
+        with self.assertRaises(ValueError):
+            await database.importQuotes('botgotsthis', 'megotsthis',
+                                        asyncRows(rows),
+                                        report=progress.append)
+        self.assertEqual(progress, [(3, 2, 1, 0)])
+        self.assertEqual(
+            [r.text for r in await self.exportRows('botgotsthis')
+             if r.kind != 'revision'],
+            ['Keepo', 'Kappa', 'FrankerZ'])
+        self.assertEqual(
+            await database.importQuotes('botgotsthis', 'megotsthis',
+                                        asyncRows(rows[:5]),
+                                        resume=progress[-1].rows),
+            (5, 1, 1, 0))
+        self.assertEqual(
+            [r.text for r in await self.exportRows('botgotsthis')
+             if r.kind != 'revision'],
+            ['Keepo', 'Kappa', 'FrankerZ', 'PogChamp', 'Kappa'])
+
+    async def test_import_quotes_chunks(self):
+        rows = [transfer.TransferRow('quote', i, f'Kappa {i}')
+                for i in range(1, 6)]
+        rows.append(transfer.TransferRow('tag', 4, 'Keepo'))
+        with patch.object(database, 'importChunk', 2):
+            queries = await self.recordQueries(
+                lambda: database.importQuotes('botgotsthis', 'megotsthis',
+                                              asyncRows(rows)))
+        self.assertEqual(
+            [len(p) for q, p in queries
+             if q.lstrip().startswith('INSERT INTO quotes (')],
+            [4, 4, 2])
+        self.assertEqual(
+            await self.rows('''
+SELECT quoteId, quote FROM quotes WHERE broadcaster='botgotsthis'
+    ORDER BY quoteId
+'''),
+            [(i + 1, f'Kappa {i}') for i in range(1, 6)])
+        self.assertEqual(
+            await self.rows('''
+SELECT quoteId, tag FROM quotes_tags WHERE tag='Keepo' AND quoteId>1
+'''),
+            [(5, 'Keepo')])
+
+    async def test_retention_compact(self):
+        now = datetime(2026, 10, 18)
+        old = now - timedelta(days=200)
+        quote = 'Kappa Keepo PogChamp FrankerZ BibleThump {}'
+        await self.writeHistory(
+            [(1, old, 'megotsthis', quote.format(i), 'botgotsthis')
+             for i in range(5)]
+            + [(1, now - timedelta(days=1), 'megotsthis', quote.format(5),
+                'botgotsthis')]
+            + [(2, old, 'megotsthis', quote.format(i), 'botgotsthis')
+               for i in range(3)]
+            + [(3, old, 'megotsthis', 'FrankerZ', 'botgotsthis')])
+        reports = []
+        progress = await retention.compact(
+            retention.RetentionPolicy(keepRevisions=2, keepDays=30),
+            reports.append, now)
+        self.assertEqual(progress, retention.RetentionProgress(
+            quotes=3, compacted=2, deleted=5, partitions=0))
+        self.assertEqual(reports[-1], progress)
+        self.assertEqual(
+            [(r.quoteId, r.revision, r.quote)
+             for r in await self.historyRows()],
+            [(1, 5, quote.format(4)),
+             (1, 6, quote.format(5)),
+             (2, 2, quote.format(1)),
+             (2, 3, quote.format(2)),
+             (3, 1, 'FrankerZ'),
+             ])
+        self.assertEqual(
+            await retention.compact(
+                retention.RetentionPolicy(keepRevisions=2, keepDays=30),
+                now=now),
+            retention.RetentionProgress(quotes=3))
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+import asynctest
+from asynctest.mock import patch
+
+import bot
+
+from .. import background
+from ..library import historywriter, retention, searchindex
+
+
+class TestBackgroundSearchIndex(asynctest.TestCase):
+    def setUp(self):
+        self.now = datetime(2000, 1, 1)
+
+        patcher = patch(searchindex.__name__ + '.load')
+        self.addCleanup(patcher.stop)
+        self.mock_load = patcher.start()
+
+        patcher = patch(searchindex.__name__ + '.enabled', True)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    async def test(self):
+        await background.loadSearchIndex(self.now)
+        self.mock_load.assert_called_once_with()
+
+    async def test_loaded(self):
+        with patch(searchindex.__name__ + '.stale', return_value=False):
+            await background.loadSearchIndex(self.now)
+        self.assertFalse(self.mock_load.called)
+
+    async def test_stale(self):
+        with patch(searchindex.__name__ + '.stale', return_value=True):
+            await background.loadSearchIndex(self.now)
+        self.mock_load.assert_called_once_with()
+
+    async def test_disabled(self):
+        with patch(searchindex.__name__ + '.enabled', False):
+            await background.loadSearchIndex(self.now)
+        self.assertFalse(self.mock_load.called)
+
+
+class TestBackgroundHistoryWriter(asynctest.TestCase):
+    def setUp(self):
+        self.now = datetime(2000, 1, 1)
+
+        patcher = patch(historywriter.__name__ + '.start')
+        self.addCleanup(patcher.stop)
+        self.mock_start = patcher.start()
+
+        patcher = patch('bot.globals', running=True)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    @patch(historywriter.__name__ + '.writeBehind', True)
+    async def test(self):
+        await background.startHistoryWriter(self.now)
+        self.mock_start.assert_called_once_with()
+
+    async def test_disabled(self):
+        await background.startHistoryWriter(self.now)
+        self.assertFalse(self.mock_start.called)
+
+    @patch(historywriter.__name__ + '.writeBehind', True)
+    async def test_not_running(self):
+        bot.globals.running = False
+        await background.startHistoryWriter(self.now)
+        self.assertFalse(self.mock_start.called)
+
+
+class TestBackgroundHistoryPartitions(asynctest.TestCase):
+    @patch(retention.__name__ + '.ensurePartitions')
+    async def test(self, mock_ensure):
+        await background.ensureHistoryPartitions(datetime(2000, 1, 1))
+        mock_ensure.assert_called_once_with()
@@ -0,0 +1,88 @@
+import unittest
+
+from asynctest.mock import patch
+
+from ..library import cache
+
+
+class TestCacheLru(unittest.TestCase):
+    def setUp(self):
+        self.cache = cache.LruCache(2)
+
+    def test_get(self):
+        self.cache.put(1, 'Kappa')
+        self.assertEqual(self.cache.get(1), 'Kappa')
+        self.assertIsNone(self.cache.get(2))
+        self.assertEqual(self.cache.stats.hits, 1)
+        self.assertEqual(self.cache.stats.misses, 1)
+
+    def test_evict(self):
+        self.cache.put(1, 'Kappa')
+        self.cache.put(2, 'Keepo')
+        self.cache.get(1)
+        self.cache.put(3, 'FrankerZ')
+        self.assertIn(1, self.cache)
+        self.assertNotIn(2, self.cache)
+        self.assertIn(3, self.cache)
+        self.assertEqual(self.cache.stats.evictions, 1)
+
+    def test_pop(self):
+        self.cache.put(1, 'Kappa')
+        self.cache.pop(1)
+        self.cache.pop(2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_expired(self):
+        self.cache.put(1, 'Kappa')
+        with patch(cache.__name__ + '.ttlSeconds', 0):
+            self.assertIsNone(self.cache.get(1))
+        self.assertNotIn(1, self.cache)
+
+
+class TestCacheQuotes(unittest.TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_quote(self):
+        self.assertIsNone(cache.getQuote('megotsthis', 1))
+        cache.putQuote('megotsthis', 1, 'Kappa')
+        self.assertEqual(cache.getQuote('megotsthis', 1), 'Kappa')
+        self.assertIsNone(cache.getQuote('botgotsthis', 1))
+        stats = cache.stats()['quotes']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['channels'], 1)
+        self.assertEqual(stats['size'], 1)
+
+    def test_max_channels(self):
+        with patch(cache.__name__ + '.maxChannels', 1):
+            cache.putQuote('megotsthis', 1, 'Kappa')
+            cache.putQuote('botgotsthis', 2, 'Keepo')
+        self.assertIsNone(cache.getQuote('megotsthis', 1))
+        self.assertEqual(cache.getQuote('botgotsthis', 2), 'Keepo')
+
+    def test_update(self):
+        cache.putQuote('megotsthis', 1, 'Kappa')
+        cache.putAnyQuote(1, 'Kappa', 'megotsthis')
+        cache.updateQuote('megotsthis', 1, 'Keepo')
+        cache.updateQuote('megotsthis', 2, 'FrankerZ')
+        self.assertEqual(cache.getQuote('megotsthis', 1), 'Keepo')
+        self.assertEqual(cache.getAnyQuote(1), ('Keepo', 'megotsthis'))
+        self.assertIsNone(cache.getQuote('megotsthis', 2))
+        self.assertEqual(cache.getAnyQuote(2), (None, None))
+
+    def test_discard(self):
+        cache.putQuote('megotsthis', 1, 'Kappa')
+        cache.putAnyQuote(1, 'Kappa', 'megotsthis')
+        cache.putTags(1, ['Keepo'])
+        cache.discardQuote('megotsthis', 1)
+        self.assertIsNone(cache.getQuote('megotsthis', 1))
+        self.assertEqual(cache.getAnyQuote(1), (None, None))
+        self.assertIsNone(cache.getTags(1))
+
+    def test_tags(self):
+        cache.putTags(1, ['Keepo'])
+        self.assertEqual(cache.getTags(1), frozenset(['Keepo']))
+        cache.discardTags(1)
+        self.assertIsNone(cache.getTags(1))
@@ -39,6 +39,16 @@ class TestChannelQuoteQuote(TestChannel):
         self.mock_quoteSearch = patcher.start()
         self.mock_quoteSearch.return_value = False
 
+        patcher = patch(library.__name__ + '.processSimilarQuote')
+        self.addCleanup(patcher.stop)
+        self.mock_similar = patcher.start()
+        self.mock_similar.return_value = False
+
+        patcher = patch(library.__name__ + '.processBestQuoteSearch')
+        self.addCleanup(patcher.stop)
+        self.mock_best = patcher.start()
+        self.mock_best.return_value = False
+
     async def test_no_feature(self):
         self.features.clear()
         self.assertIs(await channel.commandQuote(self.args), False)
@@ -93,6 +103,40 @@ class TestChannelQuoteQuote(TestChannel):
         self.assertTrue(self.mock_quoteId.called)
         self.assertFalse(self.mock_quoteSearch.called)
 
+    async def test_similar_quote(self):
+        self.args = self.args._replace(message=Message('!quote like 1'))
+        self.mock_similar.return_value = True
+        self.assertIs(await channel.commandQuote(self.args), True)
+        self.assertTrue(self.mock_inCooldown.called)
+        self.assertTrue(self.mock_markCooldown.called)
+        self.assertFalse(self.mock_randomQuote.called)
+        self.assertFalse(self.mock_quoteId.called)
+        self.assertFalse(self.mock_quoteSearch.called)
+        self.mock_similar.assert_called_once_with(self.args, 1)
+
+    async def test_similar_quote_search(self):
+        self.args = self.args._replace(message=Message('!quote like Kappa'))
+        self.assertIs(await channel.commandQuote(self.args), True)
+        self.assertFalse(self.mock_similar.called)
+        self.mock_quoteSearch.assert_called_once_with(self.args,
+                                                      ['like', 'Kappa'])
+
+    async def test_best_quote(self):
+        self.args = self.args._replace(
+            message=Message('!quote best Kappa Keepo'))
+        self.mock_best.return_value = True
+        self.assertIs(await channel.commandQuote(self.args), True)
+        self.assertTrue(self.mock_inCooldown.called)
+        self.assertTrue(self.mock_markCooldown.called)
+        self.assertFalse(self.mock_quoteSearch.called)
+        self.mock_best.assert_called_once_with(self.args, ['Kappa', 'Keepo'])
+
+    async def test_best_quote_search(self):
+        self.args = self.args._replace(message=Message('!quote best'))
+        self.assertIs(await channel.commandQuote(self.args), True)
+        self.assertFalse(self.mock_best.called)
+        self.mock_quoteSearch.assert_called_once_with(self.args, ['best'])
+
     async def test_search_quote_no_quote(self):
         self.args = self.args._replace(message=Message('!quote a'))
         self.assertIs(await channel.commandQuote(self.args), True)
@@ -226,6 +270,16 @@ class TestChannelQuoteQuotes(TestChannel):
         self.mock_ids = patcher.start()
         self.mock_ids.return_value = True
 
+        patcher = patch(library.__name__ + '.handleQuoteHistory')
+        self.addCleanup(patcher.stop)
+        self.mock_history = patcher.start()
+        self.mock_history.return_value = True
+
+        patcher = patch(library.__name__ + '.handleRevertQuote')
+        self.addCleanup(patcher.stop)
+        self.mock_revert = patcher.start()
+        self.mock_revert.return_value = True
+
     async def test_no_feature(self):
         self.features.clear()
         self.assertIs(await channel.commandQuotes(self.args), False)
@@ -312,3 +366,19 @@ class TestChannelQuoteQuotes(TestChannel):
         self.assertFalse(self.mock_copy.called)
         self.assertFalse(self.mock_tag.called)
         self.assertTrue(self.mock_ids.called)
+
+    async def test_history(self):
+        self.args = self.args._replace(message=Message('!quotes history'))
+        self.assertIs(await channel.commandQuotes(self.args), True)
+        self.assertFalse(self.mock_list.called)
+        self.assertFalse(self.mock_edit.called)
+        self.assertTrue(self.mock_history.called)
+        self.assertFalse(self.mock_revert.called)
+
+    async def test_revert(self):
+        self.args = self.args._replace(message=Message('!quotes revert'))
+        self.assertIs(await channel.commandQuotes(self.args), True)
+        self.assertFalse(self.mock_list.called)
+        self.assertFalse(self.mock_edit.called)
+        self.assertFalse(self.mock_history.called)
+        self.assertTrue(self.mock_revert.called)
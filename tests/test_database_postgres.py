@@ -1,10 +1,13 @@
+import asyncio
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
+from unittest.mock import patch
 
 from tests.database.postgres.test_database import TestPostgres
 from tests.unittest.mock_class import TypeMatch
 from .base_database import TestDatabaseQuotes
-from ..library import database
+from ..library import database, history, historywriter, migration
+from ..library import retention
 
 
 class TestLibraryQuotePostgres(TestDatabaseQuotes, TestPostgres):
@@ -31,6 +34,14 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.doc_kappa = (await self.row(docQuery, ('Kappa',)))[0]
         self.doc_frankerz = (await self.row(docQuery, ('FrankerZ',)))[0]
 
+    async def assertUsesIndex(self, query, params):
+        await self.execute('SET enable_seqscan = off')
+        try:
+            plan = [p for p, in await self.rows('EXPLAIN ' + query, params)]
+        finally:
+            await self.execute('RESET enable_seqscan')
+        self.assertFalse([p for p in plan if 'Seq Scan' in p], plan)
+
     async def test_add_quote(self):
         self.assertEqual(
             await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ'),
@@ -43,8 +54,8 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'megotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'megotsthis',
                                 'FrankerZ', 'botgotsthis')])
 
     async def test_update_quote(self):
@@ -59,7 +70,7 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
+        self.assertCountEqual(await self.historyRows(),
                               [(1, 1, TypeMatch(datetime), 'megotsthis',
                                 'FrankerZ', 'botgotsthis')])
 
@@ -78,7 +89,7 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_delete_quote_false(self):
         self.assertEqual(
@@ -93,7 +104,7 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
 
     async def test_copy_quote(self):
         self.assertEqual(
@@ -108,8 +119,8 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
                               [(1, 'Keepo'),
                                (2, 'Keepo'),
                                ])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'mebotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'mebotsthis',
                                 'Kappa', 'botgotsthis')])
 
     async def test_copy_quote_no_tags(self):
@@ -123,8 +134,8 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
                                (2, 'mebotsthis', 'Kappa', self.doc_kappa),
                                ])
         self.assertEqual(await self.rows('SELECT * FROM quotes_tags'), [])
-        self.assertCountEqual(await self.rows('SELECT * FROM quotes_history'),
-                              [(1, 2, TypeMatch(datetime), 'mebotsthis',
+        self.assertCountEqual(await self.historyRows(),
+                              [(2, 1, TypeMatch(datetime), 'mebotsthis',
                                 'Kappa', 'botgotsthis')])
 
     async def test_copy_quote_none(self):
@@ -140,4 +151,162 @@ ALTER SEQUENCE quotes_quoteid_seq RESTART WITH 2
         self.assertCountEqual(await self.rows('SELECT * FROM quotes_tags'),
                               [(1, 'Keepo'),
                                ])
-        self.assertEqual(await self.rows('SELECT * FROM quotes_history'), [])
+        self.assertEqual(await self.historyRows(), [])
+
+    async def test_get_quote_search_punctuation(self):
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['(Kappa!', "it's", '&', '|']),
+            [1])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Kap*']),
+            [1])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['!:*']),
+            [])
+
+    async def test_document_trigger(self):
+        await self.execute('''
+INSERT INTO quotes (broadcaster, quote) VALUES ('megotsthis', 'FrankerZ')
+''')
+        await self.execute('''
+UPDATE quotes SET quote='FrankerZ' WHERE quoteId=1
+''')
+        self.assertEqual(
+            await self.rows('SELECT document FROM quotes ORDER BY quoteId'),
+            [(self.doc_frankerz,), (self.doc_frankerz,)])
+
+    async def test_backfill_documents(self):
+        await self.execute(['''
+ALTER TABLE quotes DISABLE TRIGGER quotes_document
+''',
+                            '''
+INSERT INTO quotes (broadcaster, quote) VALUES ('megotsthis', 'FrankerZ')
+''',
+                            '''
+INSERT INTO quotes (broadcaster, quote) VALUES ('megotsthis', 'Kappa')
+''',
+                            '''
+INSERT INTO quotes (broadcaster, quote) VALUES ('megotsthis', 'FrankerZ')
+''',
+                            '''
+ALTER TABLE quotes ENABLE TRIGGER quotes_document
+''',
+                            ])
+        self.assertEqual(await migration.backfillDocuments(2), 3)
+        self.assertEqual(await migration.backfillDocuments(2), 0)
+        self.assertEqual(
+            await self.rows('SELECT document FROM quotes ORDER BY quoteId'),
+            [(self.doc_kappa,), (self.doc_frankerz,), (self.doc_kappa,),
+             (self.doc_frankerz,)])
+
+    async def test_document_without_trigger(self):
+        await self.execute(['''
+DROP TRIGGER quotes_document ON quotes
+''',
+                            '''
+DELETE FROM quotes_migrations WHERE version=5
+''',
+                            ])
+        self.assertEqual(
+            await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ'),
+            2)
+        self.assertIs(
+            await database.updateQuote('megotsthis', 'botgotsthis', 1,
+                                       'FrankerZ'),
+            True)
+        self.assertEqual(
+            await database.copyQuote('megotsthis', 'mebotsthis',
+                                     'botgotsthis', 1),
+            3)
+        self.assertEqual(
+            await self.rows('SELECT document FROM quotes ORDER BY quoteId'),
+            [(self.doc_frankerz,), (self.doc_frankerz,),
+             (self.doc_frankerz,)])
+
+    async def test_history_concurrent_writers(self):
+        async with database.DatabaseMain.acquire() as db, \
+                await db.cursor() as cursor:
+            await history.write(
+                cursor,
+                [history.record(1, 'megotsthis', 'Kappa', 'botgotsthis')],
+                False, True)
+            writer = asyncio.ensure_future(historywriter.writeHistory(
+                [history.record(1, 'megotsthis', 'Keepo', 'mebotsthis')]))
+            await asyncio.sleep(0.2)
+            self.assertIs(writer.done(), False)
+            await db.commit()
+        self.assertEqual(await writer, 1)
+        self.assertEqual(
+            [(r.revision, r.quote, r.editor)
+             for r in await self.historyRows()],
+            [(1, 'Kappa', 'botgotsthis'), (2, 'Keepo', 'mebotsthis')])
+
+    async def test_ensure_partitions(self):
+        await self.writeHistory(
+            [(1, datetime(2026, 10, 18), 'megotsthis', 'Kappa',
+              'botgotsthis'),
+             (1, datetime(2026, 10, 19), 'megotsthis', 'Kappa Keepo',
+              'botgotsthis'),
+             (1, datetime(2026, 10, 20), 'megotsthis', 'Kappa PogChamp',
+              'botgotsthis'),
+             (1, datetime(2026, 12, 1), 'megotsthis', 'Keepo',
+              'botgotsthis'),
+             ])
+        with patch(retention.__name__ + '.batchSize', 2):
+            self.assertEqual(
+                await retention.ensurePartitions(datetime(2026, 12, 18)),
+                ['quotes_revisions_y2026m10', 'quotes_revisions_y2027m01',
+                 'quotes_revisions_y2027m02'])
+        self.assertEqual(
+            await retention.ensurePartitions(datetime(2026, 12, 18)), [])
+        self.assertEqual(
+            await self.rows('''
+SELECT revision FROM quotes_revisions_default
+'''),
+            [(4,)])
+        self.assertEqual(
+            await self.rows('''
+SELECT revision FROM quotes_revisions_y2026m10 ORDER BY revision
+'''),
+            [(1,), (2,), (3,)])
+        self.assertEqual(
+            await self.rows('''
+SELECT conname FROM pg_constraint WHERE contype='c'
+    AND conrelid IN ('quotes_revisions_default'::regclass,
+                     'quotes_revisions_y2026m10'::regclass)
+'''),
+            [])
+        self.assertEqual(
+            [r.quote for r in await self.historyRows()],
+            ['Kappa', 'Kappa Keepo', 'Kappa PogChamp', 'Keepo'])
+
+    async def test_ensure_partitions_unmigrated(self):
+        await self.useLegacyHistory([])
+        self.assertEqual(
+            await retention.ensurePartitions(datetime(2026, 12, 18)), [])
+
+    async def test_retention_drop_partition(self):
+        await self.execute('''
+CREATE TABLE quotes_revisions_y2020m01 PARTITION OF quotes_revisions
+    FOR VALUES FROM ('2020-01-01') TO ('2020-02-01')
+''')
+        now = datetime(2026, 10, 18)
+        quote = 'Kappa Keepo PogChamp FrankerZ BibleThump {}'
+        await self.writeHistory(
+            [(1, datetime(2020, 1, 10 + i), 'megotsthis', quote.format(i),
+              'botgotsthis') for i in range(3)]
+            + [(1, now - timedelta(days=3 - i), 'megotsthis',
+                quote.format(i), 'botgotsthis') for i in range(3, 6)])
+        progress = await retention.compact(
+            retention.RetentionPolicy(keepRevisions=2, keepDays=30),
+            now=now)
+        self.assertEqual(progress, retention.RetentionProgress(
+            quotes=1, compacted=1, deleted=0, partitions=1))
+        self.assertEqual(
+            [(r.revision, r.quote) for r in await self.historyRows()],
+            [(4, quote.format(3)), (5, quote.format(4)),
+             (6, quote.format(5))])
+        self.assertIsNone((await self.row('''
+SELECT to_regclass('quotes_revisions_y2020m01')
+'''))[0])
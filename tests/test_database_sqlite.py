@@ -1,7 +1,10 @@
 import os
+import re
+from unittest.mock import patch
 
 from tests.database.sqlite.test_database import TestSqlite
 from .base_database import TestDatabaseQuotes
+from ..library import database, migration, retention, search, searchindex
 
 
 class TestLibraryQuoteSqlite(TestDatabaseQuotes, TestSqlite):
@@ -13,3 +16,227 @@ class TestLibraryQuoteSqlite(TestDatabaseQuotes, TestSqlite):
         with open(sqlFile) as f:
             await self.execute(f.read())
         await self.setUpInsert()
+
+    async def tearDown(self):
+        await self.execute('''DROP TABLE IF EXISTS quotes_search''')
+        search.sqliteSearch = None
+        await super().tearDown()
+
+    async def assertUsesIndex(self, query, params):
+        rows = await self.rows('EXPLAIN QUERY PLAN ' + query, params)
+        plan = [d for *_, d in rows]
+        subqueries = set()
+        for d in plan:
+            match = re.fullmatch(r'(CO-ROUTINE|MATERIALIZE) (\w+)', d)
+            if match is not None:
+                subqueries.add(match.group(2))
+        scans = [d for d in plan
+                 if re.fullmatch(r'SCAN (TABLE )?\w+( AS \w+)?', d)
+                 and d.split()[-1] not in subqueries]
+        self.assertEqual(scans, [], plan)
+
+    async def dropSearch(self):
+        await self.execute(['''DROP TRIGGER quotes_search_insert''',
+                            '''DROP TRIGGER quotes_search_delete''',
+                            '''DROP TRIGGER quotes_search_update''',
+                            '''DROP TABLE quotes_search''',
+                            ])
+        search.sqliteSearch = None
+
+    async def test_get_quote_search_substring(self):
+        await database.addQuote('megotsthis', 'botgotsthis',
+                                'FrankerZ PogChamp')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['ankerz']),
+            'FrankerZ PogChamp')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['pog', 'frank']),
+            'FrankerZ PogChamp')
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['pog', 'kappa']))
+
+    async def test_get_quote_search_short(self):
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['pa']),
+            'Kappa')
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis',
+                                                  ['pa', 'kap']),
+            'Kappa')
+
+    async def test_get_quote_search_updated(self):
+        await database.updateQuote('megotsthis', 'botgotsthis', 1,
+                                   'FrankerZ')
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['Kappa']))
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['Franker']),
+            'FrankerZ')
+        await database.deleteQuote('megotsthis', 1)
+        self.assertIsNone(
+            await database.getRandomQuoteBySearch('megotsthis', ['Franker']))
+
+    async def test_get_quote_search_no_fts(self):
+        await self.dropSearch()
+        self.assertEqual(
+            await database.getRandomQuoteBySearch('megotsthis', ['appa']),
+            'Kappa')
+        self.assertEqual(
+            await database.getAnyRandomQuoteBySearch(['appa']),
+            ('Kappa', 'megotsthis'))
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['appa']),
+            [1])
+
+    async def test_get_quote_search_wildcards(self):
+        await database.addQuote('megotsthis', 'botgotsthis', '100% FrankerZ')
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa_Keepo')
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['%']),
+            [2])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['a_k']),
+            [3])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['Kap%']),
+            [])
+
+    async def test_get_quote_search_expression_no_fts(self):
+        await self.dropSearch()
+        await database.addQuote('megotsthis', 'botgotsthis', 'FrankerZ')
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['appa', 'OR', '"nkerZ"']),
+            [1, 2])
+        self.assertEqual(
+            await database.getQuoteIdsByWords(
+                'megotsthis', ['-appa', 'tag:PogChamp']),
+            [])
+
+    async def test_get_best_quotes_search_no_fts(self):
+        await self.dropSearch()
+        await database.addQuote('megotsthis', 'botgotsthis', 'Keepo')
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kappa Keepo')
+        self.assertEqual(
+            await database.getBestQuotesBySearch(
+                'megotsthis', ['Kappa', 'Keepo'], 2),
+            [(3, 'Kappa Keepo'), (1, 'Kappa')])
+        self.assertEqual(
+            await database.getBestQuotesBySearch('megotsthis', ['pa'], 5),
+            [(1, 'Kappa'), (3, 'Kappa Keepo')])
+
+    async def searchBoth(self, queries):
+        searchindex.unload()
+        expected = [sorted(await database._searchQuoteIds(c, w))
+                    for c, w in queries]
+        self.assertIs(await searchindex.load(), True)
+        actual = [sorted(await database._searchQuoteIds(c, w))
+                  for c, w in queries]
+        self.assertEqual(actual, expected)
+        return actual
+
+    async def test_search_index_matches_sql(self):
+        await self.execute('''
+INSERT INTO quotes (quoteId, broadcaster, quote) VALUES
+    (2, 'megotsthis', 'Kappa Keepo'),
+    (3, 'megotsthis', 'FrankerZ PogChamp'),
+    (4, 'botgotsthis', 'kappa pogchamp'),
+    (5, 'botgotsthis', 'BibleThump')
+''')
+        await self.execute('''
+INSERT INTO quotes_tags (quoteId, tag) VALUES
+    (2, 'keepo'), (3, 'Kappa'), (3, 'kappa'), (4, 'BibleThump'),
+    (5, 'Keepo')
+''')
+        queries = [(channel, words)
+                   for channel in ['megotsthis', 'botgotsthis', None]
+                   for words in [['Kappa'], ['kap'], ['pa'], ['e'],
+                                 ['Kappa', 'Keepo'], ['keepo'],
+                                 ['pog', 'kappa'], ['BibleThump'],
+                                 ['FrankerZ', 'frankerz'], ['Kreygasm']]]
+        self.assertEqual((await self.searchBoth(queries))[:4],
+                         [[1, 2, 3], [1, 2], [1, 2], [2, 3]])
+
+        await database.addQuote('megotsthis', 'botgotsthis', 'Kreygasm Pa')
+        await database.updateQuote('megotsthis', 'botgotsthis', 2, 'Kappa')
+        await database.toggleQuoteTags('megotsthis', 3, ['Kappa', 'pog'])
+        await database.addTagsToQuote(4, ['Kreygasm'])
+        await database.deleteTagsToQuote(2, ['keepo'])
+        await database.copyQuote('botgotsthis', 'megotsthis', 'botgotsthis',
+                                 4)
+        await database.deleteQuote('botgotsthis', 5)
+        self.assertCountEqual(
+            await database._searchQuoteIds(None, ['kreygasm']), [4, 6, 7])
+        await self.searchBoth(queries)
+
+    async def test_migrate_search(self):
+        await self.dropSearch()
+        self.assertIs(await migration.migrateSqliteSearch(), True)
+        self.assertIs(await migration.migrateSqliteSearch(), False)
+        self.assertEqual(await self.rows('''
+SELECT rowid FROM quotes_search WHERE quotes_search MATCH '"appa"'
+'''),
+                         [(1,)])
+        self.assertEqual(
+            await database.getQuoteIdsByWords('megotsthis', ['appa']),
+            [1])
+
+    async def test_migrate_tag_index(self):
+        await self.execute('''DROP INDEX quotes_tags_lower''')
+        await migration.migrateTagIndex()
+        await migration.migrateTagIndex()
+        self.assertEqual(await self.rows('''
+SELECT name FROM sqlite_master WHERE type='index' AND name='quotes_tags_lower'
+'''),
+                         [('quotes_tags_lower',)])
+
+    async def test_migrate_indexes(self):
+        await self.createLegacyHistory([])
+        await self.execute(['''DROP INDEX quotes_broadcaster_id''',
+                            '''
+CREATE INDEX quotes_broadcaster ON quotes (broadcaster)
+''',
+                            '''
+CREATE INDEX quotes_tags_id ON quotes_tags (quoteId)
+''',
+                            '''
+DELETE FROM quotes_migrations WHERE version IN (3, 4)
+''',
+                            ])
+        self.assertEqual(await migration.migrate(), [3, 4])
+        self.assertCountEqual(await self.rows('''
+SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'quotes_%'
+'''),
+                              [('quotes_broadcaster_id',),
+                               ('quotes_tags_lower',),
+                               ('quotes_history_quote',),
+                               ('quotes_revisions_broadcaster',),
+                               ])
+
+    async def test_ensure_partitions(self):
+        self.assertEqual(await retention.ensurePartitions(), [])
+
+    async def test_auto_vacuum(self):
+        self.assertEqual(await self.row('PRAGMA auto_vacuum'), (2,))
+        await self.execute(['PRAGMA auto_vacuum = NONE', 'VACUUM'])
+        self.assertEqual(await self.row('PRAGMA auto_vacuum'), (0,))
+        await self.execute('''
+DELETE FROM quotes_migrations WHERE version=8
+''')
+        self.assertEqual(await migration.migrate(), [8])
+        self.assertEqual(await self.row('PRAGMA auto_vacuum'), (2,))
+
+    async def test_vacuum(self):
+        await self.execute('''
+INSERT INTO quotes VALUES (2, 'megotsthis', ?)
+''', ('Kappa ' * 10000,))
+        await self.execute('''
+DELETE FROM quotes WHERE quoteId=2
+''')
+        free, = await self.row('PRAGMA freelist_count')
+        self.assertGreater(free, 2)
+        with patch(retention.__name__ + '.vacuumPages', 2):
+            self.assertEqual(await retention.vacuum(), free)
+        self.assertEqual(await self.row('PRAGMA freelist_count'), (0,))
@@ -0,0 +1,37 @@
+import unittest
+
+from ..library import history
+
+
+class TestHistoryDelta(unittest.TestCase):
+    def test_diff_patch(self):
+        for base, text in [('Kappa Keepo', 'Kappa PogChamp Keepo'),
+                           ('Kappa Keepo', 'Keepo'),
+                           ('', 'Kappa'),
+                           ('Kappa', ''),
+                           ('Kappa', 'Kappa'),
+                           ('Kappa ☃', 'FrankerZ ☃ Kappa'),
+                           ]:
+            with self.subTest(base=base, text=text):
+                self.assertEqual(
+                    history.patch(base, history.diff(base, text)), text)
+
+    def test_diff(self):
+        self.assertEqual(history.diff('Kappa Keepo', 'Kappa PogChamp Keepo'),
+                         [6, 'PogChamp ', 5])
+        self.assertEqual(history.diff('Kappa Keepo', 'Kappa'), [5, -6])
+
+    def test_compress(self):
+        self.assertEqual(history.compress(b'Kappa'), b'rKappa')
+        self.assertEqual(history.decompress(b'rKappa'), b'Kappa')
+        compressed = history.compress(b'Kappa ' * 20)
+        self.assertEqual(compressed[:1], b'z')
+        self.assertLess(len(compressed), 120)
+        self.assertEqual(history.decompress(compressed), b'Kappa ' * 20)
+
+    def test_decode(self):
+        keyframe = history.encodeKeyframe('Kappa Keepo')
+        self.assertEqual(history.decode(None, True, keyframe), 'Kappa Keepo')
+        delta = history.encodeDelta('Kappa Keepo', 'Kappa PogChamp')
+        self.assertEqual(history.decode('Kappa Keepo', False, delta),
+                         'Kappa PogChamp')
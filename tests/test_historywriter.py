@@ -0,0 +1,117 @@
+import asyncio
+
+import asynctest
+from asynctest.mock import patch
+
+import bot
+
+from ..library import historywriter
+
+
+class TestHistoryWriter(asynctest.TestCase):
+    def setUp(self):
+        self.batches = []
+
+        async def writeHistory(records):
+            self.batches.append(list(records))
+            return len(records)
+
+        patcher = patch.object(historywriter, 'writeHistory',
+                               side_effect=writeHistory)
+        self.addCleanup(patcher.stop)
+        self.mock_write = patcher.start()
+
+        patcher = patch.object(historywriter, 'batchSize', 2)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        patcher = patch('bot.globals', running=True)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        patcher = patch('bot.utils.logException')
+        self.addCleanup(patcher.stop)
+        self.mock_log = patcher.start()
+
+    async def tearDown(self):
+        await historywriter.stop()
+
+    def quotes(self):
+        return [[r.quote for r in batch] for batch in self.batches]
+
+    async def test_disabled(self):
+        self.assertIs(historywriter.enabled(), False)
+        await historywriter.flush()
+        await historywriter.stop()
+        self.assertFalse(self.mock_write.called)
+
+    async def test_stop_flushes(self):
+        historywriter.start()
+        self.assertIs(historywriter.enabled(), True)
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        await historywriter.put(1, 'megotsthis', 'Keepo', 'botgotsthis')
+        await historywriter.put(2, 'megotsthis', 'FrankerZ', 'botgotsthis')
+        await historywriter.stop()
+        self.assertIs(historywriter.enabled(), False)
+        self.assertEqual(self.quotes(), [['Kappa', 'Keepo'], ['FrankerZ']])
+        record = self.batches[0][0]
+        self.assertEqual(
+            (record.quoteId, record.broadcaster, record.editor),
+            (1, 'megotsthis', 'botgotsthis'))
+
+    @patch.object(historywriter, 'flushInterval', 0.01)
+    async def test_interval(self):
+        historywriter.start()
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        while not self.batches:
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.quotes(), [['Kappa']])
+
+    @patch.object(historywriter, 'retryDelay', 0)
+    async def test_retry(self):
+        self.mock_write.side_effect = [Exception(), 1]
+        historywriter.start()
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        await historywriter.flush()
+        self.assertEqual(self.mock_write.call_count, 2)
+
+    @patch.object(historywriter, 'retryDelay', 0)
+    @patch.object(historywriter, 'maxRetries', 2)
+    async def test_discard(self):
+        async def writeHistory(records):
+            if len(records) > 1 or records[0].quote == 'Keepo':
+                raise Exception()
+            self.batches.append(list(records))
+            return len(records)
+        self.mock_write.side_effect = writeHistory
+        historywriter.start()
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        await historywriter.put(2, 'megotsthis', 'Keepo', 'botgotsthis')
+        await historywriter.flush()
+        self.assertEqual(self.mock_write.call_count, 4)
+        self.assertEqual(self.quotes(), [['Kappa']])
+        self.assertEqual(self.mock_log.call_count, 1)
+
+    @patch.object(historywriter, 'flushInterval', 0.01)
+    async def test_shutdown(self):
+        historywriter.start()
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        bot.globals.running = False
+        while historywriter.enabled():
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.quotes(), [['Kappa']])
+
+    async def test_cancel_writes_pending(self):
+        historywriter.start()
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        await asyncio.sleep(0)
+        writer = historywriter._writer
+        writer.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await writer
+        self.assertIs(historywriter.enabled(), False)
+        self.assertEqual(self.quotes(), [['Kappa']])
+
+    async def test_put_stopped(self):
+        await historywriter.put(1, 'megotsthis', 'Kappa', 'botgotsthis')
+        self.assertEqual(self.quotes(), [['Kappa']])
@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 import pyodbc
 from asynctest.mock import patch
@@ -8,7 +8,7 @@ from tests.unittest.mock_class import StrContains
 from lib.data.message import Message
 
 from .. import library
-from ..library import database
+from ..library import database, history, similar
 
 
 class TestLibraryQuoteBase(TestChannel):
@@ -109,6 +109,71 @@ class TestLibraryQuoteProcessQuoteId(TestLibraryQuoteBase):
             StrContains('Cannot', 'find', 'quote'))
 
 
+class TestLibraryQuoteProcessBestQuoteSearch(TestLibraryQuoteBase):
+    def setUp(self):
+        super().setUp()
+
+        patcher = patch(database.__name__ + '.getBestQuotesBySearch')
+        self.addCleanup(patcher.stop)
+        self.mock_getter = patcher.start()
+
+    async def test(self):
+        self.mock_getter.return_value = [(1, 'Kappa')]
+        self.assertIs(
+            await library.processBestQuoteSearch(self.args, ['Kappa']), True)
+        self.mock_getter.assert_called_once_with(self.channel.channel,
+                                                 ['Kappa'], 1)
+        self.channel.send.assert_called_once_with(
+            StrContains('Quote', 'Kappa'))
+
+    async def test_no_quote(self):
+        self.mock_getter.return_value = []
+        self.assertIs(
+            await library.processBestQuoteSearch(self.args, ['Kappa']), True)
+        self.channel.send.assert_called_once_with(
+            StrContains('Cannot', 'find', 'quote'))
+
+
+class TestLibraryQuoteProcessSimilarQuote(TestLibraryQuoteBase):
+    def setUp(self):
+        super().setUp()
+
+        patcher = patch(database.__name__ + '.getSimilarQuotes')
+        self.addCleanup(patcher.stop)
+        self.mock_getter = patcher.start()
+
+        patcher = patch(similar.__name__ + '.available')
+        self.addCleanup(patcher.stop)
+        self.mock_available = patcher.start()
+        self.mock_available.return_value = True
+
+    async def test(self):
+        self.mock_getter.return_value = [(2, 'Kappa Keepo')]
+        self.assertIs(await library.processSimilarQuote(self.args, 1), True)
+        self.mock_getter.assert_called_once_with(self.channel.channel, 1, 1)
+        self.channel.send.assert_called_once_with(
+            StrContains('Quote', 'Kappa Keepo'))
+
+    async def test_no_similar(self):
+        self.mock_getter.return_value = []
+        self.assertIs(await library.processSimilarQuote(self.args, 1), True)
+        self.channel.send.assert_called_once_with(
+            StrContains('Cannot', 'find', 'similar'))
+
+    async def test_no_quote(self):
+        self.mock_getter.return_value = None
+        self.assertIs(await library.processSimilarQuote(self.args, 1), True)
+        self.channel.send.assert_called_once_with(
+            StrContains('Cannot', 'find', 'quote'))
+
+    async def test_unavailable(self):
+        self.mock_available.return_value = False
+        self.assertIs(await library.processSimilarQuote(self.args, 1), False)
+        self.assertFalse(self.mock_getter.called)
+        self.channel.send.assert_called_once_with(
+            StrContains('not', 'available'))
+
+
 class TestLibraryQuoteProcessQuoteSearch(TestLibraryQuoteBase):
     def setUp(self):
         super().setUp()
@@ -149,7 +214,7 @@ class TestLibraryQuoteProcessAnyRandomQuote(TestLibraryQuoteBase):
     async def test(self):
         self.mock_getter.return_value = 'Kappa', 'megotsthis'
         self.assertIs(await library.processAnyRandomQuote(self.args), True)
-        self.mock_send.assert_called_once_with(
+        self.mock_send.assert_awaited_once_with(
             self.args, 'megotsthis', 'Kappa')
 
     async def test_no_quote(self):
@@ -173,7 +238,7 @@ class TestLibraryQuoteProcessAnyQuoteId(TestLibraryQuoteBase):
     async def test(self):
         self.mock_getter.return_value = 'Kappa', 'megotsthis'
         self.assertIs(await library.processAnyQuoteId(self.args, 0), True)
-        self.mock_send.assert_called_once_with(
+        self.mock_send.assert_awaited_once_with(
             self.args, 'megotsthis', 'Kappa')
 
     async def test_no_quote(self):
@@ -200,7 +265,7 @@ class TestLibraryQuoteProcessAnyQuoteSearch(TestLibraryQuoteBase):
         self.assertIs(
             await library.processAnyRandomQuoteSearch(self.args, ['Kappa']),
             True)
-        self.mock_send.assert_called_once_with(
+        self.mock_send.assert_awaited_once_with(
             self.args, 'megotsthis', 'Kappa')
 
     async def test_no_quote(self):
@@ -321,6 +386,112 @@ class TestLibraryQuoteHandleEdit(TestLibraryQuoteBase):
             StrContains('not', 'updated'))
 
 
+class TestLibraryQuoteHandleHistory(TestLibraryQuoteBase):
+    def setUp(self):
+        super().setUp()
+
+        patcher = patch('lib.helper.message.messagesFromItems')
+        self.addCleanup(patcher.stop)
+        self.mock_message = patcher.start()
+        self.mock_message.return_value = ['Kappa']
+
+        patcher = patch(database.__name__ + '.getQuoteHistory')
+        self.addCleanup(patcher.stop)
+        self.mock_history = patcher.start()
+
+    async def test_no_arg(self):
+        self.args = self.args._replace(message=Message('!quotes history'))
+        self.assertIs(await library.handleQuoteHistory(self.args), False)
+        self.assertFalse(self.mock_history.called)
+        self.assertFalse(self.channel.send.called)
+
+    async def test_not_number(self):
+        self.args = self.args._replace(message=Message('!quotes history a'))
+        self.assertIs(await library.handleQuoteHistory(self.args), True)
+        self.assertFalse(self.mock_history.called)
+        self.channel.send.assert_called_once_with(StrContains('not', 'number'))
+
+    async def test(self):
+        self.mock_history.return_value = [
+            history.Revision(0, 2, datetime(2000, 1, 2), 'botgotsthis',
+                             'Kappa Keepo', 'megotsthis'),
+            history.Revision(0, 1, datetime(2000, 1, 1), 'botgotsthis',
+                             'Kappa', 'botgotsthis'),
+            ]
+        self.args = self.args._replace(message=Message('!quotes history 0'))
+        self.assertIs(await library.handleQuoteHistory(self.args), True)
+        self.mock_history.assert_called_once_with(
+            self.channel.channel, 0, library.historyLimit)
+        self.mock_message.assert_called_once_with(
+            ['#2 by megotsthis on 2000-01-02: Kappa Keepo',
+             '#1 by botgotsthis on 2000-01-01: Kappa'],
+            'Quote id 0 history: ')
+        self.channel.send.assert_called_once_with(['Kappa'])
+
+    async def test_empty(self):
+        self.mock_history.return_value = []
+        self.args = self.args._replace(message=Message('!quotes history 0'))
+        self.assertIs(await library.handleQuoteHistory(self.args), True)
+        self.assertTrue(self.mock_history.called)
+        self.channel.send.assert_called_once_with(
+            StrContains('0', 'no', 'history'))
+
+    async def test_except(self):
+        self.mock_history.side_effect = pyodbc.Error
+        self.args = self.args._replace(message=Message('!quotes history 0'))
+        with self.assertRaises(pyodbc.Error):
+            await library.handleQuoteHistory(self.args)
+        self.assertTrue(self.mock_history.called)
+        self.channel.send.assert_called_once_with(StrContains('error'))
+
+
+class TestLibraryQuoteHandleRevert(TestLibraryQuoteBase):
+    def setUp(self):
+        super().setUp()
+
+        patcher = patch(database.__name__ + '.revertQuote')
+        self.addCleanup(patcher.stop)
+        self.mock_reverter = patcher.start()
+
+    async def test_no_arg(self):
+        self.args = self.args._replace(message=Message('!quotes revert 0'))
+        self.assertIs(await library.handleRevertQuote(self.args), False)
+        self.assertFalse(self.mock_reverter.called)
+        self.assertFalse(self.channel.send.called)
+
+    async def test_not_number(self):
+        self.args = self.args._replace(message=Message('!quotes revert 0 a'))
+        self.assertIs(await library.handleRevertQuote(self.args), True)
+        self.assertFalse(self.mock_reverter.called)
+        self.channel.send.assert_called_once_with(StrContains('not', 'number'))
+
+    async def test(self):
+        self.mock_reverter.return_value = True
+        self.args = self.args._replace(message=Message('!quotes revert 0 1'))
+        self.assertIs(await library.handleRevertQuote(self.args), True)
+        self.mock_reverter.assert_called_once_with(
+            self.channel.channel, self.args.nick, 0, 1)
+        self.channel.send.assert_called_once_with(
+            StrContains(self.channel.channel, 'reverted', '0', '1'))
+
+    async def test_false(self):
+        self.mock_reverter.return_value = False
+        self.args = self.args._replace(message=Message('!quotes revert 0 1'))
+        self.assertIs(await library.handleRevertQuote(self.args), True)
+        self.assertTrue(self.mock_reverter.called)
+        self.channel.send.assert_called_once_with(
+            StrContains('not', 'reverted'))
+
+    async def test_except(self):
+        self.mock_reverter.side_effect = pyodbc.Error
+        self.args = self.args._replace(message=Message('!quotes revert 0 1'))
+        with self.assertRaises(pyodbc.Error):
+            await library.handleRevertQuote(self.args)
+        self.assertTrue(self.mock_reverter.called)
+        self.channel.send.assert_called_once_with(
+            StrContains('not', 'reverted'))
+
+
 class TestLibraryQuoteHandleDelete(TestLibraryQuoteBase):
     def setUp(self):
         super().setUp()
@@ -506,84 +677,71 @@ class TestLibraryQuoteProcessTags(TestLibraryQuoteBase):
     def setUp(self):
         super().setUp()
 
-        patcher = patch('lib.helper.message.messagesFromItems')
+        patcher = patch(database.__name__ + '.toggleQuoteTags')
         self.addCleanup(patcher.stop)
-        self.mock_message = patcher.start()
-        self.mock_message.return_value = ['Kappa']
-
-        patcher = patch(database.__name__ + '.getQuoteById')
-        self.addCleanup(patcher.stop)
-        self.mock_getId = patcher.start()
-        self.mock_getId.return_value = 0
-
-        patcher = patch(database.__name__ + '.getTagsOfQuote')
-        self.addCleanup(patcher.stop)
-        self.mock_listTags = patcher.start()
-
-        patcher = patch(database.__name__ + '.addTagsToQuote')
-        self.addCleanup(patcher.stop)
-        self.mock_adder = patcher.start()
-
-        patcher = patch(database.__name__ + '.deleteTagsToQuote')
-        self.addCleanup(patcher.stop)
-        self.mock_deleter = patcher.start()
+        self.mock_toggle = patcher.start()
 
     async def test_no_quote(self):
-        self.mock_getId.return_value = None
-        self.args = self.args._replace(message=Message('!quotes id'))
+        self.mock_toggle.return_value = None
+        self.args = self.args._replace(message=Message('!quotes tag 0 Kappa'))
         self.assertIs(await library.processQuoteTags(self.args, 0, ['Kappa']),
                       True)
-        self.assertFalse(self.mock_listTags.called)
-        self.assertFalse(self.mock_adder.called)
-        self.assertFalse(self.mock_deleter.called)
+        self.mock_toggle.assert_called_once_with(
+            self.channel.channel, 0, ['Kappa'])
         self.channel.send.assert_called_once_with(
             StrContains('0', 'not', 'found'))
 
     async def test(self):
-        self.mock_listTags.return_value = ['Kappa']
+        self.mock_toggle.return_value = database.QuoteTags(
+            ['FrankerZ'], ['Kappa'], [])
         self.args = self.args._replace(
             message=Message('!quotes tag 0 Kappa FrankerZ'))
         self.assertIs(
             await library.processQuoteTags(self.args, 0,
                                            ['Kappa', 'FrankerZ']),
             True)
-        self.assertTrue(self.mock_listTags.called)
-        self.mock_adder.asset_called_once_with(self.database, 0, ['FrankerZ'])
-        self.mock_deleter.asset_called_once_with(self.database, 0, ['Kappa'])
+        self.mock_toggle.assert_called_once_with(
+            self.channel.channel, 0, ['Kappa', 'FrankerZ'])
         self.channel.send.assert_called_once_with(
             StrContains('0', 'tags', 'updated'))
 
     async def test_number(self):
-        self.mock_listTags.return_value = []
+        self.mock_toggle.return_value = database.QuoteTags([], [], ['0abc'])
         self.args = self.args._replace(
             message=Message('!quotes tag 0 0abc'))
         self.assertIs(await library.processQuoteTags(self.args, 0, ['0abc']),
                       True)
-        self.assertTrue(self.mock_listTags.called)
-        self.assertFalse(self.mock_adder.called)
-        self.assertFalse(self.mock_deleter.called)
+        self.assertTrue(self.mock_toggle.called)
         self.channel.send.assert_called_once_with(
             StrContains('tags', 'use', '0abc'))
 
+    async def test_updated_and_number(self):
+        self.mock_toggle.return_value = database.QuoteTags(
+            ['Kappa'], [], ['0abc'])
+        self.args = self.args._replace(
+            message=Message('!quotes tag 0 Kappa 0abc'))
+        self.assertIs(
+            await library.processQuoteTags(self.args, 0, ['Kappa', '0abc']),
+            True)
+        self.assertEqual(self.channel.send.call_count, 2)
+        self.channel.send.assert_any_call(StrContains('0', 'tags', 'updated'))
+        self.channel.send.assert_any_call(StrContains('tags', 'use', '0abc'))
+
     async def test_empty(self):
-        self.mock_listTags.return_value = []
+        self.mock_toggle.return_value = database.QuoteTags([], [], [])
         self.args = self.args._replace(message=Message('!quotes tag 0 Kappa'))
         self.assertIs(await library.processQuoteTags(self.args, 0, []),
                       True)
-        self.assertTrue(self.mock_listTags.called)
-        self.assertFalse(self.mock_adder.called)
-        self.assertFalse(self.mock_deleter.called)
+        self.assertTrue(self.mock_toggle.called)
         self.channel.send.assert_called_once_with(
             StrContains('No', 'valid', 'tags'))
 
     async def test_except(self):
-        self.mock_listTags.side_effect = pyodbc.Error
+        self.mock_toggle.side_effect = pyodbc.Error
         self.args = self.args._replace(message=Message('!quotes tag 0 Kappa'))
         with self.assertRaises(pyodbc.Error):
             await library.processQuoteTags(self.args, 0, ['Kappa'])
-        self.assertTrue(self.mock_listTags.called)
-        self.assertFalse(self.mock_adder.called)
-        self.assertFalse(self.mock_deleter.called)
+        self.assertTrue(self.mock_toggle.called)
         self.channel.send.assert_called_once_with(
             StrContains('tags', 'not', 'updated'))
 
@@ -638,6 +796,13 @@ class TestLibraryQuoteProcessListTags(TestLibraryQuoteBase):
         self.channel.send.assert_called_once_with(StrContains('error'))
 
 
+def iterateIds(*rows):
+    async def iterate(*args):
+        for row in rows:
+            yield row
+    return iterate
+
+
 class TestLibraryQuoteHandleId(TestLibraryQuoteBase):
     def setUp(self):
         super().setUp()
@@ -647,7 +812,7 @@ class TestLibraryQuoteHandleId(TestLibraryQuoteBase):
         self.mock_message = patcher.start()
         self.mock_message.return_value = ['Kappa']
 
-        patcher = patch(database.__name__ + '.getQuoteIdsByWords')
+        patcher = patch(database.__name__ + '.iterateQuoteIdsByWords')
         self.addCleanup(patcher.stop)
         self.mock_lister = patcher.start()
 
@@ -658,14 +823,24 @@ class TestLibraryQuoteHandleId(TestLibraryQuoteBase):
         self.assertFalse(self.channel.send.called)
 
     async def test(self):
-        self.mock_lister.return_value = [0]
+        self.mock_lister.side_effect = iterateIds((0, 1))
         self.args = self.args._replace(message=Message('!quotes id Kappa'))
         self.assertIs(await library.handleListQuoteIds(self.args), True)
-        self.assertTrue(self.mock_lister.called)
+        self.mock_lister.assert_called_once_with(
+            self.channel.channel, ['Kappa'], library.listLimit)
+        self.mock_message.assert_called_once_with(['0'], 'Possible IDs: ')
+        self.channel.send.assert_called_once_with(['Kappa'])
+
+    async def test_capped(self):
+        self.mock_lister.side_effect = iterateIds((1, 50), (3, 50))
+        self.args = self.args._replace(message=Message('!quotes id Kappa'))
+        self.assertIs(await library.handleListQuoteIds(self.args), True)
+        self.mock_message.assert_called_once_with(
+            ['1', '3'], 'Possible IDs (first 2 of 50): ')
         self.channel.send.assert_called_once_with(['Kappa'])
 
     async def test_empty(self):
-        self.mock_lister.return_value = []
+        self.mock_lister.side_effect = iterateIds()
         self.args = self.args._replace(message=Message('!quotes id Kappa'))
         self.assertIs(await library.handleListQuoteIds(self.args), True)
         self.assertTrue(self.mock_lister.called)
@@ -0,0 +1,169 @@
+import os
+import tempfile
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import asynctest
+from asynctest.mock import patch
+
+from lib.data import ManageBotArgs
+from lib.data.message import Message
+from tests.unittest.mock_class import StrContains
+
+from .. import manage
+from ..library import database, migration, retention, transfer
+from ..library.transfer import ImportProgress, TransferRow
+
+
+def exportRows(*rows):
+    async def export(*args):
+        for row in rows:
+            yield row
+    return export
+
+
+class TestManageQuotes(asynctest.TestCase):
+    def setUp(self):
+        self.send = MagicMock()
+        self.args = ManageBotArgs(MagicMock(), MagicMock(), self.send,
+                                  'botgotsthis', Message(''))
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        patcher = patch(database.__name__ + '.exportQuotes')
+        self.addCleanup(patcher.stop)
+        self.mock_export = patcher.start()
+
+        patcher = patch(database.__name__ + '.importQuotes')
+        self.addCleanup(patcher.stop)
+        self.mock_import = patcher.start()
+
+        patcher = patch(migration.__name__ + '.migrate')
+        self.addCleanup(patcher.stop)
+        self.mock_migrate = patcher.start()
+
+        patcher = patch(retention.__name__ + '.compact')
+        self.addCleanup(patcher.stop)
+        self.mock_compact = patcher.start()
+
+    def message(self, text):
+        self.args = self.args._replace(message=Message(text))
+
+    async def test_no_arg(self):
+        self.message('!managebot quotes export megotsthis')
+        self.assertIs(await manage.manageQuotes(self.args), False)
+        self.assertFalse(self.mock_export.called)
+        self.assertFalse(self.send.called)
+
+    async def test_unknown_action(self):
+        self.message('!managebot quotes kappa megotsthis quotes.csv')
+        self.assertIs(await manage.manageQuotes(self.args), False)
+        self.assertFalse(self.mock_export.called)
+        self.assertFalse(self.mock_import.called)
+
+    async def test_unknown_format(self):
+        path = os.path.join(self.directory, 'quotes.txt')
+        self.message(f'!managebot quotes export megotsthis {path}')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.assertFalse(self.mock_export.called)
+        self.send.assert_called_once_with(StrContains('Unknown', 'format'))
+
+    async def test_export(self):
+        rows = [TransferRow('quote', 1, 'Kappa'),
+                TransferRow('revision', 1, 'Kappa', 1, datetime(2000, 1, 1),
+                            'botgotsthis')]
+        self.mock_export.side_effect = exportRows(*rows)
+        path = os.path.join(self.directory, 'quotes.jsonl')
+        self.message(f'!managebot quotes export MeGotsThis {path}')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.mock_export.assert_called_once_with('megotsthis')
+        with open(path, encoding='utf-8') as file:
+            self.assertEqual(list(transfer.reader(file, 'jsonl')), rows)
+        self.send.assert_called_once_with(
+            StrContains('Exported', '2', 'megotsthis'))
+
+    async def test_import(self):
+        path = os.path.join(self.directory, 'quotes.csv')
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            transfer.writer(file, 'csv')(TransferRow('quote', 1, 'Kappa'))
+        rows = []
+
+        async def importQuotes(channel, nick, source, resume, report):
+            rows.extend([row async for row in source])
+            report(ImportProgress(3, 1, 1, 0))
+            return ImportProgress(3, 1, 1, 0)
+        self.mock_import.side_effect = importQuotes
+        self.message(f'!managebot quotes import megotsthis {path} 2')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.assertEqual(rows, [TransferRow('quote', 1, 'Kappa')])
+        self.assertEqual(self.mock_import.call_args[0][:2],
+                         ('megotsthis', 'botgotsthis'))
+        self.assertEqual(self.mock_import.call_args[0][3], 2)
+        self.send.assert_called_once_with(
+            StrContains('Imported', '1 quotes', 'megotsthis'))
+
+    async def test_import_resume_not_number(self):
+        path = os.path.join(self.directory, 'quotes.csv')
+        self.message(f'!managebot quotes import megotsthis {path} a')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.assertFalse(self.mock_import.called)
+        self.send.assert_called_once_with(StrContains('not', 'number'))
+
+    async def test_import_except(self):
+        path = os.path.join(self.directory, 'quotes.jsonl')
+        with open(path, 'w', encoding='utf-8'):
+            pass
+
+        async def importQuotes(channel, nick, source, resume, report):
+            report(ImportProgress(500, 100, 0, 400))
+            raise ValueError()
+        self.mock_import.side_effect = importQuotes
+        self.message(f'!managebot quotes import megotsthis {path}')
+        with self.assertRaises(ValueError):
+            await manage.manageQuotes(self.args)
+        self.send.assert_called_once_with(StrContains('Resume', '500'))
+
+    async def test_migrate(self):
+        self.mock_migrate.return_value = [6, 7]
+        self.message('!managebot quotes migrate')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.mock_migrate.assert_called_once_with(None)
+        self.send.assert_called_once_with(StrContains('6, 7'))
+
+    async def test_migrate_target(self):
+        self.mock_migrate.return_value = []
+        self.message('!managebot quotes migrate 5')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.mock_migrate.assert_called_once_with(5)
+        self.send.assert_called_once_with(StrContains('up to date'))
+
+    async def test_migrate_not_number(self):
+        self.message('!managebot quotes migrate kappa')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.assertFalse(self.mock_migrate.called)
+        self.send.assert_called_once_with(StrContains('not', 'number'))
+
+    async def test_retention(self):
+        self.mock_compact.return_value = retention.RetentionProgress(
+            3, 1, 5, 2)
+        self.message('!managebot quotes retention')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.mock_compact.assert_called_once_with(
+            retention.RetentionPolicy())
+        self.send.assert_called_once_with(
+            StrContains('Compacted 1', 'deleted 5', '3 quotes',
+                        '2 partitions'))
+
+    async def test_retention_policy(self):
+        self.mock_compact.return_value = retention.RetentionProgress()
+        self.message('!managebot quotes retention 5 30')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.mock_compact.assert_called_once_with(
+            retention.RetentionPolicy(keepRevisions=5, keepDays=30.0))
+
+    async def test_retention_not_number(self):
+        self.message('!managebot quotes retention 5 kappa')
+        self.assertIs(await manage.manageQuotes(self.args), True)
+        self.assertFalse(self.mock_compact.called)
+        self.send.assert_called_once_with(StrContains('not', 'number'))
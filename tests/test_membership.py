@@ -0,0 +1,98 @@
+import unittest
+
+from asynctest.mock import patch
+
+from ..library import membership
+
+
+class TestMembershipBloomFilter(unittest.TestCase):
+    def test(self):
+        bloom = membership.BloomFilter(100)
+        bloom.add('Kappa')
+        self.assertIn('Kappa', bloom)
+        self.assertNotIn('Keepo', bloom)
+        self.assertNotIn(1, bloom)
+        self.assertEqual(bloom.count, 1)
+
+    def test_full(self):
+        with patch(membership.__name__ + '.minimumCapacity', 1):
+            bloom = membership.BloomFilter(2)
+        bloom.add('Kappa')
+        bloom.add('Keepo')
+        self.assertIs(bloom.full(), False)
+        bloom.add('FrankerZ')
+        bloom.add('PogChamp')
+        bloom.add('BibleThump')
+        self.assertIs(bloom.full(), True)
+
+
+class TestMembership(unittest.TestCase):
+    def setUp(self):
+        self.addCleanup(membership.clear)
+        self.bloom = membership.BloomFilter(100)
+        for key in membership.trigrams('Kappa Keepo'):
+            self.bloom.add(key)
+        self.bloom.add(membership.tagKey('PogChamp'))
+        membership._channels['megotsthis'] = self.bloom
+
+    def test_trigrams(self):
+        self.assertEqual(list(membership.trigrams('Kappa')),
+                         ['q:kap', 'q:app', 'q:ppa'])
+        self.assertEqual(list(membership.trigrams('Ka')), [])
+
+    def test_unknown_channel(self):
+        self.assertIs(membership.mayMatch('botgotsthis', ['FrankerZ']), True)
+
+    def test_words(self):
+        self.assertIs(membership.mayMatch('megotsthis', ['kappa']), True)
+        self.assertIs(membership.mayMatch('megotsthis', ['PA KE']), True)
+        self.assertIs(membership.mayMatch('megotsthis', ['FrankerZ']),
+                      False)
+        self.assertIs(membership.mayMatch('megotsthis', ['Kappa', 'Franker']),
+                      False)
+
+    def test_unchecked_words(self):
+        self.assertIs(membership.mayMatch('megotsthis', ['Fr']), True)
+        self.assertIs(membership.mayMatch('megotsthis', ['Éclair']),
+                      True)
+
+    def test_wildcard_words(self):
+        self.assertIs(membership.mayMatch('megotsthis', ['Fr%nkerZ']),
+                      False)
+        self.assertIs(membership.mayMatch('megotsthis', ['Fr_nkerZ']),
+                      False)
+
+    def test_tags(self):
+        self.assertIs(membership.mayMatch('megotsthis', ['pogchamp']), True)
+        self.assertIs(
+            membership.mayMatch('megotsthis', ['pogchamp', 'FrankerZ']),
+            False)
+
+    def test_add_quote(self):
+        membership.addQuote('megotsthis', 'FrankerZ')
+        membership.addQuote('botgotsthis', 'BibleThump')
+        self.assertIs(membership.mayMatch('megotsthis', ['frankerz']), True)
+        self.assertNotIn('botgotsthis', membership._channels)
+
+    def test_add_tags(self):
+        membership.addTags('megotsthis', ['FrankerZ'])
+        self.assertIs(
+            membership.mayMatch('megotsthis', ['pogchamp', 'FrankerZ']),
+            True)
+
+    def test_add_tags_any_channel(self):
+        membership.addTags(None, ['FrankerZ'])
+        self.assertIs(
+            membership.mayMatch('megotsthis', ['pogchamp', 'FrankerZ']),
+            True)
+
+    def test_full(self):
+        with patch.object(self.bloom, 'capacity', 0):
+            membership.addQuote('megotsthis', 'FrankerZ')
+        self.assertNotIn('megotsthis', membership._channels)
+        self.assertIs(membership.mayMatch('megotsthis', ['BibleThump']),
+                      True)
+
+    def test_reset(self):
+        membership.reset('megotsthis')
+        self.assertIs(membership.mayMatch('megotsthis', ['FrankerZ']), True)
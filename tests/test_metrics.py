@@ -0,0 +1,155 @@
+import asyncio
+import unittest
+
+import asynctest
+from asynctest.mock import MagicMock, patch
+
+from ..library import metrics
+
+
+class TestMetricsHistogram(unittest.TestCase):
+    def test_observe(self):
+        histogram = metrics.Histogram([1, 10])
+        histogram.observe(0.5)
+        histogram.observe(1)
+        histogram.observe(5)
+        histogram.observe(50)
+        self.assertEqual(histogram.cumulative(),
+                         [('1', 2), ('10', 3), ('+Inf', 4)])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.sum, 56.5)
+
+
+class TestMetrics(asynctest.TestCase):
+    def setUp(self):
+        metrics.enable()
+        self.addCleanup(metrics.clear)
+        self.addCleanup(metrics.disable)
+
+        self.database = MagicMock()
+        self.database.isPostgres = False
+        acquire = MagicMock()
+        acquire.__aenter__.return_value = self.database
+        patcher = patch.object(metrics.DatabaseMain, 'acquire',
+                               return_value=acquire)
+        self.addCleanup(patcher.stop)
+        self.mock_acquire = patcher.start()
+
+    async def test_disabled(self):
+        metrics.disable()
+
+        @metrics.instrument
+        async def getQuote():
+            return 'Kappa'
+
+        self.assertEqual(await getQuote(), 'Kappa')
+        self.assertEqual(metrics.snapshot(), {})
+
+    async def test_no_database(self):
+        @metrics.instrument
+        async def getQuote():
+            return 'Kappa'
+
+        self.assertEqual(await getQuote(), 'Kappa')
+        result = metrics.snapshot()['getQuote']['none']
+        self.assertEqual(result['calls'], 1)
+        self.assertEqual(result['errors'], 0)
+        self.assertEqual(result['rows']['count'], 1)
+        self.assertEqual(result['rows']['sum'], 1)
+
+    async def test_database(self):
+        @metrics.instrument
+        async def getQuoteIds():
+            async with metrics.acquire() as db:
+                self.assertIs(db, self.database)
+                return [1, 2, 3]
+
+        self.assertEqual(await getQuoteIds(), [1, 2, 3])
+        self.assertEqual(await getQuoteIds(), [1, 2, 3])
+        result = metrics.snapshot()['getQuoteIds']['sqlite']
+        self.assertEqual(result['calls'], 2)
+        self.assertEqual(result['rows']['sum'], 6)
+        self.assertEqual(result['poolWait']['count'], 2)
+
+    async def test_error(self):
+        @metrics.instrument
+        async def getQuote():
+            async with metrics.acquire():
+                raise ValueError()
+
+        with self.assertRaises(ValueError):
+            await getQuote()
+        result = metrics.snapshot()['getQuote']['sqlite']
+        self.assertEqual(result['calls'], 1)
+        self.assertEqual(result['errors'], 1)
+
+    async def test_nested(self):
+        @metrics.instrument
+        async def getQuote():
+            async with metrics.acquire():
+                return 'Kappa'
+
+        @metrics.instrument
+        async def getRandomQuote():
+            return await getQuote()
+
+        self.assertEqual(await getRandomQuote(), 'Kappa')
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['getQuote']['sqlite']['calls'], 1)
+        self.assertEqual(snapshot['getRandomQuote']['sqlite']['calls'], 1)
+
+    async def test_concurrent(self):
+        @metrics.instrument
+        async def getQuote():
+            await asyncio.sleep(0)
+            async with metrics.acquire():
+                return 'Kappa'
+
+        @metrics.instrument
+        async def getRandomQuote():
+            await asyncio.sleep(0)
+            return 'Keepo'
+
+        self.assertEqual(
+            await asyncio.gather(getQuote(), getRandomQuote()),
+            ['Kappa', 'Keepo'])
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['getQuote']['sqlite']['calls'], 1)
+        self.assertEqual(snapshot['getRandomQuote']['none']['calls'], 1)
+        self.assertIsNone(metrics._current.get())
+
+    def test_row_count(self):
+        self.assertEqual(metrics.rowCount(None), 0)
+        self.assertEqual(metrics.rowCount(False), 0)
+        self.assertEqual(metrics.rowCount(True), 1)
+        self.assertEqual(metrics.rowCount(12), 1)
+        self.assertEqual(metrics.rowCount('Kappa'), 1)
+        self.assertEqual(metrics.rowCount({'Kappa', 'Keepo'}), 2)
+        self.assertEqual(metrics.rowCount((None, None)), 0)
+        self.assertEqual(metrics.rowCount(('Kappa', 'megotsthis')), 1)
+
+    async def test_prometheus(self):
+        @metrics.instrument
+        async def getQuote():
+            async with metrics.acquire():
+                return 'Kappa'
+
+        await getQuote()
+        text = metrics.prometheus()
+        self.assertIn('# TYPE quote_db_calls_total counter\n', text)
+        self.assertIn(
+            'quote_db_calls_total{function="getQuote",backend="sqlite"} 1\n',
+            text)
+        self.assertIn(
+            'quote_db_errors_total{function="getQuote",backend="sqlite"} 0\n',
+            text)
+        self.assertIn('# TYPE quote_db_latency_seconds histogram\n', text)
+        self.assertIn('quote_db_latency_seconds_bucket{function="getQuote",'
+                      'backend="sqlite",le="+Inf"} 1\n', text)
+        self.assertIn(
+            'quote_db_rows_count{function="getQuote",backend="sqlite"} 1\n',
+            text)
+        self.assertIn('# TYPE quote_db_sql_text_cache_hits_total counter\n',
+                      text)
+        self.assertIn('quote_db_sql_text_build_seconds_total ', text)
+        self.assertNotIn('saved_seconds', text)
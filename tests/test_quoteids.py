@@ -0,0 +1,104 @@
+import unittest
+
+import asynctest
+from asynctest.mock import patch
+
+from ..library import quoteids
+
+
+class TestQuoteIds(unittest.TestCase):
+    def setUp(self):
+        self.quoteIds = quoteids.ChannelQuoteIds(0)
+        self.quoteIds.ids.extend([1, 2, 3])
+        self.quoteIds.lastId = 3
+
+    def test_add(self):
+        self.quoteIds.add(4)
+        self.quoteIds.add(4)
+        self.assertEqual(list(self.quoteIds.ids), [1, 2, 3, 4])
+        self.assertEqual(self.quoteIds.lastId, 4)
+
+    def test_add_sorted(self):
+        self.quoteIds.add(0)
+        self.quoteIds.add(2)
+        self.assertEqual(list(self.quoteIds.ids), [0, 1, 2, 3])
+
+    def test_contains(self):
+        self.assertIn(2, self.quoteIds)
+        self.assertNotIn(4, self.quoteIds)
+        self.assertNotIn('2', self.quoteIds)
+
+    def test_remove(self):
+        self.quoteIds.remove(1)
+        self.assertCountEqual(self.quoteIds.ids, [2, 3])
+        self.quoteIds.remove(3)
+        self.assertCountEqual(self.quoteIds.ids, [2])
+        self.quoteIds.remove(5)
+        self.assertCountEqual(self.quoteIds.ids, [2])
+
+    def test_choice(self):
+        for _ in range(10):
+            self.assertIn(self.quoteIds.choice(), [1, 2, 3])
+
+    def test_choice_empty(self):
+        self.assertIsNone(quoteids.ChannelQuoteIds(0).choice())
+
+    def test_missing(self):
+        self.addCleanup(quoteids.clear)
+        self.assertIs(quoteids.missing('megotsthis', 4), False)
+        quoteids._channels['megotsthis'] = self.quoteIds
+        with patch(quoteids.__name__ + '.refreshSeconds', float('inf')):
+            self.assertIs(quoteids.missing('megotsthis', 0), True)
+            self.assertIs(quoteids.missing('megotsthis', 3), False)
+            self.assertIs(quoteids.missing('megotsthis', 4), False)
+
+    def test_expired(self):
+        with patch(quoteids.__name__ + '.refreshSeconds', 10):
+            self.assertIs(self.quoteIds.expired(9), False)
+            self.assertIs(self.quoteIds.expired(10), True)
+
+
+class Cursor:
+    def __init__(self, rows, during=None):
+        self.rows = rows
+        self.during = during
+
+    async def execute(self, query, params):
+        if self.during is not None:
+            self.during()
+        return self
+
+    def __aiter__(self):
+        self.iterator = iter(self.rows)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class TestQuoteIdsLoad(asynctest.TestCase):
+    def setUp(self):
+        self.addCleanup(quoteids.clear)
+
+    async def test_load(self):
+        quoteIds = await quoteids.load(Cursor([(1,), (3,)]), 'megotsthis')
+        self.assertEqual(list(quoteIds.ids), [1, 3])
+        self.assertEqual(quoteIds.lastId, 3)
+        self.assertIs(quoteids.loaded('megotsthis'), True)
+        self.assertIs(
+            await quoteids.load(Cursor([]), 'megotsthis'), quoteIds)
+
+    async def test_load_changed(self):
+        cursor = Cursor([(1,)], lambda: quoteids.add('megotsthis', 2))
+        quoteIds = await quoteids.load(cursor, 'megotsthis')
+        self.assertEqual(list(quoteIds.ids), [1])
+        self.assertIs(quoteids.loaded('megotsthis'), False)
+        self.assertIs(quoteids.missing('megotsthis', 2), False)
+
+    async def test_load_cleared(self):
+        cursor = Cursor([(1,)], quoteids.clear)
+        await quoteids.load(cursor, 'megotsthis')
+        self.assertIs(quoteids.loaded('megotsthis'), False)
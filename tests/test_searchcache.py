@@ -0,0 +1,168 @@
+import asyncio
+
+import asynctest
+from asynctest.mock import patch
+
+from ..library import searchcache
+
+
+class TestSearchCache(asynctest.TestCase):
+    def setUp(self):
+        searchcache.clear()
+        self.addCleanup(searchcache.clear)
+        self.calls = 0
+        self.quoteIds = [1, 2]
+
+    async def loader(self):
+        self.calls += 1
+        return self.quoteIds
+
+    def test_normalize(self):
+        self.assertEqual(searchcache.normalize(['Kappa', 'kappa', 'Keepo']),
+                         frozenset(['kappa', 'keepo']))
+        self.assertEqual(searchcache.normalize(['Kappa', 'AND', 'Keepo']),
+                         frozenset(['kappa', 'keepo']))
+        self.assertNotEqual(
+            searchcache.normalize(['Kappa', 'OR', 'Keepo', 'PogChamp']),
+            searchcache.normalize(['Kappa', 'Keepo', 'OR', 'PogChamp']))
+        self.assertNotEqual(searchcache.normalize(['Kappa', 'OR', 'Keepo']),
+                            searchcache.normalize(['Kappa', 'or', 'Keepo']))
+
+    async def test_cached(self):
+        self.assertEqual(
+            await searchcache.matches('megotsthis', ['Kappa'], self.loader),
+            (1, 2))
+        self.assertEqual(
+            await searchcache.matches('megotsthis', ['kappa', 'KAPPA'],
+                                      self.loader),
+            (1, 2))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(searchcache.stats()['hits'], 1)
+        self.assertEqual(searchcache.stats()['misses'], 1)
+
+    async def test_peek(self):
+        self.assertIsNone(searchcache.cached('megotsthis', ['Kappa']))
+        await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        self.assertEqual(searchcache.cached('megotsthis', ['KAPPA']), (1, 2))
+        self.assertIsNone(searchcache.cached('megotsthis', ['Keepo']))
+        self.assertEqual(self.calls, 1)
+
+    async def test_channels(self):
+        await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        await searchcache.matches('botgotsthis', ['Kappa'], self.loader)
+        await searchcache.matches(None, ['Kappa'], self.loader)
+        self.assertEqual(self.calls, 3)
+
+    async def test_ttl(self):
+        with patch(searchcache.__name__ + '.ttlSeconds', 0):
+            await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+            await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        self.assertEqual(self.calls, 2)
+
+    async def test_coalesced(self):
+        event = asyncio.Event()
+
+        async def loader():
+            self.calls += 1
+            await event.wait()
+            return [1]
+
+        tasks = [asyncio.ensure_future(
+            searchcache.matches('megotsthis', ['Kappa'], loader))
+            for _ in range(3)]
+        await asyncio.sleep(0)
+        event.set()
+        self.assertEqual(await asyncio.gather(*tasks), [(1,)] * 3)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(searchcache.stats()['coalesced'], 2)
+        self.assertEqual(searchcache.stats()['inflight'], 0)
+
+    async def test_error(self):
+        event = asyncio.Event()
+
+        async def loader():
+            self.calls += 1
+            await event.wait()
+            raise ValueError()
+
+        tasks = [asyncio.ensure_future(
+            searchcache.matches('megotsthis', ['Kappa'], loader))
+            for _ in range(2)]
+        await asyncio.sleep(0)
+        event.set()
+        for task in tasks:
+            with self.assertRaises(ValueError):
+                await task
+        self.assertEqual(self.calls, 1)
+        await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        self.assertEqual(self.calls, 2)
+
+    async def test_leader_cancelled(self):
+        event = asyncio.Event()
+
+        async def loader():
+            self.calls += 1
+            await event.wait()
+            return [self.calls]
+
+        tasks = [asyncio.ensure_future(
+            searchcache.matches('megotsthis', ['Kappa'], loader))
+            for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        event.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await tasks[0]
+        self.assertEqual(await asyncio.gather(*tasks[1:]), [(2,)] * 2)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(searchcache.stats()['inflight'], 0)
+
+    async def test_waiter_cancelled(self):
+        event = asyncio.Event()
+
+        async def loader():
+            self.calls += 1
+            await event.wait()
+            return [1]
+
+        tasks = [asyncio.ensure_future(
+            searchcache.matches('megotsthis', ['Kappa'], loader))
+            for _ in range(2)]
+        await asyncio.sleep(0)
+        tasks[1].cancel()
+        await asyncio.sleep(0)
+        event.set()
+        self.assertEqual(await tasks[0], (1,))
+        with self.assertRaises(asyncio.CancelledError):
+            await tasks[1]
+        self.assertEqual(self.calls, 1)
+
+    async def test_invalidate(self):
+        await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        await searchcache.matches('botgotsthis', ['Kappa'], self.loader)
+        await searchcache.matches(None, ['Kappa'], self.loader)
+        searchcache.invalidate('megotsthis')
+        await searchcache.matches('megotsthis', ['Kappa'], self.loader)
+        await searchcache.matches('botgotsthis', ['Kappa'], self.loader)
+        await searchcache.matches(None, ['Kappa'], self.loader)
+        self.assertEqual(self.calls, 5)
+
+    async def test_invalidate_inflight(self):
+        event = asyncio.Event()
+
+        async def loader():
+            self.calls += 1
+            await event.wait()
+            return [1]
+
+        task = asyncio.ensure_future(
+            searchcache.matches('megotsthis', ['Kappa'], loader))
+        await asyncio.sleep(0)
+        searchcache.invalidate('megotsthis')
+        event.set()
+        self.assertEqual(await task, (1,))
+        self.assertEqual(
+            await searchcache.matches('megotsthis', ['Kappa'], self.loader),
+            (1, 2))
+        self.assertEqual(self.calls, 2)
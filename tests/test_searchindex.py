@@ -0,0 +1,73 @@
+import unittest
+from unittest.mock import patch
+
+from ..library import searchindex
+
+
+class TestSearchIndexChannel(unittest.TestCase):
+    def setUp(self):
+        self.index = searchindex.ChannelIndex()
+        self.index.addQuote(1, 'Kappa Keepo')
+        self.index.addQuote(2, 'FrankerZ PogChamp')
+        self.index.addQuote(3, 'kappa')
+        self.index.addTags(2, ['Kappa', 'kappa', 'Keepo'])
+
+    def test_union(self):
+        self.assertEqual(searchindex._union([1, 3, 5], [2, 3, 6, 7]),
+                         [1, 2, 3, 5, 6, 7])
+        self.assertEqual(searchindex._union([], [2]), [2])
+
+    def test_trigrams(self):
+        self.assertEqual(searchindex.trigrams('kappa'),
+                         {'kap', 'app', 'ppa'})
+        self.assertEqual(searchindex.trigrams('pa'), set())
+
+    def test_text(self):
+        self.assertEqual(self.index.matchText(['KAPPA']), [1, 3])
+        self.assertEqual(self.index.matchText(['kappa', 'keep']), [1])
+        self.assertEqual(self.index.matchText(['pa']), [1, 3])
+        self.assertEqual(self.index.matchText(['pa k']), [1])
+        self.assertEqual(self.index.matchText(['Kreygasm']), [])
+
+    def test_tags(self):
+        self.assertEqual(self.index.matchTags(['kappa', 'KEEPO']), [2])
+        self.assertEqual(self.index.matchTags(['kappa', 'Kreygasm']), [])
+        self.assertEqual(self.index.matchTags(['kap']), [])
+
+    def test_search(self):
+        self.assertEqual(self.index.search(['Kappa']), [1, 2, 3])
+        self.assertEqual(self.index.search(['pog']), [2])
+
+    def test_update_quote(self):
+        self.index.addQuote(1, 'BibleThump')
+        self.assertEqual(self.index.matchText(['kappa']), [3])
+        self.assertEqual(self.index.matchText(['bible']), [1])
+        self.assertNotIn('kee', self.index.grams)
+
+    def test_remove_quote(self):
+        self.index.removeQuote(2)
+        self.assertEqual(self.index.search(['Kappa']), [1, 3])
+        self.assertEqual(self.index.tags, {})
+        self.assertEqual(len(self.index), 2)
+
+    def test_remove_tags(self):
+        self.index.removeTags(2, ['Kappa'])
+        self.assertEqual(self.index.matchTags(['kappa']), [2])
+        self.index.removeTags(2, ['kappa', 'Kreygasm'])
+        self.assertEqual(self.index.matchTags(['kappa']), [])
+        self.assertEqual(self.index.matchTags(['keepo']), [2])
+
+
+class TestSearchIndexStale(unittest.TestCase):
+    def test_unloaded(self):
+        with patch(searchindex.__name__ + '.loaded', False):
+            self.assertIs(searchindex.stale(), True)
+
+    def test_loaded(self):
+        with patch(searchindex.__name__ + '.loaded', True), \
+                patch(searchindex.__name__ + '._loadedAt', 100), \
+                patch('time.monotonic', return_value=110):
+            with patch(searchindex.__name__ + '.refreshSeconds', 20):
+                self.assertIs(searchindex.stale(), False)
+            with patch(searchindex.__name__ + '.refreshSeconds', 10):
+                self.assertIs(searchindex.stale(), True)
@@ -0,0 +1,133 @@
+import unittest
+
+from ..library import searchquery, statements
+from ..library.searchquery import Compiled, Term
+
+
+class TestSearchQueryParse(unittest.TestCase):
+    def test_words(self):
+        self.assertEqual(
+            searchquery.parse(['Kappa', 'Keepo']),
+            ((Term('word', 'Kappa', False), Term('word', 'Keepo', False)),))
+        self.assertEqual(searchquery.parse([]), ())
+
+    def test_operators(self):
+        self.assertEqual(
+            searchquery.parse(['Kappa', 'AND', 'Keepo', 'OR', '-FrankerZ']),
+            ((Term('word', 'Kappa', False), Term('word', 'Keepo', False)),
+             (Term('word', 'FrankerZ', True),)))
+        self.assertEqual(
+            searchquery.parse(['OR', 'Kappa', 'OR', 'OR']),
+            ((Term('word', 'Kappa', False),),))
+        self.assertEqual(
+            searchquery.parse(['or', '-AND']),
+            ((Term('word', 'or', False), Term('word', 'AND', True)),))
+
+    def test_phrase(self):
+        self.assertEqual(
+            searchquery.parse(['"Kappa', 'Keepo"', '-"Franker', 'Z']),
+            ((Term('phrase', 'Kappa Keepo', False),
+              Term('phrase', 'Franker Z', True)),))
+        self.assertEqual(searchquery.parse(['""', '"']), ())
+
+    def test_prefix_tag(self):
+        self.assertEqual(
+            searchquery.parse(['Kap*', 'TAG:Keepo', '-tag:PogChamp', '*',
+                               'tag:']),
+            ((Term('prefix', 'Kap', False), Term('tag', 'Keepo', False),
+              Term('tag', 'PogChamp', True), Term('word', '*', False),
+              Term('word', 'tag:', False)),))
+
+    def test_plain_words(self):
+        self.assertEqual(
+            searchquery.plainWords(searchquery.parse(['Kappa', 'AND', 'K%'])),
+            ['Kappa', 'K%'])
+        self.assertIsNone(
+            searchquery.plainWords(searchquery.parse(['Kappa', '-Keepo'])))
+        self.assertIsNone(
+            searchquery.plainWords(searchquery.parse(['Kappa', 'OR', 'K'])))
+        self.assertIsNone(searchquery.plainWords(()))
+
+
+class TestSearchQueryCompile(unittest.TestCase):
+    def tearDown(self):
+        searchquery.clear()
+        statements.clear()
+
+    def test_sqlite(self):
+        compiled = searchquery.compile(['Kappa', 'pa', '-K%', 'tag:Keepo'],
+                                       False, True)
+        self.assertEqual(compiled.condition, '''\
+((quoteId IN (SELECT rowid FROM quotes_search WHERE quotes_search MATCH ?) \
+AND quote LIKE ? ESCAPE '\\' AND quote NOT LIKE ? ESCAPE '\\' \
+AND quoteId IN (SELECT quoteId FROM quotes_tags WHERE LOWER(tag)=?)))''')
+        self.assertEqual(compiled.params,
+                         ('"Kappa"', '%pa%', '%K\\%%', 'keepo'))
+        self.assertEqual((compiled.rank, compiled.rankParams), ('', ()))
+
+    def test_sqlite_no_fts(self):
+        compiled = searchquery.compile(['"a_b"', 'OR', 'Kap*'], False, False)
+        self.assertEqual(compiled.condition, '''\
+((quote LIKE ? ESCAPE '\\') OR (quote LIKE ? ESCAPE '\\'))''')
+        self.assertEqual(compiled.params, ('%a\\_b%', '%Kap%'))
+
+    def test_postgres(self):
+        compiled = searchquery.compile(['Kappa', 'Keepo'], True, False)
+        self.assertEqual(compiled.condition, '''\
+(document @@ ((plainto_tsquery(?)) || (plainto_tsquery(?))))''')
+        self.assertEqual(compiled.params, ('Kappa', 'Keepo'))
+        self.assertEqual(compiled.rank,
+                         '(plainto_tsquery(?) || plainto_tsquery(?))')
+        self.assertEqual(compiled.rankParams, ('Kappa', 'Keepo'))
+        compiled = searchquery.compile(['"Kappa', 'Keepo"', "-it's*"], True,
+                                       False)
+        self.assertEqual(compiled.condition, '''\
+(document @@ ((phraseto_tsquery(?) && !!to_tsquery(?))))''')
+        self.assertEqual(compiled.params, ('Kappa Keepo', "'it':* & 's':*"))
+        self.assertEqual(compiled.rank, '(phraseto_tsquery(?))')
+        self.assertEqual(compiled.rankParams, ('Kappa Keepo',))
+
+    def test_postgres_tags(self):
+        compiled = searchquery.compile(
+            ['tag:Keepo', 'Kappa', 'OR', 'FrankerZ'], True, False)
+        self.assertEqual(compiled.condition, '''\
+(document @@ ((plainto_tsquery(?))) OR (document @@ (plainto_tsquery(?)) \
+AND quoteId IN (SELECT quoteId FROM quotes_tags WHERE LOWER(tag)=?)))''')
+        self.assertEqual(compiled.params, ('FrankerZ', 'Kappa', 'keepo'))
+        self.assertEqual(compiled.rank,
+                         '(plainto_tsquery(?) || plainto_tsquery(?))')
+        self.assertEqual(compiled.rankParams, ('Kappa', 'FrankerZ'))
+
+    def test_nothing(self):
+        self.assertEqual(searchquery.compile(['!*'], True, False),
+                         Compiled('', (), '', (), None))
+        self.assertEqual(searchquery.compile(['""'], False, True),
+                         Compiled('', (), '', (), None))
+
+    def test_negated_only(self):
+        for postgres in [False, True]:
+            with self.subTest(postgres=postgres):
+                self.assertEqual(
+                    searchquery.compile(['-Kappa', '-tag:Keepo'], postgres,
+                                        True),
+                    Compiled('', (), '', (), None))
+                self.assertEqual(
+                    searchquery.compile(['Kappa', 'OR', '-Keepo'], postgres,
+                                        False),
+                    searchquery.compile(['Kappa', 'OR'], postgres, False))
+        self.assertEqual(searchquery.compile(['!*', '-Kappa'], True, False),
+                         Compiled('', (), '', (), None))
+
+    def test_shape(self):
+        kappa = searchquery.compile(['Kappa', 'OR', 'pa'], False, True)
+        keepo = searchquery.compile(['Keepo', 'OR', 'ke'], False, True)
+        self.assertEqual(kappa.shape, keepo.shape)
+        self.assertIs(kappa.condition, keepo.condition)
+        self.assertNotEqual(kappa.params, keepo.params)
+        self.assertEqual(statements.stats.misses, 1)
+        self.assertEqual(statements.stats.hits, 1)
+        self.assertNotEqual(
+            searchquery.compile(['Kappa', 'ke'], False, True).shape,
+            kappa.shape)
+        self.assertIs(searchquery.parsed(('Kappa',)),
+                      searchquery.parsed(['Kappa']))
@@ -0,0 +1,78 @@
+import unittest
+
+from ..library import similar
+
+
+@unittest.skipIf(not similar.available(), 'numpy is not installed')
+class TestSimilarVectors(unittest.TestCase):
+    def setUp(self):
+        self.vectors = similar.ChannelVectors()
+        self.vectors.put(1, 'Kappa Keepo PogChamp')
+        self.vectors.put(2, 'Kappa Keepo')
+        self.vectors.put(3, 'FrankerZ PogChamp')
+        self.vectors.put(4, 'BibleThump')
+        self.vectors.put(5, 'kappa kappa kappa')
+
+    def test_tokens(self):
+        self.assertEqual(similar.tokens('Kappa, kappa Keepo!'),
+                         {'kappa': 2, 'keepo': 1})
+
+    def test_similar(self):
+        self.assertEqual(
+            [i for i, _ in self.vectors.similar(2, 10)], [1, 5])
+        self.assertEqual(self.vectors.similar(1, 1), [(2, 'Kappa Keepo')])
+        self.assertEqual(self.vectors.similar(4, 3), [])
+
+    def test_no_quote(self):
+        self.assertIsNone(self.vectors.similar(6, 3))
+
+    def test_k(self):
+        self.assertEqual(len(self.vectors.similar(1, 2)), 2)
+        self.assertEqual(self.vectors.similar(1, 0), [])
+
+    def test_put(self):
+        self.vectors.similar(4, 3)
+        self.vectors.put(6, 'BibleThump FrankerZ')
+        self.assertEqual(self.vectors.similar(4, 3),
+                         [(6, 'BibleThump FrankerZ')])
+        self.vectors.put(6, 'Kreygasm')
+        self.assertEqual(self.vectors.similar(4, 3), [])
+
+    def test_remove(self):
+        self.vectors.remove(1)
+        self.assertEqual(self.vectors.frequency['pogchamp'], 1)
+        self.assertEqual(self.vectors.similar(3, 3), [])
+        self.vectors.remove(3)
+        self.assertNotIn('pogchamp', self.vectors.frequency)
+        self.assertEqual(len(self.vectors), 3)
+
+    def test_scores(self):
+        vectors = similar.ChannelVectors()
+        vectors.put(1, 'a b')
+        vectors.put(2, 'a b')
+        vectors.put(3, 'a c')
+        self.assertEqual(vectors.similar(1, 2), [(2, 'a b'), (3, 'a c')])
+
+    def test_no_tokens(self):
+        self.vectors.put(6, '!!!')
+        self.assertEqual(self.vectors.similar(6, 3), [])
+
+    def test_compact(self):
+        vectors = similar.ChannelVectors()
+        for i in range(200):
+            vectors.put(i, f'Kappa Keepo{i} PogChamp{i % 7}')
+        for i in range(1000):
+            vectors.put(i % 100 * 2, f'FrankerZ Kreygasm{i} BibleThump')
+        self.assertLess(vectors.used, 2000)
+        self.assertLessEqual(vectors.dead, vectors.used - vectors.dead)
+        quoteId, _ = vectors.similar(1, 1)[0]
+        self.assertIn(quoteId, range(15, 200, 14))
+        self.assertEqual([i for i, _ in vectors.similar(0, 200)],
+                         list(range(2, 200, 2)))
+        for i in range(200):
+            vectors.remove(i)
+        self.assertEqual(len(vectors), 0)
+        self.assertNotIn('kappa', vectors.frequency)
+        vectors.put(1, 'Kappa')
+        vectors.put(2, 'Kappa')
+        self.assertEqual(vectors.similar(1, 1), [(2, 'Kappa')])
@@ -0,0 +1,49 @@
+import unittest
+
+from ..library import statements
+
+
+class TestStatements(unittest.TestCase):
+    def tearDown(self):
+        statements.clear()
+
+    def test_statement(self):
+        built = []
+
+        def build():
+            built.append(1)
+            return 'SELECT 1'
+
+        self.assertEqual(statements.statement(('getQuote', 1), build),
+                         'SELECT 1')
+        self.assertEqual(statements.statement(('getQuote', 1), build),
+                         'SELECT 1')
+        self.assertEqual(statements.statement(('getQuote', 2), build),
+                         'SELECT 1')
+        self.assertEqual(len(built), 2)
+        self.assertEqual(statements.stats.hits, 1)
+        self.assertEqual(statements.stats.misses, 2)
+        self.assertGreater(statements.stats.buildSeconds, 0)
+
+    def test_evict(self):
+        original = statements._statements.maxsize
+        statements._statements.maxsize = 1
+        try:
+            statements.statement(('getQuote', 1), lambda: 'SELECT 1')
+            statements.statement(('getQuote', 2), lambda: 'SELECT 2')
+            self.assertEqual(
+                statements.statement(('getQuote', 1), lambda: 'SELECT 3'),
+                'SELECT 3')
+            self.assertEqual(statements.stats.evictions, 2)
+        finally:
+            statements._statements.maxsize = original
+
+    def test_clear(self):
+        statements.statement(('getQuote', 1), lambda: 'SELECT 1')
+        statements.clear()
+        self.assertEqual(statements.stats.asDict(),
+                         {'hits': 0, 'misses': 0, 'evictions': 0,
+                          'buildSeconds': 0.0})
+        self.assertEqual(
+            statements.statement(('getQuote', 1), lambda: 'SELECT 2'),
+            'SELECT 2')
@@ -0,0 +1,106 @@
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+import asynctest
+from asynctest.mock import patch
+
+from ..library import transfer
+from ..library.transfer import TransferRow
+
+
+class TestTransfer(unittest.TestCase):
+    rows = [
+        TransferRow('quote', 1, 'Kappa, "Keepo"'),
+        TransferRow('tag', 1, 'Keepo'),
+        TransferRow('revision', 1, 'Kappa', 1, datetime(2000, 1, 1),
+                    'botgotsthis'),
+        TransferRow('revision', 1, 'Kappa, "Keepo"', 2,
+                    datetime(2000, 1, 2, 3, 4, 5), 'megotsthis'),
+        TransferRow('quote', 3, 'FrankerZ\n☃'),
+        ]
+
+    def test_format_of(self):
+        self.assertEqual(transfer.formatOf('quotes.jsonl'), 'jsonl')
+        self.assertEqual(transfer.formatOf('quotes.JSON'), 'jsonl')
+        self.assertEqual(transfer.formatOf('/tmp/quotes.csv'), 'csv')
+        self.assertIsNone(transfer.formatOf('quotes.txt'))
+        self.assertIsNone(transfer.formatOf('quotes'))
+
+    def test_round_trip(self):
+        for format in transfer.formats:
+            with self.subTest(format=format):
+                file = io.StringIO(newline='')
+                write = transfer.writer(file, format)
+                for row in self.rows:
+                    write(row)
+                file.seek(0)
+                self.assertEqual(list(transfer.reader(file, format)),
+                                 self.rows)
+
+    def test_jsonl(self):
+        file = io.StringIO()
+        transfer.writer(file, 'jsonl')(self.rows[1])
+        self.assertEqual(file.getvalue(),
+                         '{"kind": "tag", "quoteId": 1, "text": "Keepo"}\n')
+
+    def test_csv(self):
+        file = io.StringIO(newline='')
+        transfer.writer(file, 'csv')(self.rows[2])
+        self.assertEqual(file.getvalue().splitlines(),
+                         ['kind,quoteId,text,revision,createdTime,editor',
+                          'revision,1,Kappa,1,2000-01-01T00:00:00,botgotsthis'
+                          ])
+
+    def test_unknown_kind(self):
+        file = io.StringIO('{"kind": "quotes", "quoteId": 1, "text": ""}\n')
+        with self.assertRaises(ValueError):
+            list(transfer.reader(file, 'jsonl'))
+
+    def test_created_time(self):
+        file = io.StringIO('''\
+{"kind": "revision", "quoteId": 1, "text": "", "revision": 1, \
+"createdTime": "2000-01-02T03:04:05.000006"}
+''')
+        self.assertEqual(list(transfer.reader(file, 'jsonl'))[0].createdTime,
+                         datetime(2000, 1, 2, 3, 4, 5, 6))
+
+    def test_invalid_created_time(self):
+        file = io.StringIO('''\
+{"kind": "revision", "quoteId": 1, "text": "", "createdTime": "yesterday"}
+''')
+        with self.assertRaises(ValueError):
+            list(transfer.reader(file, 'jsonl'))
+
+
+async def asyncRows(rows):
+    for row in rows:
+        yield row
+
+
+class TestTransferFiles(asynctest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    @patch.object(transfer, 'batchSize', 2)
+    @patch.object(transfer, 'pageSize', 2)
+    async def test_round_trip(self):
+        for format in transfer.formats:
+            with self.subTest(format=format):
+                path = os.path.join(self.directory, 'quotes.' + format)
+                self.assertEqual(
+                    await transfer.writeRows(path, format,
+                                             asyncRows(TestTransfer.rows)),
+                    len(TestTransfer.rows))
+                self.assertEqual(
+                    [row async for row in transfer.readRows(path, format)],
+                    TestTransfer.rows)
+
+    async def test_read_missing(self):
+        path = os.path.join(self.directory, 'quotes.csv')
+        with self.assertRaises(FileNotFoundError):
+            [row async for row in transfer.readRows(path, 'csv')]